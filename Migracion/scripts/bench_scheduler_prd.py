@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Dry-run + benchmark de throughput del Scheduler PRD.
+
+Siembra modelos, plataformas, cuentas y contenidos sintéticos en el fake en
+memoria (fake_supabase.FakeSupabase), ejecuta un ciclo real del scheduler
+(scheduler_prd.run_cycle) y reporta:
+- contenidos programados por segundo
+- queries por contenido
+- latencia p50 / p95 por contenido
+
+No toca la base de datos real.
+
+Uso:
+    python3 Migracion/scripts/bench_scheduler_prd.py
+    python3 Migracion/scripts/bench_scheduler_prd.py --modelos 50 --contenidos 2000 --latencia-ms 40 --workers 8
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import datetime as dt
+from collections import Counter
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BASE_DIR / 'src' / 'project'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Credenciales ficticias: el cliente real se reemplaza por el fake
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "fake.fake.fake")
+
+import scheduler_prd
+from fake_supabase import FakeSupabase
+
+PLATAFORMAS = ["kams", "xxxfollow", "plataforma_3", "plataforma_4"]
+
+
+def seed(fake: FakeSupabase, n_modelos: int, n_contenidos: int, n_plataformas: int, rng: random.Random):
+    """Siembra datos sintéticos: contenidos 'nuevo' repartidos entre modelos"""
+    plataformas = PLATAFORMAS[:n_plataformas]
+    fake.seed('plataformas', [{"id": f"plat_{p}", "nombre": p, "activa": True} for p in plataformas])
+    
+    for m in range(n_modelos):
+        fake.seed('modelos', [{
+            "id": f"modelo_{m}",
+            "nombre": f"bench_{m}",
+            "configuracion_distribucion": {
+                "plataformas": plataformas,
+                "hora_inicio": rng.choice(["10:00", "12:00", "14:00"]),
+                "ventana_horas": rng.choice([4, 5, 6])
+            }
+        }])
+        fake.seed('cuentas_plataforma', [
+            {"id": f"cuenta_{m}_{p}", "modelo_id": f"modelo_{m}", "plataforma_id": f"plat_{p}"}
+            for p in plataformas
+        ])
+    
+    base = dt.datetime.now(dt.timezone.utc) - dt.timedelta(hours=1)
+    fake.seed('contenidos', [{
+        "id": f"contenido_{i}",
+        "modelo_id": f"modelo_{rng.randrange(n_modelos)}",
+        "archivo_path": f"modelos/bench/video_{i}.mp4",
+        "caption_generado": "bench",
+        "tags_generados": ["bench"],
+        "estado": "nuevo",
+        "recibido_at": (base + dt.timedelta(seconds=i)).isoformat()
+    } for i in range(n_contenidos)])
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dry-run + benchmark del Scheduler PRD (sin BD real)")
+    parser.add_argument("--modelos", type=int, default=50)
+    parser.add_argument("--contenidos", type=int, default=2000)
+    parser.add_argument("--plataformas", type=int, default=2, choices=range(1, len(PLATAFORMAS) + 1))
+    parser.add_argument("--latencia-ms", type=float, default=0, help="Latencia simulada por round-trip")
+    parser.add_argument("--workers", type=int, default=scheduler_prd.SCHEDULER_MAX_WORKERS,
+                        help="Modelos en paralelo (SCHEDULER_MAX_WORKERS)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Mostrar logs del scheduler")
+    args = parser.parse_args()
+    
+    if not args.verbose:
+        scheduler_prd.logger.setLevel(logging.WARNING)
+    
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    fake = FakeSupabase(latency_ms=args.latencia_ms)
+    seed(fake, args.modelos, args.contenidos, args.plataformas, rng)
+    
+    scheduler_prd.supabase = fake
+    scheduler_prd.SCHEDULER_MAX_WORKERS = args.workers
+    scheduler_prd._DAY_CURSOR.clear()
+    
+    # Latencia por contenido: envolver process_contenido
+    latencias = []
+    original = scheduler_prd.process_contenido
+    
+    def timed_process_contenido(contenido):
+        t0 = time.perf_counter()
+        try:
+            return original(contenido)
+        finally:
+            latencias.append(time.perf_counter() - t0)
+    
+    scheduler_prd.process_contenido = timed_process_contenido
+    
+    print("📏 Dry-run Scheduler PRD (fake en memoria)")
+    print("=" * 60)
+    print(f"   Modelos: {args.modelos} | Contenidos: {args.contenidos} | Plataformas: {args.plataformas}")
+    print(f"   Latencia simulada: {args.latencia_ms} ms | Workers: {args.workers}")
+    
+    fake.reset_counters()
+    t0 = time.perf_counter()
+    procesados, saltados = scheduler_prd.run_cycle()
+    elapsed = time.perf_counter() - t0
+    scheduler_prd.process_contenido = original
+    
+    queries_por_tipo = Counter(fake.query_log)
+    print("\n📊 Resultados")
+    print("-" * 60)
+    print(f"   Programados: {procesados} | Saltados: {saltados} | Tiempo: {elapsed:.2f} s")
+    print(f"   Throughput: {procesados / elapsed if elapsed else 0:.1f} contenidos/s")
+    print(f"   Queries: {fake.query_count} ({fake.query_count / max(1, args.contenidos):.2f} por contenido)")
+    print(f"   Latencia por contenido: p50 {percentile(latencias, 50) * 1000:.1f} ms"
+          f" | p95 {percentile(latencias, 95) * 1000:.1f} ms")
+    print("   Queries por tipo:")
+    for (op, tabla), n in queries_por_tipo.most_common():
+        print(f"      {op:<7} {tabla:<22} {n}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark de regresión: queries del Scheduler PRD vs. número de modelos.
+
+Programa un contenido de un modelo objetivo mientras el resto de la agencia
+tiene publicaciones en la misma ventana. Con el índice de ocupación filtrado
+en el servidor (contenidos!inner + modelo_id), el número de queries y las
+filas leídas deben ser constantes aunque crezca el número de modelos.
+
+No toca la base de datos real: usa fake_supabase.FakeSupabase.
+
+Uso:
+    python3 Migracion/scripts/bench_scheduler_queries.py
+"""
+
+import os
+import sys
+import logging
+import datetime as dt
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BASE_DIR / 'src' / 'project'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Credenciales ficticias: el cliente real se reemplaza por el fake
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "fake.fake.fake")
+
+import scheduler_prd
+from fake_supabase import FakeSupabase
+
+MODELOS_ESCALA = [1, 10, 50, 200]
+DIAS_OCUPADOS = 10
+
+
+def seed_agencia(fake: FakeSupabase, n_modelos: int):
+    """Crea n_modelos con cuentas y publicaciones en los próximos días"""
+    fake.seed('plataformas', [
+        {"id": "plat_kams", "nombre": "kams", "activa": True},
+        {"id": "plat_xxxfollow", "nombre": "xxxfollow", "activa": True},
+    ])
+    today = scheduler_prd.now_tz().replace(hour=12, minute=0, second=0, microsecond=0)
+    
+    for m in range(n_modelos):
+        modelo_id = f"modelo_{m}"
+        fake.seed('modelos', [{
+            "id": modelo_id,
+            "nombre": f"bench_{m}",
+            "configuracion_distribucion": {
+                "plataformas": ["kams", "xxxfollow"],
+                "hora_inicio": "12:00",
+                "ventana_horas": 5
+            }
+        }])
+        fake.seed('cuentas_plataforma', [
+            {"id": f"cuenta_{m}_kams", "modelo_id": modelo_id, "plataforma_id": "plat_kams"},
+            {"id": f"cuenta_{m}_xxxfollow", "modelo_id": modelo_id, "plataforma_id": "plat_xxxfollow"},
+        ])
+        if m == 0:
+            continue  # El modelo objetivo empieza vacío
+        
+        # Resto de la agencia: 3 contenidos por día durante DIAS_OCUPADOS días
+        for d in range(DIAS_OCUPADOS):
+            for k in range(3):
+                contenido_id = f"contenido_{m}_{d}_{k}"
+                fake.seed('contenidos', [{"id": contenido_id, "modelo_id": modelo_id, "estado": "aprobado"}])
+                slot = today + dt.timedelta(days=d, minutes=60 * k)
+                fake.seed('publicaciones', [{
+                    "id": f"pub_{contenido_id}_{p}",
+                    "contenido_id": contenido_id,
+                    "cuenta_plataforma_id": f"cuenta_{m}_{p}",
+                    "scheduled_time": (slot + dt.timedelta(minutes=20 * i)).isoformat(),
+                    "estado": "programada",
+                } for i, p in enumerate(["kams", "xxxfollow"])])
+    
+    fake.seed('contenidos', [{
+        "id": "contenido_objetivo",
+        "modelo_id": "modelo_0",
+        "archivo_path": "modelos/bench_0/objetivo.mp4",
+        "estado": "nuevo",
+        "recibido_at": dt.datetime.now(dt.timezone.utc).isoformat()
+    }])
+
+
+def medir(n_modelos: int) -> tuple:
+    """Retorna (queries, filas leídas, éxito) al programar el contenido objetivo"""
+    fake = FakeSupabase()
+    seed_agencia(fake, n_modelos)
+    scheduler_prd.supabase = fake
+    scheduler_prd.reset_cycle_cache()
+    
+    contenido = fake.table('contenidos').select("*, modelos(*)").eq('id', 'contenido_objetivo').execute().data[0]
+    fake.reset_counters()
+    ok = scheduler_prd.process_contenido(contenido)
+    return fake.query_count, fake.rows_read, ok
+
+
+def main():
+    scheduler_prd.logger.setLevel(logging.WARNING)
+    print("📏 Benchmark queries Scheduler PRD vs. número de modelos\n")
+    print("=" * 60)
+    print(f"{'modelos':>8} | {'queries':>8} | {'filas leídas':>12} | ok")
+    print("-" * 60)
+    
+    resultados = []
+    for n in MODELOS_ESCALA:
+        queries, filas, ok = medir(n)
+        resultados.append((queries, filas, ok))
+        print(f"{n:>8} | {queries:>8} | {filas:>12} | {'✅' if ok else '❌'}")
+    
+    print("=" * 60)
+    queries_set = {r[0] for r in resultados}
+    filas_set = {r[1] for r in resultados}
+    
+    if not all(r[2] for r in resultados):
+        print("❌ ERROR: el contenido objetivo no se programó en todos los escenarios")
+        sys.exit(1)
+    if len(queries_set) != 1 or len(filas_set) != 1:
+        print("❌ ERROR: el costo del scheduler crece con el número de modelos")
+        sys.exit(1)
+    
+    print(f"✅ Costo constante: {queries_set.pop()} queries y {filas_set.pop()} filas por contenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SlotAllocator vs. _build_slots_for_day original.
+Tiempo por llamada en días con muchos slots ocupados.
+
+Las propiedades (mismos slots que el original, ventana, "ahora", gap mínimo,
+tope diario y reserve/release) están en tests/unit/test_slot_allocator.py,
+que usa random_case y build_slots_for_day_legacy de este script.
+
+No requiere Supabase.
+
+Uso:
+    python3 Migracion/scripts/bench_slot_allocator.py
+"""
+
+import sys
+import time
+import random
+import datetime as dt
+from pathlib import Path
+from typing import List
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BASE_DIR / 'src' / 'project'))
+
+from slot_allocator import SlotAllocator
+
+TZ = dt.timezone(dt.timedelta(hours=-5))
+
+
+def build_slots_for_day_legacy(n: int, start: dt.datetime, hours: int, occupied: List[dt.datetime],
+                               gap: int, now_local: dt.datetime) -> List[dt.datetime]:
+    """Copia de referencia de scheduler_prd._build_slots_for_day (antes de SlotAllocator)"""
+    end = start + dt.timedelta(hours=hours)
+    proposals: List[dt.datetime] = []
+
+    def _within_window(c, s, e):
+        return s <= c <= e
+
+    def _valid_gap(c, others, gap_min):
+        for h in others:
+            if abs((c - h).total_seconds()) < gap_min * 60:
+                return False
+        return True
+
+    if n >= 1:
+        jitter = dt.timedelta(minutes=random.randint(0, 5))
+        c = (start + jitter).replace(second=0, microsecond=0)
+        if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
+            proposals.append(c)
+
+    if n >= 2:
+        jitter = dt.timedelta(minutes=random.randint(0, 5))
+        c = (end - jitter).replace(second=0, microsecond=0)
+        if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
+            proposals.append(c)
+
+    if n >= 3 and len(proposals) >= 2:
+        a, b = sorted(proposals)[0], sorted(proposals)[-1]
+        c = (a + (b - a) / 2).replace(second=0, microsecond=0)
+        if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
+            proposals.append(c)
+
+    def midpoints_fill():
+        timeline = sorted(occupied + proposals)
+        made = 0
+        for i in range(len(timeline) - 1):
+            a, b = timeline[i], timeline[i + 1]
+            if (b - a) >= dt.timedelta(minutes=2 * gap):
+                c = (a + (b - a) / 2).replace(second=0, microsecond=0)
+                if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
+                    proposals.append(c)
+                    made += 1
+                    if len(proposals) >= n:
+                        break
+        return made
+
+    while len(proposals) < n and midpoints_fill() > 0:
+        pass
+
+    t = start
+    while len(proposals) < n:
+        t = t.replace(second=0, microsecond=0)
+        if _within_window(t, start, end) and _valid_gap(t, occupied + proposals, gap) and t >= now_local:
+            proposals.append(t)
+        t += dt.timedelta(minutes=gap)
+        if t > end:
+            break
+
+    return sorted(proposals)[:n]
+
+
+def random_case(rng: random.Random, max_occupied: int = 40) -> dict:
+    """Genera un escenario aleatorio de un día"""
+    gap = rng.choice([5, 10, 15, 30])
+    hours = rng.randint(1, 8)
+    start = dt.datetime(2026, 1, 15, rng.randint(6, 14), rng.choice([0, 15, 30]), tzinfo=TZ)
+    day_start = start.replace(hour=0, minute=0)
+    occupied = [day_start + dt.timedelta(minutes=rng.randint(0, 24 * 60 - 1), seconds=rng.choice([0, 0, 30]))
+                for _ in range(rng.randint(0, max_occupied))]
+    now_local = start + dt.timedelta(minutes=rng.randint(-120, hours * 60))
+    return {"gap": gap, "hours": hours, "start": start, "occupied": occupied,
+            "n": rng.randint(1, 6), "now": now_local}
+
+
+def run_allocator(case: dict) -> List[dt.datetime]:
+    allocator = SlotAllocator(case["gap"], case["occupied"])
+    end = case["start"] + dt.timedelta(hours=case["hours"])
+    return allocator.find_n_slots(case["start"], end, case["n"], not_before=case["now"])
+
+
+def run_legacy(case: dict) -> List[dt.datetime]:
+    return build_slots_for_day_legacy(case["n"], case["start"], case["hours"], list(case["occupied"]),
+                                      case["gap"], case["now"])
+
+
+def benchmark():
+    print("\n⏱️  Benchmark (ms por llamada)...")
+    print(f"   {'ocupados':>9} | {'original':>9} | {'allocator':>9} | speedup")
+    rng = random.Random(7)
+    for n_occupied in [10, 50, 200, 500]:
+        cases = []
+        for _ in range(50):
+            case = random_case(rng, max_occupied=0)
+            case.update(n=6, hours=8, now=case["start"] - dt.timedelta(hours=1))
+            day_start = case["start"].replace(hour=0, minute=0)
+            case["occupied"] = [day_start + dt.timedelta(minutes=rng.randint(0, 24 * 60 - 1))
+                                for _ in range(n_occupied)]
+            cases.append(case)
+
+        t0 = time.perf_counter()
+        for case in cases:
+            run_legacy(case)
+        legacy_ms = (time.perf_counter() - t0) * 1000 / len(cases)
+
+        t0 = time.perf_counter()
+        for case in cases:
+            run_allocator(case)
+        allocator_ms = (time.perf_counter() - t0) * 1000 / len(cases)
+
+        print(f"   {n_occupied:>9} | {legacy_ms:>9.3f} | {allocator_ms:>9.3f} | {legacy_ms / allocator_ms:>6.1f}x")
+
+
+def main():
+    print("🧪 SlotAllocator vs. _build_slots_for_day original")
+    print("=" * 60)
+    benchmark()
+    print("\n" + "=" * 60)
+    print("✅ Benchmark completado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+-- Hash de contenido de los videos (Bot Central)
+-- El bot calcula el sha256 de cada video antes de traerlo a modelos/ y
+-- busca un contenido de la misma modelo con ese hash: un reenvío del mismo
+-- clip no crea archivo, contenido ni publicaciones nuevas.
+--
+-- El índice único por (modelo_id, content_hash) cierra la carrera entre
+-- dos envíos simultáneos del mismo video: create_contenido recibe 23505 y
+-- devuelve el contenido existente. Los contenidos anteriores quedan con
+-- content_hash NULL (fuera del índice).
+--
+-- Ejecutar en el SQL Editor de Supabase.
+
+ALTER TABLE contenidos
+    ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_contenidos_modelo_content_hash
+    ON contenidos (modelo_id, content_hash)
+    WHERE content_hash IS NOT NULL;
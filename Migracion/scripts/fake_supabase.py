@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Fake en memoria del subconjunto de supabase-py que usa el proyecto.
+
+Soporta table().select()/insert()/upsert()/update()/delete() con filtros eq, neq, in_,
+gte, gt, lte, lt, is_, or_ (con and() anidado), order, limit y range, incluyendo relaciones embebidas
+("contenidos(*, modelos(*))", "contenidos!inner(modelo_id)") y filtros sobre
+ellas ("contenidos.modelo_id"). Cada execute() cuenta como un round-trip
+en FakeSupabase.query_count y las filas devueltas se suman en rows_read,
+para benchmarks de número de queries y volumen transferido.
+
+latency_ms simula la latencia de red por round-trip (fuera del lock, así
+los hilos del scheduler paralelo se solapan como con el cliente real).
+
+Uso:
+    fake = FakeSupabase(latency_ms=40)
+    fake.seed('modelos', [{"id": "m1", "nombre": "demo"}])
+    scheduler_prd.supabase = fake
+"""
+
+import copy
+import time
+import inspect
+import uuid
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Relaciones many-to-one: tabla -> { relación embebida: (columna FK, tabla destino) }
+RELATIONS: Dict[str, Dict[str, tuple]] = {
+    'publicaciones': {
+        'contenidos': ('contenido_id', 'contenidos'),
+        'cuentas_plataforma': ('cuenta_plataforma_id', 'cuentas_plataforma'),
+    },
+    'contenidos': {
+        'modelos': ('modelo_id', 'modelos'),
+    },
+    'cuentas_plataforma': {
+        'modelos': ('modelo_id', 'modelos'),
+        'plataformas': ('plataforma_id', 'plataformas'),
+    },
+    'eventos_sistema': {
+        'publicaciones': ('publicacion_id', 'publicaciones'),
+        'modelos': ('modelo_id', 'modelos'),
+    },
+}
+
+
+class FakeAPIError(Exception):
+    """Error con atributo `code` como postgrest.exceptions.APIError"""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class FakeResponse:
+    """Respuesta con la misma forma que APIResponse de postgrest"""
+
+    def __init__(self, data: List[Dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _split_top_level(spec: str) -> List[str]:
+    """Separa una proyección por comas ignorando las anidadas en paréntesis"""
+    parts, depth, current = [], 0, ''
+    for ch in spec:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _parse_select(spec: str) -> List[tuple]:
+    """
+    Parsea una proyección PostgREST.
+    Retorna items (columna, None, False) o (relación, sub_items, inner).
+    """
+    items = []
+    for part in _split_top_level(spec or '*'):
+        if '(' in part:
+            name, inner_spec = part.split('(', 1)
+            inner = name.endswith('!inner')
+            name = name.replace('!inner', '').strip()
+            items.append((name, _parse_select(inner_spec[:-1]), inner))
+        else:
+            items.append((part, None, False))
+    return items
+
+
+def _coerce(value: Any) -> Any:
+    """Convierte timestamps ISO a datetime para compararlos como timestamptz"""
+    if isinstance(value, str) and len(value) >= 19 and value[4] == '-' and value[10] in 'T ':
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            return value
+    return value
+
+
+_LOGIC_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'gt': lambda a, b: a is not None and a > b,
+    'gte': lambda a, b: a is not None and a >= b,
+    'lt': lambda a, b: a is not None and a < b,
+    'lte': lambda a, b: a is not None and a <= b,
+}
+
+
+def _parse_logic(spec: str) -> List[Any]:
+    """Parsea condiciones de or_/and(): ('and', [...]) o (columna, op, valor)"""
+    conditions = []
+    for part in _split_top_level(spec):
+        if part.startswith('and(') and part.endswith(')'):
+            conditions.append(('and', _parse_logic(part[4:-1])))
+        else:
+            column, op, value = part.split('.', 2)
+            conditions.append((column, op, value.strip('"')))
+    return conditions
+
+
+def _eval_condition(condition, row: Dict) -> bool:
+    if condition[0] == 'and':
+        return all(_eval_condition(c, row) for c in condition[1])
+    column, op, value = condition
+    return _LOGIC_OPS[op](_coerce(row.get(column)), _coerce(value))
+
+
+class FakeQuery:
+    """Builder encadenable equivalente al de postgrest"""
+
+    def __init__(self, db: 'FakeSupabase', table: str):
+        self.db = db
+        self.table_name = table
+        self.op = 'select'
+        self.select_spec = '*'
+        self.count_mode: Optional[str] = None
+        self.payload: Any = None
+        self.filters: List[tuple] = []
+        self.orders: List[tuple] = []
+        self.limit_n: Optional[int] = None
+        self.offset_n = 0
+
+    # ---- Operaciones ----
+    def select(self, spec: str = '*', count: Optional[str] = None):
+        self.op, self.select_spec, self.count_mode = 'select', spec, count
+        return self
+
+    def insert(self, data):
+        self.op, self.payload = 'insert', data
+        return self
+
+    def upsert(self, data, on_conflict: str = 'id', ignore_duplicates: bool = False):
+        self.op, self.payload = 'upsert', (data, on_conflict, ignore_duplicates)
+        return self
+
+    def update(self, data: Dict):
+        self.op, self.payload = 'update', data
+        return self
+
+    def delete(self):
+        self.op = 'delete'
+        return self
+
+    # ---- Filtros ----
+    def _filter(self, column: str, fn: Callable[[Any], bool]):
+        self.filters.append((column, fn))
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter(column, lambda v: _coerce(v) == _coerce(value))
+
+    def neq(self, column: str, value):
+        return self._filter(column, lambda v: _coerce(v) != _coerce(value))
+
+    def in_(self, column: str, values):
+        values = list(values)
+        return self._filter(column, lambda v: v in values)
+
+    def gte(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and _coerce(v) >= _coerce(value))
+
+    def gt(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and _coerce(v) > _coerce(value))
+
+    def lte(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and _coerce(v) <= _coerce(value))
+
+    def lt(self, column: str, value):
+        return self._filter(column, lambda v: v is not None and _coerce(v) < _coerce(value))
+
+    def is_(self, column: str, value):
+        expected = None if value in (None, 'null') else value
+        return self._filter(column, lambda v: v == expected)
+
+    def or_(self, filters: str):
+        """Subconjunto de la sintaxis PostgREST: "col.op.valor,and(col.op.valor,...)" """
+        conditions = _parse_logic(filters)
+        self.filters.append((None, lambda row: any(_eval_condition(c, row) for c in conditions)))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n: int):
+        self.limit_n = n
+        return self
+
+    def range(self, start: int, end: int):
+        self.offset_n, self.limit_n = start, end - start + 1
+        return self
+
+    # ---- Ejecución ----
+    def _embed(self, table: str, row: Dict, items: List[tuple]) -> Optional[Dict]:
+        """Aplica la proyección a una fila, resolviendo relaciones embebidas"""
+        out: Dict = {}
+        for name, sub_items, inner in items:
+            if sub_items is None:
+                if name == '*':
+                    out.update(row)
+                else:
+                    out[name] = row.get(name)
+                continue
+            fk, target = RELATIONS.get(table, {}).get(name, (None, None))
+            target_row = self.db.get(target, row.get(fk)) if fk else None
+            out[name] = self._embed(target, target_row, sub_items) if target_row else None
+        return out
+
+    def _matches(self, row: Dict) -> bool:
+        for column, fn in self.filters:
+            if column is None:  # Filtro lógico (or_) sobre la fila completa
+                if not fn(row):
+                    return False
+                continue
+            value = row
+            for part in column.split('.'):
+                value = value.get(part) if isinstance(value, dict) else None
+            if not fn(value):
+                return False
+        return True
+
+    def _inner_ok(self, row: Dict, items: List[tuple]) -> bool:
+        return all(row.get(name) is not None for name, sub, inner in items if sub is not None and inner)
+
+    def execute(self) -> FakeResponse:
+        self.db.simulate_latency()
+        with self.db.lock:
+            return self._execute()
+
+    def _execute(self) -> FakeResponse:
+        self.db.query_count += 1
+        self.db.query_log.append((self.op, self.table_name))
+        if self.db.fail_next:
+            error, self.db.fail_next = self.db.fail_next, None
+            raise error
+
+        rows = self.db.tables.setdefault(self.table_name, [])
+
+        if self.op == 'upsert':
+            data, on_conflict, ignore_duplicates = self.payload
+            batch = data if isinstance(data, list) else [data]
+            existing = {row.get(on_conflict): row for row in rows}
+            written = []
+            for item in batch:
+                current = existing.get(item.get(on_conflict))
+                if current is None:
+                    new_row = {"id": str(uuid.uuid4()), **copy.deepcopy(item)}
+                    rows.append(new_row)
+                    existing[new_row.get(on_conflict)] = new_row
+                    written.append(new_row)
+                elif not ignore_duplicates:
+                    current.update(copy.deepcopy(item))
+                    written.append(current)
+            self.db.invalidate(self.table_name)
+            return FakeResponse(copy.deepcopy(written))
+
+        if self.op == 'insert':
+            batch = self.payload if isinstance(self.payload, list) else [self.payload]
+            created = []
+            for data in batch:
+                new_row = {"id": str(uuid.uuid4()), **copy.deepcopy(data)}
+                created.append(new_row)
+            rows.extend(created)
+            self.db.invalidate(self.table_name)
+            return FakeResponse(copy.deepcopy(created))
+
+        items = _parse_select(self.select_spec)
+        projected = [(row, self._embed(self.table_name, row, items) if self.op == 'select' else row) for row in rows]
+        matched = [(row, proj) for row, proj in projected
+                   if self._matches({**row, **proj})
+                   and (self.op != 'select' or self._inner_ok(proj, items))]
+
+        if self.op == 'update':
+            for row, _ in matched:
+                row.update(copy.deepcopy(self.payload))
+            return FakeResponse(copy.deepcopy([row for row, _ in matched]))
+
+        if self.op == 'delete':
+            ids = {id(row) for row, _ in matched}
+            self.db.tables[self.table_name] = [row for row in rows if id(row) not in ids]
+            self.db.invalidate(self.table_name)
+            return FakeResponse(copy.deepcopy([row for row, _ in matched]))
+
+        result = [proj for _, proj in matched]
+        for column, desc in reversed(self.orders):
+            result.sort(key=lambda r: (r.get(column) is None, _coerce(r.get(column))), reverse=desc)
+        total = len(result)
+        if self.limit_n is not None:
+            result = result[self.offset_n:self.offset_n + self.limit_n]
+        self.db.rows_read += len(result)
+        return FakeResponse(copy.deepcopy(result), count=total if self.count_mode else None)
+
+
+class FakeRPC:
+    """Llamada RPC diferida, ejecutada en execute() como las de postgrest"""
+
+    def __init__(self, db: 'FakeSupabase', name: str, params: Dict):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self) -> FakeResponse:
+        self.db.simulate_latency()
+        with self.db.lock:
+            self.db.query_count += 1
+            self.db.query_log.append(('rpc', self.name))
+            fn = self.db.functions.get(self.name)
+            if fn is None:
+                raise FakeAPIError(f"Could not find the function public.{self.name}", code='PGRST202')
+            # PostgREST resuelve la función por nombre + parámetros: uno desconocido es PGRST202
+            try:
+                inspect.signature(fn).bind(self.db, **self.params)
+            except TypeError:
+                raise FakeAPIError(f"Could not find the function public.{self.name}"
+                                   f"({', '.join(sorted(self.params))})", code='PGRST202')
+            return FakeResponse(fn(self.db, **self.params))
+
+
+# ---- Funciones RPC del proyecto (equivalentes a Migracion/scripts/rpc_*.sql) ----
+
+def _rpc_programar_contenido(db: 'FakeSupabase', p_contenido_id, p_publicaciones, p_estado='aprobado'):
+    contenido = db.get('contenidos', p_contenido_id)
+    if not contenido or contenido.get('estado') != 'nuevo':
+        raise FakeAPIError(f"contenido {p_contenido_id} no está en estado nuevo", code='P0001')
+    created = [{"id": str(uuid.uuid4()), **copy.deepcopy(row),
+                "contenido_id": p_contenido_id, "estado": "programada", "intentos": 0}
+               for row in p_publicaciones]
+    db.tables.setdefault('publicaciones', []).extend(created)
+    db.invalidate('publicaciones')
+    contenido['estado'] = p_estado
+    return copy.deepcopy(created)
+
+
+def _rpc_transicionar_publicacion(db: 'FakeSupabase', p_publicacion_id, p_estado, p_ultimo_error=None,
+                                  p_url_publicacion=None, p_incrementar_intentos=False, p_lease_owner=None,
+                                  p_evento_tipo=None, p_evento_descripcion='', p_modelo_id=None,
+                                  p_realizado_por='sistema', p_scheduled_time=None):
+    pub = db.get('publicaciones', p_publicacion_id)
+    if not pub or (p_lease_owner is not None and pub.get('lease_owner') != p_lease_owner):
+        return []
+    pub['estado'] = p_estado
+    if p_ultimo_error is not None:
+        pub['ultimo_error'] = p_ultimo_error
+    if p_url_publicacion is not None:
+        pub['url_publicacion'] = p_url_publicacion
+    if p_estado == 'publicado':
+        pub['published_at'] = datetime.now(timezone.utc).isoformat()
+    if p_scheduled_time is not None:
+        pub['scheduled_time'] = p_scheduled_time
+    if p_incrementar_intentos:
+        pub['intentos'] = (pub.get('intentos') or 0) + 1
+    if p_lease_owner is not None:
+        pub['lease_owner'] = pub['lease_until'] = None
+    if p_evento_tipo is not None:
+        db.tables.setdefault('eventos_sistema', []).append({
+            "id": str(uuid.uuid4()), "tipo": p_evento_tipo, "publicacion_id": p_publicacion_id,
+            "modelo_id": p_modelo_id, "descripcion": p_evento_descripcion, "realizado_por": p_realizado_por
+        })
+        db.invalidate('eventos_sistema')
+    return [copy.deepcopy(pub)]
+
+
+PRD_FUNCTIONS: Dict[str, Callable] = {
+    'programar_contenido': _rpc_programar_contenido,
+    'transicionar_publicacion': _rpc_transicionar_publicacion,
+}
+
+
+class FakeSupabase:
+    """Cliente en memoria con contador de round-trips"""
+
+    def __init__(self, with_functions: bool = True, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.lock = threading.RLock()
+        self.tables: Dict[str, List[Dict]] = {}
+        self.functions: Dict[str, Callable] = dict(PRD_FUNCTIONS) if with_functions else {}
+        self.query_count = 0
+        self.rows_read = 0
+        self.query_log: List[tuple] = []
+        self.fail_next: Optional[Exception] = None
+        self._id_index: Dict[str, Dict] = {}
+
+    def simulate_latency(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict] = None) -> FakeRPC:
+        return FakeRPC(self, name, params or {})
+
+    def register_function(self, name: str, fn: Callable):
+        """Registra una función RPC: fn(db, **params) -> data"""
+        self.functions[name] = fn
+
+    def seed(self, table: str, rows: List[Dict]):
+        """Carga filas sin contar round-trips"""
+        self.tables.setdefault(table, []).extend(copy.deepcopy(rows))
+        self.invalidate(table)
+
+    def get(self, table: str, row_id) -> Optional[Dict]:
+        if table not in self._id_index:
+            self._id_index[table] = {row.get('id'): row for row in self.tables.get(table, [])}
+        return self._id_index[table].get(row_id)
+
+    def invalidate(self, table: str):
+        self._id_index.pop(table, None)
+
+    def reset_counters(self):
+        self.query_count = 0
+        self.rows_read = 0
+        self.query_log = []
@@ -0,0 +1,22 @@
+-- Lease de publicaciones (Poster PRD)
+-- Permite varias instancias del poster: cada una reclama filas con un
+-- update condicional y las marca con su owner y vencimiento.
+--
+--   UPDATE publicaciones
+--   SET estado = 'procesando', lease_owner = :owner, lease_until = now() + :lease
+--   WHERE id = :id AND estado = 'programada'
+--   RETURNING *;
+--
+-- Solo una instancia obtiene la fila. El reaper del poster devuelve a
+-- 'programada' las filas en 'procesando' con lease_until vencido.
+--
+-- Ejecutar en el SQL Editor de Supabase.
+
+ALTER TABLE publicaciones
+    ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+    ADD COLUMN IF NOT EXISTS lease_until TIMESTAMPTZ;
+
+-- Índice parcial para el reaper (solo filas en proceso)
+CREATE INDEX IF NOT EXISTS idx_publicaciones_lease_procesando
+    ON publicaciones (lease_until)
+    WHERE estado = 'procesando';
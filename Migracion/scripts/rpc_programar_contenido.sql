@@ -0,0 +1,45 @@
+-- RPC programar_contenido (Scheduler PRD)
+-- Crea todas las publicaciones de un contenido y actualiza su estado en una
+-- sola transacción: un round-trip por contenido y todo o nada.
+--
+-- Uso desde Python:
+--   supabase.rpc('programar_contenido', {
+--       "p_contenido_id": contenido_id,
+--       "p_publicaciones": [ {contenido_id, cuenta_plataforma_id, scheduled_time, ...}, ... ],
+--       "p_estado": "aprobado"
+--   }).execute()
+--
+-- Ejecutar en el SQL Editor de Supabase.
+
+CREATE OR REPLACE FUNCTION programar_contenido(
+    p_contenido_id UUID,
+    p_publicaciones JSONB,
+    p_estado TEXT DEFAULT 'aprobado'
+)
+RETURNS SETOF publicaciones
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Bloquear el contenido: dos schedulers no pueden programarlo a la vez
+    PERFORM 1 FROM contenidos
+    WHERE id = p_contenido_id AND estado = 'nuevo'
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'contenido % no está en estado nuevo', p_contenido_id;
+    END IF;
+
+    RETURN QUERY
+    INSERT INTO publicaciones (
+        contenido_id, cuenta_plataforma_id, scheduled_time,
+        caption_usado, tags_usados, estado, intentos
+    )
+    SELECT
+        p_contenido_id, r.cuenta_plataforma_id, r.scheduled_time,
+        r.caption_usado, r.tags_usados, 'programada', 0
+    FROM jsonb_populate_recordset(NULL::publicaciones, p_publicaciones) AS r
+    RETURNING *;
+
+    UPDATE contenidos SET estado = p_estado WHERE id = p_contenido_id;
+END;
+$$;
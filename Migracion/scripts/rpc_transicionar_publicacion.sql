@@ -0,0 +1,73 @@
+-- RPC transicionar_publicacion (Poster PRD)
+-- Cambia el estado de una publicación y registra su evento en una sola
+-- llamada: incremento de intentos atómico en el servidor (sin leer antes)
+-- y evento escrito en la misma transacción que el cambio de estado.
+--
+-- Requiere las columnas de lease (lease_publicaciones.sql). Con
+-- p_lease_owner solo actualiza si el lease sigue siendo de esa instancia
+-- y lo libera; si lo perdió no cambia nada ni registra el evento.
+--
+-- p_scheduled_time reprograma la publicación (reintentos del poster:
+-- 'procesando' → 'programada' en un nuevo horario).
+--
+-- Uso desde Python:
+--   supabase.rpc('transicionar_publicacion', {
+--       "p_publicacion_id": publicacion_id,
+--       "p_estado": "fallido",
+--       "p_ultimo_error": error_msg,
+--       "p_incrementar_intentos": True,
+--       "p_lease_owner": POSTER_ID,
+--       "p_evento_tipo": "publicacion_fallida",
+--       "p_evento_descripcion": error_msg,
+--       "p_modelo_id": modelo_id
+--   }).execute()
+--
+-- Ejecutar en el SQL Editor de Supabase.
+
+-- Versión anterior sin p_scheduled_time (evitar dos sobrecargas)
+DROP FUNCTION IF EXISTS transicionar_publicacion(UUID, TEXT, TEXT, TEXT, BOOLEAN, TEXT, TEXT, TEXT, UUID, TEXT);
+
+CREATE OR REPLACE FUNCTION transicionar_publicacion(
+    p_publicacion_id UUID,
+    p_estado TEXT,
+    p_ultimo_error TEXT DEFAULT NULL,
+    p_url_publicacion TEXT DEFAULT NULL,
+    p_incrementar_intentos BOOLEAN DEFAULT FALSE,
+    p_lease_owner TEXT DEFAULT NULL,
+    p_evento_tipo TEXT DEFAULT NULL,
+    p_evento_descripcion TEXT DEFAULT '',
+    p_modelo_id UUID DEFAULT NULL,
+    p_realizado_por TEXT DEFAULT 'sistema',
+    p_scheduled_time TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS SETOF publicaciones
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_publicacion publicaciones%ROWTYPE;
+BEGIN
+    UPDATE publicaciones SET
+        estado = p_estado,
+        ultimo_error = COALESCE(p_ultimo_error, ultimo_error),
+        url_publicacion = COALESCE(p_url_publicacion, url_publicacion),
+        published_at = CASE WHEN p_estado = 'publicado' THEN now() ELSE published_at END,
+        scheduled_time = COALESCE(p_scheduled_time, scheduled_time),
+        intentos = COALESCE(intentos, 0) + CASE WHEN p_incrementar_intentos THEN 1 ELSE 0 END,
+        lease_owner = CASE WHEN p_lease_owner IS NULL THEN lease_owner END,
+        lease_until = CASE WHEN p_lease_owner IS NULL THEN lease_until END
+    WHERE id = p_publicacion_id
+      AND (p_lease_owner IS NULL OR lease_owner = p_lease_owner)
+    RETURNING * INTO v_publicacion;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    IF p_evento_tipo IS NOT NULL THEN
+        INSERT INTO eventos_sistema (tipo, publicacion_id, modelo_id, descripcion, realizado_por)
+        VALUES (p_evento_tipo, p_publicacion_id, p_modelo_id, p_evento_descripcion, p_realizado_por);
+    END IF;
+
+    RETURN NEXT v_publicacion;
+END;
+$$;
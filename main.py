@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import subprocess
+import shutil
 import time
 import sys
 from pathlib import Path
@@ -8,6 +9,7 @@ BASE_DIR = Path(__file__).resolve().parent
 VENV_PYTHON = BASE_DIR.parent / ".venv" / "bin" / "python3"  # .venv está en el directorio raíz del proyecto
 BOT_MAIN = BASE_DIR / "src" / "project" / "bot_central.py"
 POSTER_MAIN = BASE_DIR / "src" / "project" / "poster_prd.py"
+WORKER_HOST = BASE_DIR / "workers" / "host" / "worker_host.js"  # Opcional: sin él el poster usa npx playwright test
 # KPI_SCHEDULER = BASE_DIR / "src" / "project" / "kpi_scheduler.py"  # DESACTIVADO: migrado a PRD, listo para activación (FASE6-B completada)
 
 # Validar que los archivos principales existan
@@ -32,6 +34,7 @@ else:
 print(f"🚀 Iniciando servicios con: {python_exe}")
 
 processes = []
+p_host = None
 
 try:
     # Iniciar Bot Central
@@ -44,6 +47,15 @@ try:
     p_poster = subprocess.Popen([python_exe, str(POSTER_MAIN)])
     processes.append(p_poster)
 
+    # Worker host (navegador persistente). Opcional: si no arranca o se cae,
+    # el poster ejecuta cada worker con npx playwright test.
+    if WORKER_HOST.exists() and shutil.which("node"):
+        print("🌐 Iniciando Worker Host...")
+        p_host = subprocess.Popen(["node", str(WORKER_HOST)], cwd=str(BASE_DIR))
+        processes.append(p_host)
+    else:
+        print("⚠️  Worker Host no disponible (node o worker_host.js). El poster usará npx playwright test")
+
     # KPI Scheduler desactivado por diseño (migrado a PRD en FASE6-B, listo para activación)
     # Para activar: descomentar KPI_SCHEDULER arriba y este bloque
     # if KPI_SCHEDULER.exists():
@@ -65,6 +77,9 @@ try:
         if p_poster.poll() is not None:
             print("❌ Poster Scheduler se detuvo inesperadamente.")
             break
+        if p_host is not None and p_host.poll() is not None:
+            print("⚠️  Worker Host se detuvo. El poster sigue con npx playwright test.")
+            p_host = None
         # KPI Scheduler desactivado por diseño (listo para activación futura)
         # if KPI_SCHEDULER.exists() and len(processes) > 2:
         #     p_kpi = processes[2]
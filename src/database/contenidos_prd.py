@@ -12,6 +12,8 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
 
+from project.wakeup import notify
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,6 +32,24 @@ if not url or not key:
 
 supabase: Client = create_client(url, key)
 
+# Columna contenidos.content_hash (Migracion/scripts/content_hash_contenidos.sql).
+# Si no existe, los contenidos se crean sin hash y no hay deduplicación.
+_HASH_DISPONIBLE = True
+
+
+def _columna_inexistente(e: Exception) -> bool:
+    """PGRST204 (columna fuera del schema cache) / 42703 (undefined_column)"""
+    return getattr(e, 'code', None) in ('PGRST204', '42703')
+
+
+def _notify_scheduler():
+    """
+    Avisa al scheduler que hay contenido nuevo (best effort, ver project/wakeup.py).
+    main.py no arranca scheduler_prd.py: el aviso solo tiene efecto si el
+    scheduler corre aparte; si nadie escucha, notify no hace nada.
+    """
+    notify('scheduler')
+
 
 def get_modelo_id_by_nombre(modelo_nombre: str) -> Optional[str]:
     """
@@ -55,17 +75,53 @@ def get_modelo_id_by_nombre(modelo_nombre: str) -> Optional[str]:
         return None
 
 
+def get_contenido_by_hash(modelo_nombre: str, content_hash: str) -> Optional[Dict]:
+    """
+    Busca un contenido de la modelo con el mismo hash de archivo (reenvío
+    del mismo clip).
+    
+    Returns:
+        {"id", "archivo_path"} del contenido existente, o None
+    """
+    global _HASH_DISPONIBLE
+    
+    if not content_hash or not _HASH_DISPONIBLE:
+        return None
+    
+    try:
+        response = supabase.table('contenidos')\
+            .select("id, archivo_path, modelos!inner(nombre)")\
+            .eq('modelos.nombre', modelo_nombre)\
+            .eq('content_hash', content_hash)\
+            .limit(1)\
+            .execute()
+        
+        if response.data:
+            return {"id": response.data[0]['id'], "archivo_path": response.data[0]['archivo_path']}
+        return None
+    except Exception as e:
+        if _columna_inexistente(e):
+            logger.warning("⚠️  Columna contenidos.content_hash no instalada, sin deduplicación")
+            _HASH_DISPONIBLE = False
+        else:
+            logger.error(f"Error buscando contenido por hash para '{modelo_nombre}': {e}")
+        return None
+
+
 def create_contenido(
     modelo_nombre: str,
     archivo_path: str,
     contexto_original: str = "",
     enviado_por: str = "",
     caption_generado: str = "",
-    tags_generados: list = None
+    tags_generados: list = None,
+    content_hash: str = ""
 ) -> Optional[str]:
     """
     Crea un contenido en la tabla contenidos (esquema PRD).
-    Implementa idempotencia: no duplica si ya existe.
+    Implementa idempotencia: no duplica si ya existe (mismo archivo_path o,
+    con content_hash, el mismo video ya enviado por la modelo).
+    Para saber si se creó o ya existía, usar registrar_contenido.
     
     Args:
         modelo_nombre: Nombre del modelo (slug)
@@ -74,10 +130,35 @@ def create_contenido(
         enviado_por: Usuario que envió el contenido (telegram_user_id o nombre)
         caption_generado: Caption generado (opcional, puede venir después)
         tags_generados: Lista de tags generados (opcional, puede venir después)
+        content_hash: sha256 del archivo (opcional, para deduplicar)
     
     Returns:
         UUID del contenido creado o existente, None si hay error
     """
+    contenido = registrar_contenido(modelo_nombre, archivo_path, contexto_original, enviado_por,
+                                    caption_generado, tags_generados, content_hash)
+    return contenido["id"] if contenido else None
+
+
+def registrar_contenido(
+    modelo_nombre: str,
+    archivo_path: str,
+    contexto_original: str = "",
+    enviado_por: str = "",
+    caption_generado: str = "",
+    tags_generados: list = None,
+    content_hash: str = ""
+) -> Optional[Dict]:
+    """
+    create_contenido informando si el contenido se creó o ya existía.
+    
+    Returns:
+        {"id", "archivo_path", "creado"} (archivo_path del contenido
+        existente si ya estaba: distinto al pedido = el mismo video con otro
+        archivo, un duplicado), None si hay error
+    """
+    global _HASH_DISPONIBLE
+    
     if tags_generados is None:
         tags_generados = []
     
@@ -89,17 +170,21 @@ def create_contenido(
             return None
         
         # 2. Verificar si ya existe (IDEMPOTENCIA)
-        # Buscar por modelo_id + archivo_path
-        existing = supabase.table('contenidos')\
-            .select("id")\
-            .eq('modelo_id', modelo_id)\
-            .eq('archivo_path', archivo_path)\
-            .execute()
+        # Buscar por modelo_id + archivo_path, o por modelo_id + content_hash
+        query = supabase.table('contenidos')\
+            .select("id, archivo_path")\
+            .eq('modelo_id', modelo_id)
+        if content_hash and _HASH_DISPONIBLE:
+            query = query.or_(f'archivo_path.eq."{archivo_path}",content_hash.eq.{content_hash}')
+        else:
+            query = query.eq('archivo_path', archivo_path)
+        existing = query.limit(2).execute()
         
         if existing.data and len(existing.data) > 0:
-            contenido_id = existing.data[0]['id']
-            logger.info(f"ℹ️  Contenido ya existe: {archivo_path} (ID: {contenido_id})")
-            return contenido_id
+            # El mismo archivo (reproceso de un job) antes que otro archivo con el mismo hash
+            fila = next((f for f in existing.data if f['archivo_path'] == archivo_path), existing.data[0])
+            logger.info(f"ℹ️  Contenido ya existe: {fila['archivo_path']} (ID: {fila['id']})")
+            return {"id": fila['id'], "archivo_path": fila['archivo_path'], "creado": False}
         
         # 3. Crear nuevo contenido
         data = {
@@ -118,17 +203,35 @@ def create_contenido(
         if tags_generados:
             data["tags_generados"] = tags_generados
         
-        result = supabase.table('contenidos').insert(data).execute()
+        if content_hash and _HASH_DISPONIBLE:
+            data["content_hash"] = content_hash
+        
+        try:
+            result = supabase.table('contenidos').insert(data).execute()
+        except Exception as e:
+            # 23505: otro envío del mismo video ganó la carrera (índice único modelo_id + content_hash)
+            if getattr(e, 'code', None) == '23505' and "content_hash" in data:
+                existente = get_contenido_by_hash(modelo_nombre, content_hash)
+                if existente:
+                    logger.info(f"ℹ️  Contenido duplicado por hash: {archivo_path} (ID: {existente['id']})")
+                    return {**existente, "creado": False}
+            raise
         
         if result.data and len(result.data) > 0:
             contenido_id = result.data[0]['id']
             logger.info(f"✅ Contenido creado: {archivo_path} (ID: {contenido_id})")
-            return contenido_id
+            _notify_scheduler()
+            return {"id": contenido_id, "archivo_path": archivo_path, "creado": True}
         else:
             logger.error(f"❌ No se recibió ID al crear contenido: {archivo_path}")
             return None
             
     except Exception as e:
+        if content_hash and _HASH_DISPONIBLE and _columna_inexistente(e):
+            logger.warning("⚠️  Columna contenidos.content_hash no instalada, sin deduplicación")
+            _HASH_DISPONIBLE = False
+            return registrar_contenido(modelo_nombre, archivo_path, contexto_original, enviado_por,
+                                       caption_generado, tags_generados)
         logger.error(f"❌ Error creando contenido '{archivo_path}': {e}")
         import traceback
         traceback.print_exc()
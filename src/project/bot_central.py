@@ -6,13 +6,17 @@ if VENV_PYTHON.exists() and not sys.executable.startswith(str(BASE_DIR / ".venv"
     print(f"⚠️  Ejecuta siempre en el entorno virtual:\n    source {BASE_DIR}/.venv/bin/activate\n")
     os.execv(str(VENV_PYTHON), [str(VENV_PYTHON), __file__] + sys.argv[1:])
 
-import os, json, pathlib, logging
+import os, json, pathlib, logging, asyncio
 from datetime import datetime
 import secrets
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 from dotenv import load_dotenv
 
+import ingest
+from contenido_jobs import ContenidoJob, ContenidoJobQueue, MENSAJE_DUPLICADO
+from model_registry import ModelRegistry
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,50 +36,18 @@ NOMBRE_POR_USER_ID = {} # opcional: puedes mapear ids a nombres
 MODELOS_DIR = BASE_DIR / "modelos"
 MODELOS_DIR.mkdir(parents=True, exist_ok=True)
 
-# Mapeo de telegram_user_id -> nombre_normalizado del modelo
-TELEGRAM_USER_ID_TO_MODEL = {}
+# Mapeo de telegram_user_id -> nombre_normalizado del modelo (índice de config.json)
+model_registry = ModelRegistry(MODELOS_DIR)
 
 def load_models_mapping():
-    """Carga todos los config.json y crea mapeo telegram_user_id -> nombre_normalizado"""
-    global TELEGRAM_USER_ID_TO_MODEL
-    TELEGRAM_USER_ID_TO_MODEL = {}
-    
+    """Relee todos los config.json (arranque y /reload); lookup refresca solo lo que cambió"""
     if not MODELOS_DIR.exists():
         print(f"⚠️  Directorio de modelos no existe: {MODELOS_DIR}")
         return
     
     print(f"🔍 Cargando mapeo de modelos desde {MODELOS_DIR}...")
-    modelos_encontrados = 0
-    
-    for modelo_dir in MODELOS_DIR.iterdir():
-        if not modelo_dir.is_dir():
-            continue
-        
-        config_path = modelo_dir / "config.json"
-        if not config_path.exists():
-            continue
-        
-        try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                config = json.load(f)
-            
-            telegram_user_id = config.get("telegram_user_id", "").strip()
-            nombre_normalizado = modelo_dir.name
-            
-            if telegram_user_id:
-                # Guardar mapeo usando user_id como string (para comparación fácil)
-                TELEGRAM_USER_ID_TO_MODEL[telegram_user_id] = nombre_normalizado
-                # También guardar como int por si acaso
-                try:
-                    TELEGRAM_USER_ID_TO_MODEL[int(telegram_user_id)] = nombre_normalizado
-                except ValueError:
-                    pass
-                
-                modelos_encontrados += 1
-                print(f"  ✅ User ID {telegram_user_id} -> {nombre_normalizado}")
-        except Exception as e:
-            print(f"  ⚠️  Error cargando {config_path}: {e}")
-            continue
+    model_registry.refresh(force=True)
+    modelos_encontrados = len(model_registry)
     
     print(f"✅ Mapeo cargado: {modelos_encontrados} modelos encontrados")
     if modelos_encontrados == 0:
@@ -93,12 +65,8 @@ def get_modelo_by_telegram_user(user) -> str:
     Returns:
         str: nombre normalizado del modelo
     """
-    # Buscar por user.id (método principal)
-    user_id_str = str(user.id)
-    user_id_int = user.id
-    
-    modelo = TELEGRAM_USER_ID_TO_MODEL.get(user_id_str) or \
-             TELEGRAM_USER_ID_TO_MODEL.get(user_id_int)
+    # Buscar por user.id (método principal, O(1); refresca el índice si no está)
+    modelo = model_registry.lookup(user.id)
     
     if modelo:
         return modelo
@@ -114,6 +82,9 @@ def get_modelo_by_telegram_user(user) -> str:
 # Cargar mapeo al iniciar
 load_models_mapping()
 
+# Cola de procesamiento de contenidos (registro en PRD + caption)
+contenido_queue = ContenidoJobQueue()
+
 # Opciones disponibles para botones interactivos
 QUE_VENDES_OPCIONES = [
     ("tetas", "🍑 Tetas"),
@@ -194,7 +165,7 @@ async def reload_models(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     load_models_mapping()
-    total = len(set(TELEGRAM_USER_ID_TO_MODEL.values()))  # Contar modelos únicos
+    total = len(model_registry)  # Contar modelos únicos
     await update.message.reply_text(
         f"✅ **Mapeo recargado**\n\n"
         f"📊 Modelos encontrados: {total}\n"
@@ -202,6 +173,27 @@ async def reload_models(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
+async def avisar_si_duplicado(update: Update, status_msg, modelo: str, content_hash: str) -> bool:
+    """
+    Si la modelo ya envió este mismo video (mismo hash), se lo avisa y
+    retorna True: no se crea otro archivo, contenido ni publicaciones.
+    """
+    if str(BASE_DIR / "src") not in sys.path:
+        sys.path.append(str(BASE_DIR / "src"))
+    from database.contenidos_prd import get_contenido_by_hash
+    
+    loop = asyncio.get_running_loop()
+    existente = await loop.run_in_executor(None, get_contenido_by_hash, modelo, content_hash)
+    if not existente:
+        return False
+    
+    logger.info(f"♻️  Video duplicado de {modelo}: {existente['archivo_path']} (hash {content_hash[:12]})")
+    await status_msg.edit_text(
+        MENSAJE_DUPLICADO,
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📹 Enviar vídeo nuevo", callback_data="nuevo")]])
+    )
+    return True
+
 async def video_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     modelo = get_modelo_by_telegram_user(user)
@@ -211,23 +203,21 @@ async def video_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     modelo_existe = modelo_dir.exists()
     
     if not modelo_existe:
-        # Recargar mapeo por si se creó un modelo nuevo
-        load_models_mapping()
-        modelo = get_modelo_by_telegram_user(user)
-        modelo_dir = MODELOS_DIR / modelo
-        modelo_existe = modelo_dir.exists()
-        
-        if not modelo_existe:
-            warning_msg = (
-                f"⚠️ **Advertencia:** No se encontró modelo configurado para tu usuario.\n"
-                f"User ID: {user.id}\n"
-                f"Se usará: `{modelo}`\n\n"
-                f"💡 Asegúrate de crear el modelo desde el panel admin con tu Telegram User ID ({user.id})."
-            )
-            await update.message.reply_text(warning_msg, parse_mode="Markdown")
+        # get_modelo_by_telegram_user ya refrescó el índice (un modelo recién
+        # creado se reconoce sin releer todos los config.json)
+        warning_msg = (
+            f"⚠️ **Advertencia:** No se encontró modelo configurado para tu usuario.\n"
+            f"User ID: {user.id}\n"
+            f"Se usará: `{modelo}`\n\n"
+            f"💡 Asegúrate de crear el modelo desde el panel admin con tu Telegram User ID ({user.id})."
+        )
+        await update.message.reply_text(warning_msg, parse_mode="Markdown")
     
     file = update.message.video or update.message.document
-    await update.message.reply_text("Descargando vídeo grande…")
+    status_msg = await update.message.reply_text(
+        "Descargando vídeo grande…" if not ingest.busy()
+        else "⏳ Hay otros vídeos copiándose, el tuyo entra en cola…"
+    )
     
     # Ruta absoluta dentro de Trafico/modelos/
     modelo_dir.mkdir(parents=True, exist_ok=True)
@@ -242,66 +232,44 @@ async def video_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"🔍 DEBUG: file_path={telegram_file.file_path}")
     logger.info(f"🔍 DEBUG: file_size={telegram_file.file_size}")
     
-    file_path = telegram_file.file_path
-    
-    # Con local_mode=True, el servidor devuelve rutas del contenedor Docker
-    # Necesitamos mapear las rutas y copiar el archivo
-    if "/var/lib/telegram-bot-api/" in file_path:
-        # Extraer solo la parte de la ruta (eliminar prefijo de URL si existe)
-        import shutil
-        if "//var/lib/telegram-bot-api/" in file_path:
-            # Caso: https://api.telegram.org/file/bot...//var/lib/telegram-bot-api/...
-            local_container_path = "/var/lib/telegram-bot-api/" + file_path.split("//var/lib/telegram-bot-api/")[1]
-        else:
-            # Caso: /var/lib/telegram-bot-api/...
-            local_container_path = file_path
-        
-        # Mapear del contenedor al host
-        home_dir = os.path.expanduser("~")
-        local_path = local_container_path.replace("/var/lib/telegram-bot-api", f"{home_dir}/.telegram-bot-api")
-        
+    # Con local_mode=True, el servidor devuelve rutas del contenedor Docker:
+    # el archivo ya está en el host y se copia en el pool de ingest (no
+    # bloquea el event loop: las demás modelos siguen usando el bot)
+    local_path = ingest.resolve_local_path(telegram_file.file_path)
+    if local_path:
         logger.info(f"📥 Copiando desde: {local_path}")
         
-        try:
-            # Copiar directamente (permisos 777 ya configurados)
-            shutil.copy2(local_path, ruta)
-            logger.info(f"✅ Archivo copiado exitosamente: {os.path.getsize(ruta)} bytes")
-        except PermissionError as e:
-            logger.warning(f"⚠️ Error de permisos detectado, aplicando fix automático...")
-            # Fix automático: cambiar permisos del archivo específico
-            # Usa sudoers configurado en /etc/sudoers.d/100trafico (sin contraseña)
-            import subprocess
+        async def mostrar_progreso(copiados: int, total: int):
             try:
-                subprocess.run(
-                    ['sudo', 'chmod', '777', local_path],
-                    check=True,
-                    capture_output=True,
-                    timeout=5
+                await status_msg.edit_text(
+                    f"📥 Copiando vídeo… {100 * copiados / total:.0f}% "
+                    f"({copiados / 1e6:.0f}/{total / 1e6:.0f} MB)"
                 )
-                # Intentar copiar nuevamente
-                shutil.copy2(local_path, ruta)
-                logger.info(f"✅ Archivo copiado exitosamente después de fix: {os.path.getsize(ruta)} bytes")
-            except subprocess.TimeoutExpired:
-                logger.error(f"❌ Timeout al ejecutar chmod (¿sudoers configurado?)")
-                logger.error(f"   Verifica: sudo visudo -c")
-                raise
-            except subprocess.CalledProcessError as e2:
-                logger.error(f"❌ Error al aplicar permisos: {e2}")
-                logger.error(f"   Salida: {e2.stderr.decode() if e2.stderr else 'N/A'}")
-                logger.error(f"   Verifica configuración en /etc/sudoers.d/100trafico")
-                raise
-            except Exception as e2:
-                logger.error(f"❌ Error inesperado: {e2}")
-                raise
+            except Exception:
+                pass  # Mensaje sin cambios o borrado: el progreso es opcional
+        
+        try:
+            # El hash sale de la misma lectura que la copia (sin otra pasada por el video)
+            size, content_hash = await ingest.ingest_local_file(local_path, ruta, mostrar_progreso)
+            logger.info(f"✅ Archivo copiado exitosamente: {size} bytes")
         except Exception as e:
             logger.error(f"❌ Error al copiar: {e}")
+            await status_msg.edit_text("❌ No se pudo guardar el vídeo. Inténtalo de nuevo o contacta al administrador.")
             raise
+        if await avisar_si_duplicado(update, status_msg, modelo, content_hash):
+            os.unlink(ruta)
+            return
     else:
         # Fallback: descarga HTTP normal
         logger.info(f"📥 Descargando vía HTTP...")
         await telegram_file.download_to_drive(ruta)
         logger.info(f"✅ Archivo descargado: {os.path.getsize(ruta)} bytes")
+        content_hash = await ingest.content_hash(ruta)
+        if await avisar_si_duplicado(update, status_msg, modelo, content_hash):
+            os.unlink(ruta)
+            return
     context.user_data["video_ruta"] = ruta
+    context.user_data["content_hash"] = content_hash
     context.user_data["modelo"] = modelo
     context.user_data["que_vendes"] = []  # Inicializar selección
     context.user_data["outfit"] = []  # Inicializar selección
@@ -387,9 +355,6 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.answer("⚠️ Selecciona al menos un outfit", show_alert=True)
             return
         
-        await query.edit_message_text("⏳ Procesando video...")
-        
-        # Procesar igual que antes
         modelo = user_data["modelo"]
         video_ruta = user_data["video_ruta"]
         video_nombre = pathlib.Path(video_ruta).name
@@ -402,13 +367,11 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         metadata = {
             "que_vendes": que_vendes,
             "outfit": outfit,
-            "video_filename": video_nombre
+            "video_filename": video_nombre,
+            "content_hash": user_data.get("content_hash", "")
         }
         json.dump(metadata, open(meta_path, "w"), ensure_ascii=False, indent=2)
         
-        # Construir contexto original para el contenido
-        contexto_original = f"Qué vendes: {', '.join(que_vendes)}\nOutfit: {', '.join(outfit)}"
-        
         # Construir archivo_path relativo (ej: "modelos/{modelo}/{video}")
         archivo_path = f"modelos/{modelo}/{video_nombre}"
         
@@ -416,80 +379,25 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         enviado_por = f"telegram_{user.id}" if user else "unknown"
         
-        # FASE 4A: Crear contenido en PRD (antes de generar caption)
-        # Esto asegura que el contenido existe aunque falle la generación de caption
-        try:
-            if str(BASE_DIR / "src") not in sys.path:
-                sys.path.append(str(BASE_DIR / "src"))
-            from database.contenidos_prd import create_contenido, update_contenido_caption_tags
-            
-            contenido_id = create_contenido(
-                modelo_nombre=modelo,
-                archivo_path=archivo_path,
-                contexto_original=contexto_original,
-                enviado_por=enviado_por
-            )
-            
-            if not contenido_id:
-                logger.error(f"❌ No se pudo crear contenido para {archivo_path}")
-                await query.edit_message_text(
-                    f"❌ **Error:** No se pudo crear el contenido en la base de datos.\n\n"
-                    f"Contacta al administrador.",
-                    parse_mode="Markdown"
-                )
-                user_data.clear()
-                return
-        except Exception as e:
-            logger.error(f"❌ Error creando contenido: {e}")
-            import traceback
-            traceback.print_exc()
-            await query.edit_message_text(
-                f"❌ **Error:** Error al crear contenido: {str(e)[:100]}\n\n"
-                f"Contacta al administrador.",
-                parse_mode="Markdown"
-            )
-            user_data.clear()
-            return
-        
-        # Generar caption y tags (sin insertar en tabla dinámica)
-        try:
-            from caption import generate_caption_and_tags
-            
-            result = generate_caption_and_tags(modelo, meta_path)
-            
-            if result.success:
-                # Actualizar contenido con caption y tags
-                update_contenido_caption_tags(
-                    contenido_id=contenido_id,
-                    caption_generado=result.caption,
-                    tags_generados=result.tags
-                )
-                
-                # Guardar backup local (compatibilidad)
-                from caption import persist_caption_result
-                persist_caption_result(meta_path, result.caption, result.tags)
-                
-                caption_msg = "✅ Caption y tags generados"
-            else:
-                caption_msg = f"⚠️ Caption: {result.error[:50]}"
-                logger.warning(f"Error generando caption: {result.error}")
-        except Exception as e:
-            caption_msg = f"⚠️ Error generando caption: {str(e)[:50]}"
-            logger.error(f"Error en generación de caption: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        # FASE 4A: NO crear publicaciones ni llamar a scheduler
-        # Eso se hará en FASE 4B
+        # Registro del contenido + caption (Gemini) en segundo plano: el bot
+        # responde ya y avisa con otro mensaje cuando termina
+        delante = await contenido_queue.submit(ContenidoJob(
+            chat_id=query.message.chat_id,
+            modelo=modelo,
+            archivo_path=archivo_path,
+            meta_path=meta_path,
+            enviado_por=enviado_por,
+            que_vendes=que_vendes,
+            outfit=outfit,
+            content_hash=user_data.get("content_hash", "")
+        ), context.bot)
         
+        espera = f" (hay {delante} antes que el tuyo)" if delante else ""
         await query.edit_message_text(
-            f"✅ **¡Contenido creado!**\n\n"
+            f"📥 **¡Vídeo recibido!**\n\n"
             f"📝 Qué vendes: {', '.join(que_vendes)}\n"
-            f"👗 Outfit: {', '.join(outfit)}\n"
-            f"📄 {caption_msg}\n\n"
-            f"💡 El contenido está listo. Las publicaciones se programarán después.\n\n"
-            "¿Otro vídeo?",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Sí, otro", callback_data="nuevo")]]),
+            f"👗 Outfit: {', '.join(outfit)}\n\n"
+            f"⏳ Registrando el contenido y generando el caption{espera}. Te aviso cuando esté listo.",
             parse_mode="Markdown"
         )
         user_data.clear()
@@ -516,15 +424,17 @@ app = (
     .base_url(TELEGRAM_BASE_URL)
     .local_mode(True)  # ✅ NECESARIO cuando el servidor usa --local
     .request(request)
+    .post_init(lambda application: contenido_queue.start(application.bot))  # Reencola jobs pendientes
     .build()
 )
 app.add_handler(CommandHandler("start", start))
 app.add_handler(CommandHandler("reload", reload_models))  # Comando para recargar modelos
 app.add_handler(CallbackQueryHandler(callback_handler))  # Maneja todos los botones
-app.add_handler(MessageHandler(filters.VIDEO | filters.Document.ALL, video_handler))
+# block=False: la ingesta de un vídeo no frena los updates de las demás modelos
+app.add_handler(MessageHandler(filters.VIDEO | filters.Document.ALL, video_handler, block=False))
 # Ya no necesitamos texto_handler, todo es con botones
 print("BOT CENTRAL corriendo – recibe de todas las modelos al mismo tiempo")
-total_modelos = len(set(TELEGRAM_USER_ID_TO_MODEL.values()))  # Contar modelos únicos
+total_modelos = len(model_registry)  # Contar modelos únicos
 print(f"📊 Modelos mapeados: {total_modelos} modelos")
 if total_modelos > 0:
     print("💡 Usa /reload para recargar el mapeo después de crear un modelo nuevo")
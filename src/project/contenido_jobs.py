@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Contenido Jobs - Procesamiento de contenidos fuera del event loop del bot
+Al tocar "Procesar Video" el bot responde al instante y encola el trabajo
+lento: registro del contenido en Supabase, caption con Gemini (con
+reintentos y sleeps) y guardado de caption/tags. Cuando termina, la modelo
+recibe un mensaje con el resultado.
+
+- Cola asyncio con CONTENIDO_JOB_WORKERS consumidores; cada job corre en
+  un pool de hilos propio (no compite con el pool de ingest)
+- Cada job se guarda en disco (logs/contenido_jobs/<id>.json) hasta
+  terminar: si el bot se reinicia, los pendientes se reprocesan al arrancar
+  (registrar_contenido es idempotente por archivo_path)
+- Si el video resulta ser de un contenido que ya existe con otro archivo
+  (mismo content_hash, p. ej. dos envíos simultáneos del mismo clip) no se
+  toca ese contenido: se borra la copia nueva y se avisa a la modelo
+"""
+
+import os
+import sys
+import json
+import uuid
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+JOBS_DIR = BASE_DIR / "logs" / "contenido_jobs"
+CONTENIDO_JOB_WORKERS = int(os.getenv("CONTENIDO_JOB_WORKERS", "2"))
+
+MENSAJE_DUPLICADO = (
+    "♻️ Este vídeo ya lo habías enviado antes, así que no lo vuelvo a guardar ni a publicar.\n\n"
+    "¿Tienes otro?"
+)
+
+
+@dataclass
+class ContenidoJob:
+    """Un contenido recibido por Telegram pendiente de registrar"""
+    chat_id: int
+    modelo: str
+    archivo_path: str
+    meta_path: str
+    enviado_por: str
+    que_vendes: List[str]
+    outfit: List[str]
+    content_hash: str = ""
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @property
+    def contexto_original(self) -> str:
+        return f"Qué vendes: {', '.join(self.que_vendes)}\nOutfit: {', '.join(self.outfit)}"
+
+
+def process_contenido_job(job: ContenidoJob) -> Tuple[bool, str]:
+    """
+    Trabajo bloqueante: contenido en PRD, caption/tags y backup local.
+
+    Returns:
+        (éxito, mensaje para la modelo)
+    """
+    if str(BASE_DIR / "src") not in sys.path:
+        sys.path.append(str(BASE_DIR / "src"))
+    from database.contenidos_prd import registrar_contenido, update_contenido_caption_tags
+    from caption import generate_caption_and_tags, persist_caption_result
+
+    # FASE 4A: Crear contenido en PRD (antes de generar caption)
+    # Esto asegura que el contenido existe aunque falle la generación de caption
+    try:
+        contenido = registrar_contenido(
+            modelo_nombre=job.modelo,
+            archivo_path=job.archivo_path,
+            contexto_original=job.contexto_original,
+            enviado_por=job.enviado_por,
+            content_hash=job.content_hash
+        )
+    except Exception as e:
+        logger.exception(f"❌ Error creando contenido: {e}")
+        return False, (f"❌ **Error:** Error al crear contenido: {str(e)[:100]}\n\n"
+                       f"Contacta al administrador.")
+    if not contenido:
+        logger.error(f"❌ No se pudo crear contenido para {job.archivo_path}")
+        return False, ("❌ **Error:** No se pudo crear el contenido en la base de datos.\n\n"
+                       "Contacta al administrador.")
+    contenido_id = contenido["id"]
+
+    if not contenido["creado"] and contenido["archivo_path"] != job.archivo_path:
+        # El mismo video ya es otro contenido: no pisar su caption ni dejar la copia huérfana
+        logger.info(f"♻️  Video duplicado de {job.modelo}: {job.archivo_path} ya es {contenido['archivo_path']}")
+        for path in (BASE_DIR / job.archivo_path, Path(job.meta_path)):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"⚠️  No se pudo borrar {path}: {e}")
+        return True, MENSAJE_DUPLICADO
+
+    # Generar caption y tags (sin insertar en tabla dinámica)
+    try:
+        result = generate_caption_and_tags(job.modelo, job.meta_path)
+        if result.success:
+            update_contenido_caption_tags(
+                contenido_id=contenido_id,
+                caption_generado=result.caption,
+                tags_generados=result.tags
+            )
+            # Guardar backup local (compatibilidad)
+            persist_caption_result(job.meta_path, result.caption, result.tags)
+            caption_msg = "✅ Caption y tags generados"
+        else:
+            caption_msg = f"⚠️ Caption: {result.error[:50]}"
+            logger.warning(f"Error generando caption: {result.error}")
+    except Exception as e:
+        caption_msg = f"⚠️ Error generando caption: {str(e)[:50]}"
+        logger.exception(f"Error en generación de caption: {e}")
+
+    return True, (
+        f"✅ **¡Contenido creado!**\n\n"
+        f"📝 Qué vendes: {', '.join(job.que_vendes)}\n"
+        f"👗 Outfit: {', '.join(job.outfit)}\n"
+        f"📄 {caption_msg}\n\n"
+        f"💡 El contenido está listo. Las publicaciones se programarán después.\n\n"
+        "¿Otro vídeo?"
+    )
+
+
+class ContenidoJobQueue:
+    """Cola de jobs con consumidores asyncio y persistencia en disco"""
+
+    def __init__(self, jobs_dir: Path = JOBS_DIR, workers: int = CONTENIDO_JOB_WORKERS):
+        self.jobs_dir = Path(jobs_dir)
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="contenido")
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._bot = None
+
+    async def start(self, bot):
+        """Arranca los consumidores y reencola los jobs pendientes de una ejecución anterior"""
+        if self._queue is not None:
+            return
+        self._bot = bot
+        self._queue = asyncio.Queue()
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+        pendientes = 0
+        for path in sorted(self.jobs_dir.glob("*.json")):
+            try:
+                job = ContenidoJob(**json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"⚠️  Job ilegible {path}, descartado: {e}")
+                path.unlink(missing_ok=True)
+                continue
+            self._queue.put_nowait(job)
+            pendientes += 1
+        if pendientes:
+            logger.info(f"♻️  {pendientes} contenido(s) pendientes de una ejecución anterior")
+
+    async def submit(self, job: ContenidoJob, bot=None) -> int:
+        """Guarda y encola un job. Retorna cuántos tiene delante"""
+        if self._queue is None:
+            await self.start(bot)
+        self._write(job)
+        delante = self._queue.qsize()
+        self._queue.put_nowait(job)
+        return delante
+
+    # ---- Interno ----
+    def _write(self, job: ContenidoJob):
+        tmp = self.jobs_dir / f"{job.id}.tmp"
+        tmp.write_text(json.dumps(asdict(job), ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.jobs_dir / f"{job.id}.json")
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                ok, mensaje = await loop.run_in_executor(self._executor, process_contenido_job, job)
+                (self.jobs_dir / f"{job.id}.json").unlink(missing_ok=True)
+                await self._notify(job, ok, mensaje)
+            except Exception as e:
+                logger.exception(f"❌ Error procesando contenido {job.archivo_path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _notify(self, job: ContenidoJob, ok: bool, mensaje: str):
+        botones = InlineKeyboardMarkup([[InlineKeyboardButton("Sí, otro", callback_data="nuevo")]]) if ok else None
+        try:
+            await self._bot.send_message(chat_id=job.chat_id, text=mensaje, reply_markup=botones, parse_mode="Markdown")
+        except Exception as e:
+            logger.warning(f"⚠️  No se pudo avisar a {job.chat_id} ({job.archivo_path}): {e}")
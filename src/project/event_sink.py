@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Event Sink - Escritura asíncrona y por lotes de eventos_sistema
+create_evento_sistema ya no hace un INSERT bloqueante por evento: el evento
+se agrega a un buffer en memoria y un hilo lo envía en bulk inserts cuando
+se juntan EVENT_BATCH_SIZE eventos o pasan EVENT_FLUSH_SECONDS.
+
+Durabilidad: cada evento se anota antes en un journal NDJSON en disco
+(un archivo por proceso, bajo flock). Al arrancar, los journals huérfanos
+de procesos caídos se reenvían. Cada evento lleva un id generado en el
+cliente y el envío es upsert con ignore_duplicates, así un reenvío tras
+un crash entre el insert y el truncado del journal no duplica filas.
+"""
+
+import os
+import json
+import uuid
+import fcntl
+import atexit
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "50"))
+EVENT_FLUSH_SECONDS = float(os.getenv("EVENT_FLUSH_SECONDS", "2"))
+
+
+class EventSink:
+    """Buffer de eventos con flush por tamaño/tiempo y journal en disco"""
+
+    def __init__(
+        self,
+        send_fn: Callable[[List[Dict]], None],
+        journal_dir: Path,
+        batch_size: int = EVENT_BATCH_SIZE,
+        flush_seconds: float = EVENT_FLUSH_SECONDS
+    ):
+        """
+        Args:
+            send_fn: Envía un lote de filas (lanza excepción si falla)
+            journal_dir: Carpeta de journals (uno por proceso)
+        """
+        self.send_fn = send_fn
+        self.journal_dir = Path(journal_dir)
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+
+        self._lock = threading.Lock()
+        # Un solo flush a la vez (hilo de fondo, close() y llamadas explícitas):
+        # dos envíos del mismo lote borrarían del buffer eventos no enviados
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._buffer: List[Dict] = []
+        self._journal = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    # ---- API ----
+    def start(self):
+        """Abre el journal del proceso, adopta los huérfanos y arranca el hilo de flush"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            journal_path = self._open_journal()
+
+            # Con el mismo pid que una ejecución anterior (contenedores) el
+            # journal ya existe: su contenido también está pendiente
+            recuperados = self._read_lines(self._journal)
+            otros, huerfanos = self._read_orphans(journal_path)
+            recuperados.extend(otros)
+            if recuperados:
+                logger.info(f"♻️  {len(recuperados)} evento(s) pendientes de una ejecución anterior")
+                self._buffer.extend(recuperados)
+                self._rewrite_journal()
+            # Borrar los huérfanos solo cuando ya están en nuestro journal
+            for path in huerfanos:
+                path.unlink(missing_ok=True)
+
+            self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, evento: Dict):
+        """Encola un evento (no bloquea por red). Tras close() se descarta con aviso"""
+        if self._closed:
+            logger.warning(f"⚠️  Evento descartado, event sink cerrado: {evento.get('tipo')}")
+            return
+        if self._thread is None:
+            self.start()
+        evento = {"id": str(uuid.uuid4()), **evento}
+        with self._lock:
+            if self._journal.closed:
+                logger.warning(f"⚠️  Evento descartado, event sink cerrado: {evento.get('tipo')}")
+                return
+            self._buffer.append(evento)
+            self._journal.write(json.dumps(evento, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            lleno = len(self._buffer) >= self.batch_size
+        if lleno:
+            self._wake.set()
+
+    def flush(self) -> bool:
+        """Envía todo lo pendiente. Retorna False si el envío falló (queda en buffer y journal)"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    lote = self._buffer[:self.batch_size]
+                if not lote:
+                    return True
+                try:
+                    self.send_fn(lote)
+                    procesados, ok = len(lote), True
+                except Exception as e:
+                    if getattr(e, 'code', None) is None:
+                        logger.warning(f"⚠️  No se pudieron enviar {len(lote)} evento(s), se reintentará: {e}")
+                        return False
+                    # El servidor rechazó el lote (p. ej. un tipo inválido): uno a uno,
+                    # descartando solo los rechazados para no bloquear la cola
+                    procesados, ok = self._send_one_by_one(lote)
+                with self._lock:
+                    del self._buffer[:procesados]
+                    self._rewrite_journal()
+                if not ok:
+                    return False
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def close(self):
+        """Último flush y cierre del journal (si quedó algo, se reenvía al próximo arranque)"""
+        if self._closed or self._thread is None:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self.flush()
+        with self._lock:
+            vacio = not self._buffer
+            journal_path = Path(self._journal.name)
+            self._journal.close()
+        if vacio:
+            journal_path.unlink(missing_ok=True)
+
+    # ---- Interno ----
+    def _open_journal(self) -> Path:
+        """
+        Abre y bloquea el journal del proceso (con el lock tomado).
+        Si otro proceso vivo tiene el mismo nombre (mismo pid en otro
+        contenedor sobre el volumen de logs compartido) se usa uno único.
+        """
+        journal_path = self.journal_dir / f"eventos_{os.getpid()}.ndjson"
+        journal = open(journal_path, 'a+', encoding='utf-8')
+        try:
+            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            journal.close()
+            logger.info(f"ℹ️  Journal {journal_path.name} en uso por otro proceso, se usa uno propio")
+            journal_path = self.journal_dir / f"eventos_{os.getpid()}_{uuid.uuid4().hex[:8]}.ndjson"
+            journal = open(journal_path, 'a+', encoding='utf-8')
+            self._lock_journal(journal)
+        except OSError as e:
+            # Filesystem sin flock: el journal sirve igual, sin protección entre procesos
+            logger.warning(f"⚠️  Journal {journal_path.name} sin flock: {e}")
+        self._journal = journal
+        return journal_path
+
+    @staticmethod
+    def _lock_journal(journal):
+        try:
+            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            logger.warning(f"⚠️  Journal {Path(journal.name).name} sin flock: {e}")
+
+    def _send_one_by_one(self, lote: List[Dict]) -> Tuple[int, bool]:
+        """Retorna (eventos procesados, sin errores de red)"""
+        for i, evento in enumerate(lote):
+            try:
+                self.send_fn([evento])
+            except Exception as e:
+                if getattr(e, 'code', None) is None:
+                    return i, False
+                logger.error(f"❌ Evento descartado ({evento.get('tipo')}): {e}")
+        return len(lote), True
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def _rewrite_journal(self):
+        """Deja en el journal solo los eventos aún en buffer (con el lock tomado)"""
+        if self._journal.closed:
+            return
+        self._journal.seek(0)
+        self._journal.truncate()
+        for evento in self._buffer:
+            self._journal.write(json.dumps(evento, ensure_ascii=False) + "\n")
+        self._journal.flush()
+
+    def _read_orphans(self, own_path: Path) -> Tuple[List[Dict], List[Path]]:
+        """Lee los journals de procesos que ya no los tienen bloqueados"""
+        eventos: List[Dict] = []
+        huerfanos: List[Path] = []
+        for path in sorted(self.journal_dir.glob("eventos_*.ndjson")):
+            if path == own_path:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # Proceso vivo
+                    eventos.extend(self._read_lines(f))
+                huerfanos.append(path)
+            except OSError as e:
+                logger.warning(f"⚠️  No se pudo leer journal {path}: {e}")
+        return eventos, huerfanos
+
+    @staticmethod
+    def _read_lines(f) -> List[Dict]:
+        f.seek(0)
+        eventos = []
+        for line in f:
+            try:
+                eventos.append(json.loads(line))
+            except ValueError:
+                continue  # Línea cortada por el crash
+        return eventos
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Ingest - Ingreso de videos desde el Bot API local de Telegram
+Lleva el archivo que dejó el servidor del Bot API (~/.telegram-bot-api)
+a modelos/<modelo>/ sin bloquear el event loop del bot:
+
+- el archivo ya está en el host: se intenta no copiar ningún byte, en orden
+  1. os.link (hardlink, mismo filesystem)
+  2. reflink FICLONE (btrfs/xfs: copia compartiendo bloques)
+  3. os.rename, solo con INGEST_MOVE_SOURCE=true (la copia del servidor
+     es descartable)
+  4. copia en el kernel (copy_file_range / sendfile) por bloques
+  5. copia por bloques en Python
+- corre en un pool de hilos acotado (INGEST_MAX_PARALLEL): varios videos
+  grandes de distintas modelos no saturan el disco ni el bot
+- las copias reportan progreso (bytes, total) y se retoman si se cortan:
+  .part junto al destino y un sidecar .part.src con (tamaño, mtime, inodo)
+  del origen. Solo se retoma si el origen es el mismo archivo (el Bot API
+  reutiliza nombres file_N.mp4); si no, se empieza de cero. Las .part
+  abandonadas más de INGEST_PART_MAX_AGE_HOURS se borran
+- content_hash: sha256 del video para detectar reenvíos del mismo clip.
+  En la copia por bloques se calcula con los mismos bytes que se copian;
+  con hardlink/reflink/rename no se copió nada y se lee el destino
+- si falla por permisos se aplica el fix con sudo chmod (sudoers en
+  /etc/sudoers.d/100trafico) y se reintenta con una copia real, también
+  fuera del loop
+"""
+
+import os
+import json
+import time
+import errno
+import fcntl
+import hashlib
+import shutil
+import asyncio
+import logging
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INGEST_MAX_PARALLEL = int(os.getenv("INGEST_MAX_PARALLEL", "2"))
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+# Progreso al usuario: como máximo cada PROGRESS_MIN_SECONDS
+PROGRESS_MIN_SECONDS = 3.0
+# Mover en vez de enlazar/copiar: el servidor del Bot API no vuelve a usar el archivo
+INGEST_MOVE_SOURCE = os.getenv("INGEST_MOVE_SOURCE", "false").lower() == "true"
+# Copias parciales sin retomar más de esto se consideran abandonadas
+INGEST_PART_MAX_AGE_HOURS = float(os.getenv("INGEST_PART_MAX_AGE_HOURS", "24"))
+
+# ioctl FICLONE (linux/fs.h): reflink del archivo completo
+FICLONE = 0x40049409
+# Errores que indican "esta estrategia no aplica aquí": probar la siguiente
+_NO_SOPORTADO = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EOPNOTSUPP, errno.ENOTTY,
+                 errno.EINVAL, errno.ENOSYS, errno.EMLINK, errno.EBADF}
+
+# Rutas del contenedor del Bot API (local_mode) y su volumen en el host
+CONTAINER_DIR = "/var/lib/telegram-bot-api"
+HOST_DIR = os.path.join(os.path.expanduser("~"), ".telegram-bot-api")
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_MAX_PARALLEL, thread_name_prefix="ingest")
+_lock = threading.Lock()
+_activos = 0
+
+ProgressFn = Callable[[int, int], None]
+
+
+def resolve_local_path(file_path: str) -> Optional[str]:
+    """
+    Ruta en el host del archivo que devolvió el Bot API en local_mode.
+    None si el archivo no está en el volumen local (descargar por HTTP).
+    """
+    if CONTAINER_DIR + "/" not in file_path:
+        return None
+    if "/" + CONTAINER_DIR + "/" in file_path:
+        # Caso: https://api.telegram.org/file/bot...//var/lib/telegram-bot-api/...
+        file_path = CONTAINER_DIR + "/" + file_path.split("/" + CONTAINER_DIR + "/")[1]
+    return file_path.replace(CONTAINER_DIR, HOST_DIR, 1)
+
+
+def fix_permissions(local_path: str):
+    """
+    sudo chmod sobre el archivo del Bot API (sin contraseña vía sudoers).
+    Cambia el modo del inodo: afecta al almacenamiento del Bot API y a
+    cualquier hardlink del archivo. Por eso, tras aplicarlo, copy_local_file
+    hace una copia real y nunca enlaza el archivo en modelos/.
+    """
+    try:
+        subprocess.run(['sudo', 'chmod', '777', local_path], check=True, capture_output=True, timeout=5)
+    except subprocess.TimeoutExpired:
+        logger.error("❌ Timeout al ejecutar chmod (¿sudoers configurado?)")
+        logger.error("   Verifica: sudo visudo -c")
+        raise
+    except subprocess.CalledProcessError as e:
+        logger.error(f"❌ Error al aplicar permisos: {e}")
+        logger.error(f"   Salida: {e.stderr.decode() if e.stderr else 'N/A'}")
+        logger.error("   Verifica configuración en /etc/sudoers.d/100trafico")
+        raise
+
+
+def _try_link(src: str, dst: str) -> bool:
+    try:
+        os.link(src, dst)
+        return True
+    except OSError as e:
+        if e.errno in _NO_SOPORTADO:
+            return False
+        raise
+
+
+def _try_reflink(src: str, dst: str) -> bool:
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError as e:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        if e.errno in _NO_SOPORTADO:
+            return False
+        raise
+    shutil.copystat(src, dst)
+    return True
+
+
+def _try_rename(src: str, dst: str) -> bool:
+    if not INGEST_MOVE_SOURCE:
+        return False
+    try:
+        os.rename(src, dst)
+        return True
+    except OSError as e:
+        if e.errno in _NO_SOPORTADO:
+            return False
+        raise
+
+
+def _kernel_copy(fsrc, fdst, total: int, on_progress: Optional[ProgressFn], start: int = 0) -> bool:
+    """copy_file_range o sendfile desde `start` (sin pasar los datos por Python). False si no hay soporte"""
+    for copiar in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+        if copiar is None:
+            continue
+        copiados = start
+        try:
+            while copiados < total:
+                if copiar is os.sendfile:
+                    n = copiar(fdst.fileno(), fsrc.fileno(), copiados, COPY_CHUNK_BYTES)
+                else:
+                    n = copiar(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_BYTES, copiados, copiados)
+                if n == 0:
+                    break
+                copiados += n
+                if on_progress:
+                    on_progress(copiados, total)
+            return True
+        except OSError as e:
+            if copiados > start or e.errno not in _NO_SOPORTADO:
+                raise
+    return False
+
+
+def partial_path(src: str, dst: str) -> str:
+    """Copia parcial de src junto a dst: el mismo archivo del Bot API retoma la misma .part"""
+    return os.path.join(os.path.dirname(dst), f".{os.path.basename(src)}.part")
+
+
+def _source_id(st: os.stat_result) -> dict:
+    """Identidad del origen guardada junto a la .part (un nombre reutilizado no coincide)"""
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino, "dev": st.st_dev}
+
+
+def _resume_offset(part: str, origen: dict) -> int:
+    """Bytes ya copiados en la .part si es del mismo origen; 0 si hay que empezar de cero"""
+    try:
+        with open(part + ".src", 'r', encoding='utf-8') as f:
+            guardado = json.load(f)
+        offset = os.path.getsize(part)
+    except (OSError, ValueError):
+        return 0
+    if guardado != origen or offset > origen["size"]:
+        logger.warning(f"⚠️  {part} es de otro archivo, se descarta")
+        return 0
+    return offset
+
+
+def cleanup_partials(directory: str, max_age_hours: float = INGEST_PART_MAX_AGE_HOURS) -> int:
+    """Borra las .part (y sus sidecars) sin tocar hace más de max_age_hours. Retorna cuántas"""
+    limite = time.time() - max_age_hours * 3600
+    borradas = 0
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not (entry.name.startswith('.') and entry.name.endswith('.part')):
+            continue
+        try:
+            if entry.stat().st_mtime >= limite:
+                continue
+            os.unlink(entry.path)
+        except OSError:
+            continue
+        try:
+            os.unlink(entry.path + ".src")
+        except OSError:
+            pass
+        borradas += 1
+    if borradas:
+        logger.info(f"🧹 {borradas} copia(s) parcial(es) abandonada(s) borrada(s) en {directory}")
+    return borradas
+
+
+def _hash_prefix(path: str, n: int, hasher):
+    """Alimenta hasher con los primeros n bytes de path (lo ya copiado al retomar)"""
+    with open(path, 'rb') as f:
+        while n > 0:
+            chunk = f.read(min(COPY_CHUNK_BYTES, n))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            n -= len(chunk)
+
+
+def copy_with_progress(src: str, dst: str, on_progress: Optional[ProgressFn] = None, hasher=None) -> str:
+    """
+    Copia por bloques (como shutil.copy2, con metadata) reportando progreso.
+    Escribe en una .part y la renombra al final: si la copia se corta, el
+    siguiente intento con el mismo origen (mismo tamaño, mtime e inodo)
+    retoma desde lo ya copiado.
+    Con `hasher` (hashlib) los bloques pasan por Python y lo alimentan
+    mientras se copian: el hash no necesita otra lectura del video. Sin
+    hasher se usa la copia en el kernel si está disponible.
+    Retorna el método usado.
+    """
+    origen = _source_id(os.stat(src))
+    total = origen["size"]
+    part = partial_path(src, dst)
+    offset = _resume_offset(part, origen)
+    if offset:
+        logger.info(f"⏯️  Retomando copia en {offset / 1e6:.0f}/{total / 1e6:.0f} MB: {part}")
+        if hasher is not None:
+            _hash_prefix(part, offset, hasher)
+    else:
+        with open(part + ".src", 'w', encoding='utf-8') as f:
+            json.dump(origen, f)
+
+    with open(src, 'rb') as fsrc, open(part, 'r+b' if offset else 'wb') as fdst:
+        fdst.seek(offset)
+        if hasher is None and _kernel_copy(fsrc, fdst, total, on_progress, offset):
+            metodo = "copy_file_range/sendfile"
+        else:
+            metodo = "copia por bloques"
+            fsrc.seek(offset)
+            copiados = offset
+            while True:
+                chunk = fsrc.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                fdst.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                copiados += len(chunk)
+                if on_progress:
+                    on_progress(copiados, total)
+    shutil.copystat(src, part)
+    os.replace(part, dst)
+    os.unlink(part + ".src")
+    return metodo if not offset else f"{metodo} (retomada)"
+
+
+def hash_file(path: str) -> str:
+    """Hash de contenido (sha256) leyendo el archivo por bloques"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+# Estrategias que no copian bytes: el hash se lee del destino
+_SIN_COPIA = ("hardlink", "reflink", "rename")
+
+
+def transfer_file(src: str, dst: str, on_progress: Optional[ProgressFn] = None, hasher=None) -> str:
+    """
+    Lleva src a dst con la estrategia más barata que funcione. Retorna el método usado.
+    `hasher` solo se alimenta si hay que copiar (ver copy_with_progress).
+    """
+    if _try_link(src, dst):
+        return "hardlink"
+    if _try_reflink(src, dst):
+        return "reflink"
+    if _try_rename(src, dst):
+        return "rename"
+    return copy_with_progress(src, dst, on_progress, hasher)
+
+
+def copy_local_file(src: str, dst: str, on_progress: Optional[ProgressFn] = None) -> Tuple[int, str]:
+    """
+    Ingest bloqueante con el fix de permisos.
+
+    Returns:
+        (tamaño del archivo, sha256 del contenido)
+    """
+    cleanup_partials(os.path.dirname(dst))
+    hasher = hashlib.sha256()
+    try:
+        metodo = transfer_file(src, dst, on_progress, hasher)
+    except PermissionError:
+        logger.warning("⚠️ Error de permisos detectado, aplicando fix automático...")
+        fix_permissions(src)
+        # Copia real: un hardlink compartiría el modo recién cambiado con el Bot API
+        hasher = hashlib.sha256()
+        metodo = copy_with_progress(src, dst, on_progress, hasher)
+    logger.info(f"📦 Ingest por {metodo}: {dst}")
+    digest = hash_file(dst) if metodo in _SIN_COPIA else hasher.hexdigest()
+    return os.path.getsize(dst), digest
+
+
+def busy() -> bool:
+    """True si todos los hilos de ingest están ocupados (el próximo espera)"""
+    with _lock:
+        return _activos >= INGEST_MAX_PARALLEL
+
+
+async def ingest_local_file(
+    src: str,
+    dst: str,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+) -> Tuple[int, str]:
+    """
+    Lleva src → dst en el pool de ingest sin bloquear el event loop.
+    on_progress (async) se llama en el loop, como máximo cada PROGRESS_MIN_SECONDS.
+
+    Returns:
+        (tamaño en bytes del archivo copiado, content_hash)
+    """
+    loop = asyncio.get_running_loop()
+    ultimo = [0.0]
+
+    def progress(copiados: int, total: int):
+        ahora = time.monotonic()
+        if on_progress and copiados < total and ahora - ultimo[0] >= PROGRESS_MIN_SECONDS:
+            ultimo[0] = ahora
+            asyncio.run_coroutine_threadsafe(on_progress(copiados, total), loop)
+
+    def job() -> Tuple[int, str]:
+        global _activos
+        with _lock:
+            _activos += 1
+        try:
+            return copy_local_file(src, dst, progress)
+        finally:
+            with _lock:
+                _activos -= 1
+
+    return await loop.run_in_executor(_executor, job)
+
+
+async def content_hash(path: str) -> str:
+    """
+    Hash de contenido de un archivo ya descargado (descarga HTTP), calculado
+    en el pool de ingest. El ingest local lo obtiene de ingest_local_file.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, hash_file, path)
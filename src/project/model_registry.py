@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Model Registry - telegram_user_id → modelo para el bot central
+Índice en memoria de modelos/*/config.json (donde el admin panel guarda el
+telegram_user_id de cada modelo):
+
+- lookup O(1) por user id, sin recorrer la carpeta de modelos
+- refresco incremental: se hace stat de cada config.json y solo se vuelve a
+  parsear el que cambió de mtime (o apareció/desapareció). Como máximo un
+  refresco cada MODEL_REGISTRY_REFRESH_SECONDS
+- caché negativa: un usuario desconocido no dispara otro refresco durante
+  MODEL_NEGATIVE_TTL_SECONDS (un refresco con cambios o /reload la limpia)
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+MODEL_REGISTRY_REFRESH_SECONDS = float(os.getenv("MODEL_REGISTRY_REFRESH_SECONDS", "5"))
+MODEL_NEGATIVE_TTL_SECONDS = float(os.getenv("MODEL_NEGATIVE_TTL_SECONDS", "30"))
+
+
+class ModelRegistry:
+    """Mapeo telegram_user_id → nombre normalizado del modelo (nombre de la carpeta)"""
+
+    def __init__(self, modelos_dir: Path):
+        self.modelos_dir = Path(modelos_dir)
+        self._lock = threading.Lock()
+        self._by_user: Dict[str, str] = {}
+        # config.json -> (mtime_ns, telegram_user_id, modelo)
+        self._configs: Dict[str, Tuple[int, str, str]] = {}
+        self._negative: Dict[str, float] = {}   # user id -> vence (monotonic)
+        self._last_refresh = 0.0
+
+    def __len__(self) -> int:
+        """Modelos con telegram_user_id"""
+        with self._lock:
+            return len(set(self._by_user.values()))
+
+    def lookup(self, user_id) -> Optional[str]:
+        """Modelo del usuario de Telegram, o None si no hay config con ese id"""
+        key = str(user_id).strip()
+        with self._lock:
+            modelo = self._by_user.get(key)
+            if modelo:
+                return modelo
+            if self._negative.get(key, 0) > time.monotonic():
+                return None
+
+        if time.monotonic() - self._last_refresh >= MODEL_REGISTRY_REFRESH_SECONDS:
+            self.refresh()
+
+        with self._lock:
+            modelo = self._by_user.get(key)
+            if not modelo:
+                self._negative[key] = time.monotonic() + MODEL_NEGATIVE_TTL_SECONDS
+            return modelo
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Relee solo los config.json nuevos o modificados (force: todos).
+        Retorna True si el mapeo cambió.
+        """
+        vistos: Dict[str, int] = {}
+        try:
+            entries = list(os.scandir(self.modelos_dir))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            config_path = os.path.join(entry.path, "config.json")
+            try:
+                vistos[config_path] = os.stat(config_path).st_mtime_ns
+            except OSError:
+                continue
+
+        with self._lock:
+            actuales = dict(self._configs)
+        cambios = {}
+        for config_path, mtime_ns in vistos.items():
+            anterior = actuales.get(config_path)
+            if force or not anterior or anterior[0] != mtime_ns:
+                cambios[config_path] = (mtime_ns, self._read_user_id(config_path),
+                                        os.path.basename(os.path.dirname(config_path)))
+        borrados = set(actuales) - set(vistos)
+
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            if not cambios and not borrados:
+                return False
+            for config_path in borrados:
+                self._configs.pop(config_path, None)
+            self._configs.update(cambios)
+            # Reconstruir solo cuando algo cambió (orden estable si dos configs repiten id)
+            self._by_user = {
+                user_id: modelo
+                for _, (_, user_id, modelo) in sorted(self._configs.items())
+                if user_id
+            }
+            self._negative.clear()
+        return True
+
+    @staticmethod
+    def _read_user_id(config_path: str) -> str:
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                return str(json.load(f).get("telegram_user_id", "")).strip()
+        except Exception as e:
+            print(f"  ⚠️  Error cargando {config_path}: {e}")
+            return ""
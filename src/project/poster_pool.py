@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Poster Pool - Ejecución concurrente de publicaciones
+Pool acotado de hilos para el poster con tres límites de concurrencia:
+- global (uploads simultáneos en el host)
+- por plataforma
+- por cuenta_plataforma (una cuenta nunca sube dos videos a la vez)
+
+Las publicaciones se encolan en orden de scheduled_time; una que no cabe
+por sus límites no bloquea a las siguientes de otras cuentas/plataformas.
+"""
+
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Ventana en la que una publicación recién terminada se ignora si vuelve a
+# aparecer en una lectura anterior a su cambio de estado (con el mismo
+# scheduled_time: si cambió, es un reintento reprogramado y se acepta)
+RECENT_TTL_SECONDS = 600
+
+
+class PosterPool:
+    """Pool de workers con límites global, por plataforma y por cuenta"""
+
+    def __init__(
+        self,
+        process_fn: Callable[[Dict], None],
+        key_fn: Callable[[Dict], Tuple[str, Optional[str]]],
+        max_workers: int = 4,
+        max_per_plataforma: int = 2,
+        max_per_cuenta: int = 1
+    ):
+        """
+        Args:
+            process_fn: Procesa una publicación (bloqueante)
+            key_fn: Retorna (plataforma, cuenta_plataforma_id) de una publicación
+        """
+        self.process_fn = process_fn
+        self.key_fn = key_fn
+        self.max_workers = max(1, max_workers)
+        self.max_per_plataforma = max(1, max_per_plataforma)
+        self.max_per_cuenta = max(1, max_per_cuenta)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="poster")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queue: List[Dict] = []
+        self._ids = set()                      # En cola o corriendo
+        self._recent: Dict[str, Tuple[float, Optional[str]]] = {}  # Terminadas -> (timestamp, scheduled_time)
+        self._running = 0
+        self._running_plataforma: Dict[str, int] = {}
+        self._running_cuenta: Dict[str, int] = {}
+
+    # ---- API ----
+    def submit(self, publicaciones: List[Dict]) -> int:
+        """Encola publicaciones nuevas (ignora las ya encoladas/corriendo). Retorna cuántas encoló"""
+        nuevas = 0
+        with self._lock:
+            self._prune_recent()
+            for pub in publicaciones:
+                pub_id = pub.get('id')
+                if pub_id in self._ids:
+                    continue
+                if pub_id in self._recent and self._recent[pub_id][1] == pub.get('scheduled_time'):
+                    continue
+                self._queue.append(pub)
+                self._ids.add(pub_id)
+                nuevas += 1
+        self._dispatch()
+        return nuevas
+
+    def pending(self) -> int:
+        """Publicaciones en cola + corriendo"""
+        with self._lock:
+            return len(self._queue) + self._running
+
+    def running(self) -> int:
+        with self._lock:
+            return self._running
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que no quede nada en cola ni corriendo"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queue and self._running == 0, timeout)
+
+    def shutdown(self, wait: bool = True):
+        """Descarta la cola (siguen 'programada' en BD) y opcionalmente espera a las que corren"""
+        with self._lock:
+            for pub in self._queue:
+                self._ids.discard(pub.get('id'))
+            self._queue.clear()
+        self._executor.shutdown(wait=wait)
+
+    # ---- Interno ----
+    def _fits(self, plataforma: str, cuenta: str) -> bool:
+        return (
+            self._running < self.max_workers
+            and self._running_plataforma.get(plataforma, 0) < self.max_per_plataforma
+            and self._running_cuenta.get(cuenta, 0) < self.max_per_cuenta
+        )
+
+    def _dispatch(self):
+        """Arranca, en orden, todas las publicaciones en cola que caben en los límites"""
+        with self._lock:
+            for pub in list(self._queue):
+                if self._running >= self.max_workers:
+                    break
+                plataforma, cuenta = self._keys(pub)
+                if not self._fits(plataforma, cuenta):
+                    continue
+                self._queue.remove(pub)
+                self._running += 1
+                self._running_plataforma[plataforma] = self._running_plataforma.get(plataforma, 0) + 1
+                self._running_cuenta[cuenta] = self._running_cuenta.get(cuenta, 0) + 1
+                self._executor.submit(self._run, pub, plataforma, cuenta)
+
+    def _run(self, pub: Dict, plataforma: str, cuenta: str):
+        try:
+            self.process_fn(pub)
+        except Exception as e:
+            print(f"❌ Error no controlado procesando publicación {pub.get('id')}: {e}")
+            traceback.print_exc()
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._running_plataforma[plataforma] -= 1
+                self._running_cuenta[cuenta] -= 1
+                self._ids.discard(pub.get('id'))
+                self._recent[pub.get('id')] = (time.monotonic(), pub.get('scheduled_time'))
+                self._idle.notify_all()
+            self._dispatch()
+
+    def _keys(self, pub: Dict) -> Tuple[str, str]:
+        plataforma, cuenta = self.key_fn(pub)
+        # Sin cuenta conocida: no serializar contra otras publicaciones
+        return (plataforma or '').lower(), cuenta or f"pub:{pub.get('id')}"
+
+    def _prune_recent(self):
+        limite = time.monotonic() - RECENT_TTL_SECONDS
+        for pub_id in [k for k, (t, _) in self._recent.items() if t < limite]:
+            del self._recent[pub_id]
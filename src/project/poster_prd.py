@@ -7,14 +7,23 @@ Usa exclusivamente el esquema PRD (publicaciones, contenidos, cuentas_plataforma
 
 import os
 import time
-import subprocess
+import socket
 import json
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from wakeup import WakeupListener, AdaptiveBackoff
+from poster_pool import PosterPool
+from worker_client import run_worker, WORKER_TIMEOUT_SECONDS
+from event_sink import EventSink
+from preflight import check_batch, check_video, get_worker_script
+from staging import LOOKAHEAD_SECONDS, stage_publicaciones
+from retry_policy import (MAX_INTENTOS, RETRY_GAP_MINUTES, RETRY_SLOT_HORIZON_DAYS, TZ_LOCAL,
+                          is_retryable, backoff_seconds, find_retry_slot)
+
 # Cargar variables de entorno
 BASE_DIR = Path(__file__).resolve().parents[2]
 env_path = BASE_DIR / 'src' / '.env'
@@ -29,35 +38,301 @@ if not url or not key:
 
 supabase: Client = create_client(url, key)
 
+# Concurrencia del poster: uploads simultáneos global, por plataforma y por cuenta
+POSTER_MAX_WORKERS = int(os.getenv("POSTER_MAX_WORKERS", "4"))
+POSTER_MAX_PER_PLATAFORMA = int(os.getenv("POSTER_MAX_PER_PLATAFORMA", "2"))
+POSTER_MAX_PER_CUENTA = int(os.getenv("POSTER_MAX_PER_CUENTA", "1"))
+
+# Lease de publicaciones (Migracion/scripts/lease_publicaciones.sql): cada
+# instancia reclama filas de forma atómica y el reaper devuelve a 'programada'
+# las de instancias caídas. El lease supera el timeout del worker (300s).
+POSTER_ID = os.getenv("POSTER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+POSTER_LEASE_SECONDS = int(os.getenv("POSTER_LEASE_SECONDS", "900"))
+REAPER_INTERVAL_SECONDS = 60
+
+# Subida exitosa cuyo 'publicado' no se pudo escribir: se reintenta con backoff
+# y, si sigue fallando, se extiende el lease (el reaper no la devuelve a
+# 'programada' para subirla otra vez) y se anota en disco para reenviarla
+PUBLICADO_REINTENTOS = int(os.getenv("PUBLICADO_REINTENTOS", "3"))
+PUBLICADO_BACKOFF_SECONDS = float(os.getenv("PUBLICADO_BACKOFF_SECONDS", "2"))
+PUBLICADOS_PENDIENTES_DIR = BASE_DIR / 'logs' / 'publicados_pendientes'
+
+# RPC transaccional estado + evento (Migracion/scripts/rpc_transicionar_publicacion.sql).
+# Si no está instalada se usa el fallback update_publicacion_estado + create_evento_sistema.
+_RPC_TRANSICION_DISPONIBLE = True
+# RPC instalada antes de p_scheduled_time (reintentos): solo esas transiciones usan el fallback
+_RPC_SCHEDULED_TIME_DISPONIBLE = True
+
+# Si las columnas lease_* no existen en la BD, el claim sigue siendo atómico
+# (update condicional sobre estado) pero sin owner ni expiración
+_LEASE_DISPONIBLE = True
+
+
+# Solo las columnas que usa el poster; modelos/plataformas salen de la caché
+PUBLICACION_COLUMNS = (
+    "id, contenido_id, cuenta_plataforma_id, scheduled_time, caption_usado, tags_usados, intentos, "
+    "contenidos(id, modelo_id, archivo_path, caption_generado, tags_generados), "
+    "cuentas_plataforma(id, plataforma_id)"
+)
 
-def get_pending_publicaciones() -> List[Dict]:
+# Tamaño de página al leer publicaciones vencidas (keyset sobre scheduled_time, id)
+POSTER_PAGE_SIZE = int(os.getenv("POSTER_PAGE_SIZE", "100"))
+
+# Caché de datos de referencia: tabla -> { id: (fila, expira_en) }
+REF_CACHE_TTL_SECONDS = int(os.getenv("REF_CACHE_TTL_SECONDS", "300"))
+_REF_CACHE: Dict[str, Dict[str, tuple]] = {'modelos': {}, 'plataformas': {}}
+# configuracion_distribucion: ventana diaria para ubicar los reintentos
+MODELO_COLUMNS = "id, nombre, configuracion_distribucion"
+
+
+def get_referencias(tabla: str, ids, columnas: str = "id, nombre") -> Dict[str, Dict]:
     """
-    Obtiene publicaciones programadas listas para procesar.
+    Resuelve filas de modelos/plataformas por id desde la caché TTL.
+    Solo consulta (una query con in_) los ids ausentes o vencidos.
+    """
+    cache = _REF_CACHE[tabla]
+    ahora = time.monotonic()
+    ids = {i for i in ids if i}
+    faltantes = [i for i in ids if i not in cache or cache[i][1] < ahora]
+    
+    if faltantes:
+        try:
+            response = supabase.table(tabla)\
+                .select(columnas)\
+                .in_('id', faltantes)\
+                .execute()
+            for fila in response.data or []:
+                cache[fila['id']] = (fila, ahora + REF_CACHE_TTL_SECONDS)
+        except Exception as e:
+            print(f"⚠️  Error obteniendo {tabla}: {e}")
+    
+    return {i: cache[i][0] for i in ids if i in cache}
+
+
+def invalidate_referencias(tabla: Optional[str] = None):
+    """Vacía la caché de referencias (una tabla o todas)"""
+    for nombre in ([tabla] if tabla else list(_REF_CACHE)):
+        _REF_CACHE[nombre].clear()
+
+
+def hydrate_publicaciones(publicaciones: List[Dict]) -> List[Dict]:
+    """
+    Completa contenidos.modelos y cuentas_plataforma.plataformas desde la
+    caché: mismo formato anidado que el select con relaciones completas.
+    """
+    contenidos = [p['contenidos'] for p in publicaciones if isinstance(p.get('contenidos'), dict)]
+    cuentas = [p['cuentas_plataforma'] for p in publicaciones if isinstance(p.get('cuentas_plataforma'), dict)]
+    
+    modelos = get_referencias('modelos', (c.get('modelo_id') for c in contenidos), MODELO_COLUMNS)
+    plataformas = get_referencias('plataformas', (c.get('plataforma_id') for c in cuentas))
+    
+    for contenido in contenidos:
+        contenido['modelos'] = modelos.get(contenido.get('modelo_id'))
+    for cuenta in cuentas:
+        cuenta['plataformas'] = plataformas.get(cuenta.get('plataforma_id'))
+    return publicaciones
+
+
+def get_pending_publicaciones(limit: int = POSTER_PAGE_SIZE, after: Optional[tuple] = None) -> List[Dict]:
+    """
+    Obtiene una página de publicaciones programadas listas para procesar.
     Usa el índice crítico: idx_publicaciones_estado_scheduled
     
     Query optimizada:
-    SELECT * FROM publicaciones 
+    SELECT <columnas usadas> FROM publicaciones 
     WHERE estado = 'programada' 
     AND scheduled_time <= now()
-    ORDER BY scheduled_time ASC
+    AND (scheduled_time, id) > after        -- keyset, si se pasa
+    ORDER BY scheduled_time ASC, id ASC
+    LIMIT limit
+    
+    Args:
+        after: (scheduled_time, id) de la última fila de la página anterior
     """
     try:
         now_iso = datetime.now(timezone.utc).isoformat()
         
         # Query usando el índice crítico
-        response = supabase.table('publicaciones')\
-            .select("*, contenidos(*, modelos(*)), cuentas_plataforma(*, plataformas(*))")\
+        query = supabase.table('publicaciones')\
+            .select(PUBLICACION_COLUMNS)\
             .eq('estado', 'programada')\
-            .lte('scheduled_time', now_iso)\
+            .lte('scheduled_time', now_iso)
+        if after:
+            last_time, last_id = after
+            query = query.or_(
+                f'scheduled_time.gt."{last_time}",'
+                f'and(scheduled_time.eq."{last_time}",id.gt.{last_id})'
+            )
+        response = query\
             .order('scheduled_time', desc=False)\
+            .order('id', desc=False)\
+            .limit(limit)\
             .execute()
         
-        return response.data if response.data else []
+        return hydrate_publicaciones(response.data) if response.data else []
     except Exception as e:
         print(f"❌ Error obteniendo publicaciones programadas: {e}")
         return []
 
 
+def get_next_scheduled_time() -> Optional[datetime]:
+    """
+    Retorna el scheduled_time de la próxima publicación programada (futura),
+    para dormir exactamente hasta ella. None si no hay ninguna.
+    """
+    try:
+        response = supabase.table('publicaciones')\
+            .select("scheduled_time")\
+            .eq('estado', 'programada')\
+            .gt('scheduled_time', datetime.now(timezone.utc).isoformat())\
+            .order('scheduled_time', desc=False)\
+            .limit(1)\
+            .execute()
+        
+        if response.data:
+            return datetime.fromisoformat(response.data[0]['scheduled_time'].replace('Z', '+00:00'))
+        return None
+    except Exception as e:
+        print(f"⚠️  Error obteniendo próxima publicación: {e}")
+        return None
+
+
+def get_upcoming_publicaciones(segundos: int = LOOKAHEAD_SECONDS, limit: int = POSTER_PAGE_SIZE) -> List[Dict]:
+    """
+    Publicaciones programadas que vencen en los próximos `segundos`
+    (lookahead del staging), en orden de scheduled_time.
+    """
+    try:
+        now = datetime.now(timezone.utc)
+        response = supabase.table('publicaciones')\
+            .select(PUBLICACION_COLUMNS)\
+            .eq('estado', 'programada')\
+            .gt('scheduled_time', now.isoformat())\
+            .lte('scheduled_time', (now + timedelta(seconds=segundos)).isoformat())\
+            .order('scheduled_time', desc=False)\
+            .limit(limit)\
+            .execute()
+        
+        return hydrate_publicaciones(response.data) if response.data else []
+    except Exception as e:
+        print(f"⚠️  Error obteniendo próximas publicaciones: {e}")
+        return []
+
+
+def _columna_inexistente(e: Exception) -> bool:
+    """PGRST204 (columna fuera del schema cache) / 42703 (undefined_column)"""
+    return getattr(e, 'code', None) in ('PGRST204', '42703')
+
+
+def _claim_data() -> Dict:
+    """Columnas del claim: estado y, si están instaladas, lease_owner/lease_until"""
+    claim_data = {"estado": "procesando"}
+    if _LEASE_DISPONIBLE:
+        lease_until = datetime.now(timezone.utc) + timedelta(seconds=POSTER_LEASE_SECONDS)
+        claim_data["lease_owner"] = POSTER_ID
+        claim_data["lease_until"] = lease_until.isoformat()
+    return claim_data
+
+
+def claim_publicacion(publicacion_id: str) -> bool:
+    """
+    Reclama una publicación de forma atómica:
+    UPDATE ... SET estado='procesando', lease_owner, lease_until
+    WHERE id = ? AND estado = 'programada'
+    
+    Returns:
+        True si esta instancia la reclamó; False si otra la tomó antes
+    """
+    global _LEASE_DISPONIBLE
+    
+    claim_data = _claim_data()
+    
+    try:
+        response = supabase.table('publicaciones')\
+            .update(claim_data)\
+            .eq('id', publicacion_id)\
+            .eq('estado', 'programada')\
+            .execute()
+        return bool(response.data)
+    except Exception as e:
+        if _LEASE_DISPONIBLE and _columna_inexistente(e):
+            print("⚠️  Columnas lease_* no instaladas, claim sin lease")
+            _LEASE_DISPONIBLE = False
+            return claim_publicacion(publicacion_id)
+        print(f"❌ Error reclamando publicación {publicacion_id}: {e}")
+        return False
+
+
+def claim_publicaciones(publicacion_ids: List[str]) -> set:
+    """
+    Reclama varias publicaciones en un solo UPDATE condicional
+    (WHERE id IN (...) AND estado = 'programada').
+    
+    Returns:
+        Ids reclamados por esta instancia
+    """
+    global _LEASE_DISPONIBLE
+    
+    if not publicacion_ids:
+        return set()
+    
+    claim_data = _claim_data()
+    
+    try:
+        response = supabase.table('publicaciones')\
+            .update(claim_data)\
+            .in_('id', publicacion_ids)\
+            .eq('estado', 'programada')\
+            .execute()
+        return {row['id'] for row in (response.data or [])}
+    except Exception as e:
+        if _LEASE_DISPONIBLE and _columna_inexistente(e):
+            print("⚠️  Columnas lease_* no instaladas, claim sin lease")
+            _LEASE_DISPONIBLE = False
+            return claim_publicaciones(publicacion_ids)
+        print(f"❌ Error reclamando {len(publicacion_ids)} publicación(es): {e}")
+        return set()
+
+
+def reap_expired_leases() -> int:
+    """
+    Devuelve a 'programada' las publicaciones en 'procesando' cuyo lease
+    venció (instancia caída o colgada). Retorna cuántas liberó.
+    """
+    if not _LEASE_DISPONIBLE:
+        return 0
+    
+    try:
+        now_iso = datetime.now(timezone.utc).isoformat()
+        response = supabase.table('publicaciones')\
+            .update({"estado": "programada", "lease_owner": None, "lease_until": None})\
+            .eq('estado', 'procesando')\
+            .lt('lease_until', now_iso)\
+            .execute()
+        
+        liberadas = response.data or []
+        for pub in liberadas:
+            create_evento_sistema('lease_expirado', pub['id'], None,
+                                  "Lease vencido, publicación devuelta a programada")
+        if liberadas:
+            print(f"♻️  {len(liberadas)} publicación(es) con lease vencido devueltas a 'programada'")
+        return len(liberadas)
+    except Exception as e:
+        print(f"⚠️  Error liberando leases vencidos: {e}")
+        return 0
+
+
+def _send_eventos(rows: List[Dict]):
+    """Bulk insert idempotente (ids generados en el cliente)"""
+    supabase.table('eventos_sistema')\
+        .upsert(rows, on_conflict='id', ignore_duplicates=True)\
+        .execute()
+
+
+# Eventos fuera del camino crítico: buffer + bulk insert + journal en logs/
+event_sink = EventSink(_send_eventos, BASE_DIR / 'logs' / 'eventos_pendientes')
+
+
 def create_evento_sistema(
     tipo: str,
     publicacion_id: Optional[str] = None,
@@ -65,7 +340,7 @@ def create_evento_sistema(
     descripcion: str = "",
     realizado_por: str = "sistema"
 ):
-    """Registra un evento en eventos_sistema"""
+    """Registra un evento en eventos_sistema (asíncrono, ver event_sink)"""
     try:
         data = {
             "tipo": tipo,
@@ -77,7 +352,7 @@ def create_evento_sistema(
         if modelo_id:
             data["modelo_id"] = modelo_id
         
-        supabase.table('eventos_sistema').insert(data).execute()
+        event_sink.emit(data)
     except Exception as e:
         print(f"⚠️  Error registrando evento: {e}")
 
@@ -87,11 +362,16 @@ def update_publicacion_estado(
     nuevo_estado: str,
     ultimo_error: Optional[str] = None,
     url_publicacion: Optional[str] = None,
-    incrementar_intentos: bool = False
+    incrementar_intentos: bool = False,
+    lease_owner: Optional[str] = None,
+    scheduled_time: Optional[str] = None
 ):
     """
     Actualiza el estado de una publicación.
-    Maneja: estado, intentos, ultimo_error, published_at
+    Maneja: estado, intentos, ultimo_error, published_at, scheduled_time (reintentos)
+    
+    Con lease_owner solo actualiza si el lease sigue siendo de esa instancia
+    (si venció y otra la reclamó, no pisa su estado) y lo libera.
     """
     try:
         update_data = {"estado": nuevo_estado}
@@ -105,16 +385,27 @@ def update_publicacion_estado(
         if nuevo_estado == 'publicado':
             update_data["published_at"] = datetime.now(timezone.utc).isoformat()
         
+        if scheduled_time:
+            update_data["scheduled_time"] = scheduled_time
+        
         if incrementar_intentos:
             # Obtener intentos actuales
             current = supabase.table('publicaciones').select("intentos").eq('id', publicacion_id).execute()
             if current.data:
                 update_data["intentos"] = (current.data[0].get('intentos', 0) or 0) + 1
         
-        supabase.table('publicaciones')\
-            .update(update_data)\
-            .eq('id', publicacion_id)\
-            .execute()
+        query = supabase.table('publicaciones')
+        if lease_owner and _LEASE_DISPONIBLE:
+            update_data["lease_owner"] = None
+            update_data["lease_until"] = None
+            query = query.update(update_data).eq('id', publicacion_id).eq('lease_owner', lease_owner)
+        else:
+            query = query.update(update_data).eq('id', publicacion_id)
+        
+        response = query.execute()
+        if lease_owner and _LEASE_DISPONIBLE and not response.data:
+            print(f"⚠️  Lease perdido en publicación {publicacion_id}, estado '{nuevo_estado}' no aplicado")
+            return False
         
         return True
     except Exception as e:
@@ -122,39 +413,284 @@ def update_publicacion_estado(
         return False
 
 
-def get_worker_script_path(plataforma_nombre: str) -> Optional[Path]:
+def transicionar_publicacion(
+    publicacion_id: str,
+    nuevo_estado: str,
+    evento_tipo: Optional[str] = None,
+    evento_descripcion: str = "",
+    modelo_id: Optional[str] = None,
+    ultimo_error: Optional[str] = None,
+    url_publicacion: Optional[str] = None,
+    incrementar_intentos: bool = False,
+    lease_owner: Optional[str] = None,
+    scheduled_time: Optional[str] = None
+) -> bool:
     """
-    Obtiene la ruta del script worker para una plataforma.
-    Retorna None si no existe.
+    Cambia el estado de una publicación y registra su evento en una sola
+    llamada (RPC transicionar_publicacion): intentos se incrementa en el
+    servidor, sin leer antes, y el evento solo se escribe si el cambio se
+    aplicó (con lease_owner: si el lease sigue siendo nuestro).
+    
+    Fallback si la RPC no existe: update_publicacion_estado + create_evento_sistema.
+    
+    scheduled_time (ISO) solo se envía si se pasa: una RPC instalada antes
+    de p_scheduled_time (PGRST202 con ese parámetro) sigue sirviendo para el
+    resto de las transiciones; solo los reintentos usan el fallback.
+    
+    Returns:
+        True si el cambio de estado se aplicó
     """
-    # Mapeo de plataformas a scripts
-    script_map = {
-        'kams': 'workers/kams.js',
-        'kams.com': 'workers/kams.js',
-        'xxxfollow': 'workers/xxxfollow.js',
-    }
+    global _RPC_TRANSICION_DISPONIBLE, _RPC_SCHEDULED_TIME_DISPONIBLE
     
-    script_rel = script_map.get(plataforma_nombre.lower())
-    if not script_rel:
-        return None
+    if _RPC_TRANSICION_DISPONIBLE and (not scheduled_time or _RPC_SCHEDULED_TIME_DISPONIBLE):
+        try:
+            params = {
+                "p_publicacion_id": publicacion_id,
+                "p_estado": nuevo_estado,
+                "p_ultimo_error": ultimo_error,
+                "p_url_publicacion": url_publicacion,
+                "p_incrementar_intentos": incrementar_intentos,
+                "p_lease_owner": lease_owner if _LEASE_DISPONIBLE else None,
+                "p_evento_tipo": evento_tipo,
+                "p_evento_descripcion": evento_descripcion,
+                "p_modelo_id": modelo_id
+            }
+            if scheduled_time:
+                params["p_scheduled_time"] = scheduled_time
+            response = supabase.rpc('transicionar_publicacion', params).execute()
+            if not response.data:
+                print(f"⚠️  Lease perdido en publicación {publicacion_id}, estado '{nuevo_estado}' no aplicado")
+                return False
+            return True
+        except Exception as e:
+            # PGRST202: la función (con esos parámetros) no existe en el schema cache
+            if getattr(e, 'code', None) != 'PGRST202':
+                print(f"❌ Error actualizando publicación {publicacion_id} (RPC): {e}")
+                return False
+            if scheduled_time:
+                print("⚠️  RPC transicionar_publicacion sin p_scheduled_time, reintentos por update + insert de evento")
+                _RPC_SCHEDULED_TIME_DISPONIBLE = False
+            else:
+                print("⚠️  RPC transicionar_publicacion no instalada, usando update + insert de evento")
+                _RPC_TRANSICION_DISPONIBLE = False
     
-    script_path = BASE_DIR / script_rel
-    if script_path.exists():
-        return script_path
+    if not update_publicacion_estado(publicacion_id, nuevo_estado, ultimo_error, url_publicacion,
+                                     incrementar_intentos, lease_owner, scheduled_time):
+        return False
+    if evento_tipo:
+        create_evento_sistema(evento_tipo, publicacion_id, modelo_id, evento_descripcion)
+    return True
+
+
+def extender_lease(publicacion_id: str) -> bool:
+    """Renueva lease_until de una publicación nuestra (POSTER_LEASE_SECONDS desde ahora)"""
+    if not _LEASE_DISPONIBLE:
+        return False
+    try:
+        lease_until = datetime.now(timezone.utc) + timedelta(seconds=POSTER_LEASE_SECONDS)
+        response = supabase.table('publicaciones')\
+            .update({"lease_until": lease_until.isoformat()})\
+            .eq('id', publicacion_id)\
+            .eq('lease_owner', POSTER_ID)\
+            .execute()
+        return bool(response.data)
+    except Exception as e:
+        print(f"⚠️  Error extendiendo lease de {publicacion_id}: {e}")
+        return False
+
+
+def registrar_publicado(publicacion_id: str, modelo_id: Optional[str], descripcion: str,
+                        url_publicacion: Optional[str]) -> bool:
+    """
+    Transición a 'publicado' tras una subida exitosa, con PUBLICADO_REINTENTOS
+    intentos y backoff. Si no se pudo escribir, extiende el lease y anota la
+    transición en PUBLICADOS_PENDIENTES_DIR (replay_publicados_pendientes):
+    el video ya está en la plataforma y no debe volver a subirse.
     
-    return None
+    Returns:
+        True si el estado quedó escrito en la BD
+    """
+    for intento in range(PUBLICADO_REINTENTOS):
+        if intento:
+            time.sleep(PUBLICADO_BACKOFF_SECONDS * 2 ** (intento - 1))
+        if transicionar_publicacion(
+            publicacion_id, 'publicado', 'publicacion_exitosa', descripcion, modelo_id,
+            url_publicacion=url_publicacion, lease_owner=POSTER_ID
+        ):
+            return True
+    
+    extender_lease(publicacion_id)
+    pendiente = {"publicacion_id": publicacion_id, "modelo_id": modelo_id,
+                 "descripcion": descripcion, "url_publicacion": url_publicacion}
+    try:
+        PUBLICADOS_PENDIENTES_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = PUBLICADOS_PENDIENTES_DIR / f"{publicacion_id}.tmp"
+        tmp.write_text(json.dumps(pendiente, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(PUBLICADOS_PENDIENTES_DIR / f"{publicacion_id}.json")
+        print(f"   📝 'publicado' de {publicacion_id} anotado en disco, se reintentará")
+    except OSError as e:
+        print(f"❌ No se pudo anotar 'publicado' de {publicacion_id}, revisar manualmente: {e}")
+    return False
+
+
+def replay_publicados_pendientes() -> int:
+    """
+    Reenvía las transiciones a 'publicado' anotadas por registrar_publicado.
+    Sin lease_owner: la subida ya ocurrió, así que 'publicado' es el estado
+    real aunque el lease haya vencido. Retorna cuántas se aplicaron.
+    """
+    aplicadas = 0
+    for path in sorted(PUBLICADOS_PENDIENTES_DIR.glob("*.json")):
+        try:
+            pendiente = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️  'publicado' pendiente ilegible {path}: {e}")
+            continue
+        if transicionar_publicacion(
+            pendiente['publicacion_id'], 'publicado', 'publicacion_exitosa',
+            pendiente.get('descripcion', ''), pendiente.get('modelo_id'),
+            url_publicacion=pendiente.get('url_publicacion')
+        ):
+            path.unlink(missing_ok=True)
+            aplicadas += 1
+    if aplicadas:
+        print(f"📝 {aplicadas} publicación(es) marcadas 'publicado' desde el disco")
+    return aplicadas
+
+
+def get_ocupacion_modelo(modelo_id: str, desde: datetime, hasta: datetime,
+                         excluir_id: Optional[str] = None) -> Tuple[List[datetime], Dict[str, set]]:
+    """
+    Ocupación de la modelo en [desde, hasta], con las mismas reglas que el
+    índice del scheduler (programada/procesando/publicado de todas sus cuentas).
+    
+    Returns:
+        (slots ocupados, {fecha local 'YYYY-MM-DD': contenido_ids})
+    """
+    try:
+        response = supabase.table('publicaciones')\
+            .select("id, contenido_id, scheduled_time, contenidos!inner(modelo_id)")\
+            .eq('contenidos.modelo_id', modelo_id)\
+            .in_('estado', ['programada', 'procesando', 'publicado'])\
+            .gte('scheduled_time', desde.isoformat())\
+            .lte('scheduled_time', hasta.isoformat())\
+            .execute()
+    except Exception as e:
+        print(f"⚠️  Error obteniendo ocupación de la modelo {modelo_id}: {e}")
+        return [], {}
+    
+    slots, contenidos_por_dia = [], {}
+    for row in response.data or []:
+        if row['id'] == excluir_id:
+            continue
+        scheduled = datetime.fromisoformat(row['scheduled_time'].replace('Z', '+00:00'))
+        slots.append(scheduled)
+        dia = scheduled.astimezone(TZ_LOCAL).strftime("%Y-%m-%d")
+        contenidos_por_dia.setdefault(dia, set()).add(row.get('contenido_id'))
+    return slots, contenidos_por_dia
+
+
+def fallar_publicacion(publicacion: Dict, modelo_id: Optional[str], error_msg: str,
+                       error_class: str = 'unknown', stage: Optional[str] = None) -> bool:
+    """
+    Registra el fallo de una publicación (+1 intento) liberando el lease.
+    
+    Si el video seguro no llegó a la plataforma (stage, ver retry_policy),
+    la clase de error es reintentable y quedan intentos (MAX_INTENTOS),
+    vuelve a 'programada' tras el backoff en el primer slot libre de la
+    ventana de la modelo; si no, queda en 'fallido'.
+    """
+    publicacion_id = publicacion['id']
+    intentos = (publicacion.get('intentos') or 0) + 1
+    print(f"   ❌ {error_msg}")
+    
+    slot = None
+    if is_retryable(error_class, intentos, stage) and modelo_id:
+        earliest = datetime.now(timezone.utc) + timedelta(seconds=backoff_seconds(intentos, error_class))
+        contenido = publicacion.get('contenidos') or {}
+        config = (contenido.get('modelos') or {}).get('configuracion_distribucion')
+        config = config if isinstance(config, dict) else {}
+        gap = timedelta(minutes=RETRY_GAP_MINUTES)
+        ocupados, contenidos_por_dia = get_ocupacion_modelo(
+            modelo_id, earliest - gap, earliest + timedelta(days=RETRY_SLOT_HORIZON_DAYS + 1),
+            excluir_id=publicacion_id
+        )
+        # Mismos defaults que get_modelo_config del scheduler
+        slot = find_retry_slot(earliest, ocupados, config.get('hora_inicio', '12:00'),
+                               config.get('ventana_horas', 5), contenidos_por_dia,
+                               publicacion.get('contenido_id') or contenido.get('id'))
+        if slot is None:
+            error_msg = f"{error_msg} (sin horario libre para reintentar en {RETRY_SLOT_HORIZON_DAYS} días)"
+    elif stage in ('upload', 'uploaded'):
+        error_msg = f"Revisar manualmente, el video pudo quedar publicado: {error_msg}"
+    
+    if slot is None:
+        return transicionar_publicacion(
+            publicacion_id, 'fallido', 'publicacion_fallida', error_msg, modelo_id,
+            ultimo_error=error_msg, incrementar_intentos=True, lease_owner=POSTER_ID
+        )
+    
+    minutos = (slot - datetime.now(timezone.utc)).total_seconds() / 60
+    descripcion = f"Reintento {intentos + 1}/{MAX_INTENTOS} en {minutos:.0f} min [{error_class}]: {error_msg}"
+    print(f"   🔁 {descripcion[:120]}")
+    return transicionar_publicacion(
+        publicacion_id, 'programada', 'reintento', descripcion, modelo_id,
+        ultimo_error=error_msg, incrementar_intentos=True, lease_owner=POSTER_ID,
+        scheduled_time=slot.isoformat()
+    )
+
+
+def rechazar_invalidas(invalidas: List[tuple]) -> int:
+    """
+    Falla de una vez las publicaciones que no pasaron el preflight, sin
+    pasar por el pool: un claim en bloque (solo las que siguen en
+    'programada') y la transición de cada una. Retorna cuántas falló.
+    """
+    reclamadas = claim_publicaciones([pub['id'] for pub, _, _ in invalidas])
+    for pub, error_class, error_msg in invalidas:
+        if pub['id'] not in reclamadas:
+            continue
+        modelo_id = (pub.get('contenidos') or {}).get('modelo_id')
+        print(f"🚫 Publicación {pub['id']} no pasó el preflight")
+        fallar_publicacion(pub, modelo_id, error_msg, error_class, 'pre_upload')
+    return len(reclamadas)
+
+
+def get_worker_script_path(plataforma_nombre: str) -> Optional[Path]:
+    """
+    Obtiene la ruta del script worker para una plataforma.
+    Retorna None si no existe.
+    """
+    return get_worker_script(plataforma_nombre)
+
+
+def progress_printer(publicacion_id: str):
+    """Callback de eventos del worker: muestra el progreso de subida en vivo"""
+    def on_event(event: Dict):
+        if event.get('event') == 'progress' and event.get('total'):
+            pct = 100 * event.get('bytes', 0) / event['total']
+            print(f"   📤 {publicacion_id[:8]} {event.get('step', 'upload')}: {pct:.0f}% "
+                  f"({event.get('bytes', 0) / 1e6:.1f}/{event['total'] / 1e6:.1f} MB)")
+        elif event.get('event') == 'error':
+            print(f"   ⚠️  {publicacion_id[:8]} error [{event.get('error_class')}]: {event.get('message')}")
+    return on_event
 
 
 def process_publicacion(publicacion: Dict):
     """
     Procesa una publicación individual:
-    1. Cambia estado a 'procesando'
+    1. Reclama la publicación (programada → procesando con lease)
     2. Ejecuta worker
-    3. Actualiza estado según resultado
+    3. Actualiza estado según resultado (reintento con backoff si el error es transitorio)
     4. Registra eventos
     """
     publicacion_id = publicacion['id']
     
+    # 1. Reclamar: si otra instancia ya la tomó, no hacer nada
+    if not claim_publicacion(publicacion_id):
+        print(f"⏭️  Publicación {publicacion_id} ya reclamada por otra instancia")
+        return
+    
     # Extraer datos de relaciones anidadas
     # Supabase devuelve: { "contenidos": {...}, "cuentas_plataforma": {...} }
     contenido = publicacion.get('contenidos')
@@ -199,21 +735,14 @@ def process_publicacion(publicacion: Dict):
     # Validaciones
     if not modelo_nombre:
         error_msg = "Modelo no encontrado en relación"
-        print(f"❌ {error_msg}")
-        update_publicacion_estado(publicacion_id, 'fallido', error_msg, incrementar_intentos=True)
-        create_evento_sistema('publicacion_fallida', publicacion_id, modelo_id, error_msg)
+        fallar_publicacion(publicacion, modelo_id, error_msg, 'config', 'pre_upload')
         return
     
     if not plataforma_nombre:
         error_msg = "Plataforma no encontrada en relación"
-        print(f"❌ {error_msg}")
-        update_publicacion_estado(publicacion_id, 'fallido', error_msg, incrementar_intentos=True)
-        create_evento_sistema('publicacion_fallida', publicacion_id, modelo_id, error_msg)
+        fallar_publicacion(publicacion, modelo_id, error_msg, 'config', 'pre_upload')
         return
     
-    # 1. Cambiar estado a 'procesando'
-    print(f"   📝 Cambiando estado a 'procesando'...")
-    update_publicacion_estado(publicacion_id, 'procesando')
     create_evento_sistema('publicacion_iniciada', publicacion_id, modelo_id, 
                          f"Iniciando publicación en {plataforma_nombre}")
     
@@ -221,106 +750,147 @@ def process_publicacion(publicacion: Dict):
     # archivo_path viene como "modelos/{modelo}/{video}"
     video_path = BASE_DIR / archivo_path
     
-    if not video_path.exists():
-        error_msg = f"Archivo no encontrado: {video_path}"
-        print(f"❌ {error_msg}")
-        update_publicacion_estado(publicacion_id, 'fallido', error_msg, incrementar_intentos=True)
-        create_evento_sistema('publicacion_fallida', publicacion_id, modelo_id, error_msg)
+    error_msg = check_video(video_path)  # Cacheado por (ruta, mtime) desde el preflight
+    if error_msg:
+        fallar_publicacion(publicacion, modelo_id, error_msg, 'file', 'pre_upload')
         return
     
     # 3. Obtener worker script
     worker_script = get_worker_script_path(plataforma_nombre)
     if not worker_script:
         error_msg = f"Worker no encontrado para plataforma: {plataforma_nombre}"
-        print(f"❌ {error_msg}")
-        update_publicacion_estado(publicacion_id, 'fallido', error_msg, incrementar_intentos=True)
-        create_evento_sistema('publicacion_fallida', publicacion_id, modelo_id, error_msg)
+        fallar_publicacion(publicacion, modelo_id, error_msg, 'config', 'pre_upload')
         return
     
     # 4. Preparar entorno para worker
-    env = os.environ.copy()
-    env['VIDEO_PATH'] = str(video_path)
-    env['VIDEO_TITLE'] = caption
-    env['VIDEO_TAGS'] = ','.join(tags) if isinstance(tags, list) else str(tags)
-    env['MODEL_NAME'] = modelo_nombre
+    job_env = {
+        'VIDEO_PATH': str(video_path),
+        'VIDEO_TITLE': caption,
+        'VIDEO_TAGS': ','.join(tags) if isinstance(tags, list) else str(tags),
+        'MODEL_NAME': modelo_nombre,
+    }
     
-    # 5. Ejecutar worker
+    # 5. Ejecutar worker (worker host persistente; fallback npx playwright test)
     print(f"   🚀 Ejecutando worker: {worker_script.name}")
     print(f"      Video: {video_path.name}")
     print(f"      Título: {caption[:50]}...")
-    print(f"      Tags: {env['VIDEO_TAGS']}")
+    print(f"      Tags: {job_env['VIDEO_TAGS']}")
     
     try:
-        cmd = ["npx", "playwright", "test", str(worker_script)]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True, cwd=str(BASE_DIR), timeout=300)
+        result = run_worker(worker_script, job_env, BASE_DIR, timeout=WORKER_TIMEOUT_SECONDS,
+                            on_event=progress_printer(publicacion_id))
         
-        if result.returncode == 0:
-            # Éxito
-            print(f"   ✅ Publicación exitosa")
-            if result.stdout:
-                # Intentar extraer URL de la salida si está disponible
-                url_publicacion = None
-                stdout_lines = result.stdout.split('\n')
-                for line in stdout_lines:
-                    if 'http' in line.lower() and ('kams.com' in line or 'xxxfollow.com' in line):
-                        # Extraer URL aproximada
-                        url_publicacion = line.strip()
-                        break
-                
-                update_publicacion_estado(publicacion_id, 'publicado', url_publicacion=url_publicacion)
-            else:
-                update_publicacion_estado(publicacion_id, 'publicado')
-            
-            create_evento_sistema('publicacion_exitosa', publicacion_id, modelo_id,
-                                 f"Publicación exitosa en {plataforma_nombre}")
+        if result.success:
+            # Éxito: URL y id externo vienen del evento 'result' del worker
+            print(f"   ✅ Publicación exitosa ({result.via}, {result.duration_seconds:.0f}s)")
+            detalle = f" (id {result.external_id})" if result.external_id else ""
+            registrar_publicado(publicacion_id, modelo_id,
+                                f"Publicación exitosa en {plataforma_nombre}{detalle}", result.url)
         else:
             # Fallo
-            error_output = result.stderr[-500:] if result.stderr else result.stdout[-500:] if result.stdout else "Error desconocido"
-            error_msg = f"Worker falló (code {result.returncode}): {error_output}"
-            print(f"   ❌ {error_msg}")
-            
-            update_publicacion_estado(publicacion_id, 'fallido', error_msg, incrementar_intentos=True)
-            create_evento_sistema('publicacion_fallida', publicacion_id, modelo_id, error_msg)
-            
-    except subprocess.TimeoutExpired:
-        error_msg = "Worker timeout (más de 5 minutos)"
-        print(f"   ❌ {error_msg}")
-        update_publicacion_estado(publicacion_id, 'fallido', error_msg, incrementar_intentos=True)
-        create_evento_sistema('publicacion_fallida', publicacion_id, modelo_id, error_msg)
+            error_msg = f"Worker falló [{result.error_class}]: {(result.error or 'Error desconocido')[-500:]}"
+            fallar_publicacion(publicacion, modelo_id, error_msg, result.error_class or 'unknown', result.stage)
         
     except Exception as e:
         error_msg = f"Error ejecutando worker: {e}"
-        print(f"   ❌ {error_msg}")
-        update_publicacion_estado(publicacion_id, 'fallido', error_msg, incrementar_intentos=True)
-        create_evento_sistema('publicacion_fallida', publicacion_id, modelo_id, error_msg)
+        fallar_publicacion(publicacion, modelo_id, error_msg, 'unknown')
+
+
+def concurrency_keys(publicacion: Dict) -> tuple:
+    """Retorna (plataforma, cuenta_plataforma_id) para los límites del pool"""
+    cuenta = publicacion.get('cuentas_plataforma')
+    plataforma_nombre = ''
+    if isinstance(cuenta, dict) and isinstance(cuenta.get('plataformas'), dict):
+        plataforma_nombre = cuenta['plataformas'].get('nombre', '') or ''
+    return plataforma_nombre, publicacion.get('cuenta_plataforma_id')
 
 
 def main():
     """
     Loop principal del poster.
-    Lee publicaciones programadas y las procesa.
+    Lee publicaciones programadas y las reparte en el pool de workers
+    (límites global, por plataforma y por cuenta).
+    Duerme hasta la próxima publicación programada o hasta recibir aviso
+    del scheduler (canal 'poster'); el poll con backoff es el fallback.
     """
     print("🚀 Iniciando Poster Worker (Esquema PRD)")
     print("=" * 60)
     
+    listener = WakeupListener('poster')
+    backoff = AdaptiveBackoff()
+    event_sink.start()  # Reenvía eventos pendientes de una ejecución anterior
+    pool = PosterPool(
+        process_publicacion,
+        concurrency_keys,
+        max_workers=POSTER_MAX_WORKERS,
+        max_per_plataforma=POSTER_MAX_PER_PLATAFORMA,
+        max_per_cuenta=POSTER_MAX_PER_CUENTA
+    )
+    print(f"⚙️  Workers: {POSTER_MAX_WORKERS} global, {POSTER_MAX_PER_PLATAFORMA}/plataforma, "
+          f"{POSTER_MAX_PER_CUENTA}/cuenta")
+    print(f"🪪 Instancia: {POSTER_ID} (lease {POSTER_LEASE_SECONDS}s)")
+    last_reap = 0.0
+    cursor = None
+    
     while True:
         try:
-            # Obtener publicaciones programadas
-            publicaciones = get_pending_publicaciones()
+            # Primero los 'publicado' que no se pudieron escribir, luego el reaper
+            replay_publicados_pendientes()
+            
+            # Liberar leases vencidos de instancias caídas
+            if time.monotonic() - last_reap >= REAPER_INTERVAL_SECONDS:
+                reap_expired_leases()
+                last_reap = time.monotonic()
+            
+            # Obtener publicaciones programadas: una página, solo lo que cabe en
+            # la cola del pool; el keyset avanza por el backlog entre ciclos
+            capacidad = max(0, POSTER_PAGE_SIZE - pool.pending())
+            publicaciones = get_pending_publicaciones(limit=capacidad, after=cursor) if capacidad else []
+            if capacidad:
+                if len(publicaciones) == capacidad:
+                    cursor = (publicaciones[-1]['scheduled_time'], publicaciones[-1]['id'])
+                else:
+                    cursor = None  # Fin del backlog: la próxima pasada empieza de nuevo
+            
+            # Preflight: lo que fallaría seguro se descarta sin ocupar un worker
+            publicaciones, invalidas = check_batch(publicaciones)
+            if invalidas:
+                rechazar_invalidas(invalidas)
             
-            if publicaciones:
-                print(f"\n📬 {len(publicaciones)} publicación(es) programada(s) encontrada(s)")
-                for pub in publicaciones:
-                    process_publicacion(pub)
+            nuevas = pool.submit(publicaciones) if publicaciones else 0
+            if nuevas:
+                print(f"\n📬 {nuevas} publicación(es) programada(s) encolada(s) "
+                      f"({pool.running()} en curso, {pool.pending()} pendientes)")
+                backoff.reset()
+            elif pool.pending():
+                print(f"⏳ {pool.pending()} publicación(es) en curso o en cola")
+                backoff.reset()
             else:
                 print("💤 No hay publicaciones programadas. Esperando...")
             
-            # Esperar antes de la siguiente iteración
-            print(f"\n💤 Esperando 60 segundos...")
-            time.sleep(60)
+            # Lookahead: preparar lo que vence pronto (page cache, sesión en el host)
+            proximas = get_upcoming_publicaciones() if LOOKAHEAD_SECONDS else []
+            if proximas:
+                stage_publicaciones(proximas)
+            
+            # Esperar hasta la próxima publicación, el backoff o un aviso
+            delay = backoff.next()
+            if proximas:
+                next_time = datetime.fromisoformat(proximas[0]['scheduled_time'].replace('Z', '+00:00'))
+            else:
+                next_time = get_next_scheduled_time()
+            if next_time:
+                hasta_proxima = (next_time - datetime.now(timezone.utc)).total_seconds()
+                if hasta_proxima > 0:  # Las ya vencidas están en cola o en el backlog
+                    delay = max(1.0, min(delay, hasta_proxima))
+            
+            print(f"\n💤 Esperando hasta {delay:.0f} segundos...")
+            if listener.wait(delay):
+                print("🔔 Aviso recibido: nuevas publicaciones programadas")
+                backoff.reset()
             
         except KeyboardInterrupt:
-            print("\n🛑 Deteniendo poster...")
+            print("\n🛑 Deteniendo poster (esperando uploads en curso)...")
             break
         except Exception as e:
             print(f"❌ Error en loop principal: {e}")
@@ -328,8 +898,11 @@ def main():
             traceback.print_exc()
             print("💤 Reintentando en 60 segundos...")
             time.sleep(60)
+    
+    pool.shutdown(wait=True)
+    event_sink.close()
+    listener.close()
 
 
 if __name__ == "__main__":
     main()
-
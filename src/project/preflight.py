@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Preflight - Validación previa de publicaciones del poster
+Antes de encolar un lote de publicaciones vencidas se valida, sin ocupar
+un worker, lo que haría fallar el upload seguro:
+
+- archivo de video: existe, tamaño > 0 y cabecera de contenedor legible
+  (MP4/MOV 'ftyp'/átomos QuickTime, Matroska/WebM EBML, AVI RIFF). Solo
+  descarta lo que no es un video; si la plataforma acepta el formato lo
+  decide el worker (error 'rejected')
+- worker de la plataforma (workers/<plataforma>.js)
+- sesión guardada de la modelo (modelos/<modelo>/.auth/<archivo>)
+
+Los resultados se cachean por (ruta, mtime, tamaño): un archivo solo se
+vuelve a abrir si cambió. Dentro de un lote cada ruta se consulta una vez.
+
+Una sesión vieja no falla la publicación (solo aviso), salvo que se
+configure AUTH_MAX_AGE_DAYS.
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+# Plataforma -> (worker, archivo de sesión en modelos/<modelo>/.auth/)
+WORKER_SCRIPTS: Dict[str, Tuple[str, str]] = {
+    'kams': ('workers/kams.js', 'user.json'),
+    'kams.com': ('workers/kams.js', 'user.json'),
+    'xxxfollow': ('workers/xxxfollow.js', 'xxxfollow.json'),
+}
+
+# Sesión más vieja que esto: aviso. Con AUTH_MAX_AGE_DAYS > 0: fallo (auth)
+AUTH_WARN_AGE_DAYS = int(os.getenv("AUTH_WARN_AGE_DAYS", "30"))
+AUTH_MAX_AGE_DAYS = int(os.getenv("AUTH_MAX_AGE_DAYS", "0"))
+
+# Firmas de contenedor aceptadas en los primeros 12 bytes
+QUICKTIME_ATOMS = (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip')
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+# AVI: 'RIFF' <tamaño> 'AVI ' (el bot guarda todo como .mp4 sin convertir)
+RIFF_MAGIC, AVI_FORM = b'RIFF', b'AVI '
+HEADER_BYTES = 12
+
+CACHE_MAX_ENTRIES = 4096
+
+# ruta -> (mtime_ns, size, error o None)
+_FILE_CACHE: Dict[str, Tuple[int, int, Optional[str]]] = {}
+# Sesiones viejas ya avisadas: (ruta, mtime_ns)
+_AUTH_WARNED = set()
+
+# Error de preflight: (error_class, mensaje), con las clases de retry_policy
+PreflightError = Tuple[str, str]
+
+
+def _stat(path: Path, memo: Dict) -> Optional[os.stat_result]:
+    """os.stat memoizado por lote (None si no existe)"""
+    key = str(path)
+    if key not in memo:
+        try:
+            memo[key] = path.stat()
+        except OSError:
+            memo[key] = None
+    return memo[key]
+
+
+def _is_video_header(header: bytes) -> bool:
+    """Cabecera de un contenedor de video aceptado"""
+    if header[4:8] in QUICKTIME_ATOMS or header.startswith(EBML_MAGIC):
+        return True
+    return header.startswith(RIFF_MAGIC) and header[8:12] == AVI_FORM
+
+
+def check_video(path: Path, memo: Optional[Dict] = None) -> Optional[str]:
+    """Retorna el error del archivo de video, o None si es válido"""
+    st = _stat(path, memo if memo is not None else {})
+    if st is None:
+        return f"Archivo no encontrado: {path}"
+
+    key = str(path)
+    cached = _FILE_CACHE.get(key)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    error = None
+    if st.st_size == 0:
+        error = f"Archivo vacío: {path}"
+    else:
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(HEADER_BYTES)
+            if not _is_video_header(header):
+                error = f"Archivo sin cabecera de video reconocible (MP4/MOV/WebM/AVI): {path}"
+        except OSError as e:
+            error = f"Archivo ilegible: {path} ({e})"
+
+    if len(_FILE_CACHE) >= CACHE_MAX_ENTRIES:
+        _FILE_CACHE.clear()
+    _FILE_CACHE[key] = (st.st_mtime_ns, st.st_size, error)
+    return error
+
+
+def check_auth(path: Path, memo: Optional[Dict] = None) -> Optional[str]:
+    """Retorna el error de la sesión guardada, o None (una sesión vieja solo avisa)"""
+    st = _stat(path, memo if memo is not None else {})
+    if st is None:
+        return f"No hay sesión guardada en {path}. Ejecuta el login manual primero."
+
+    dias = (time.time() - st.st_mtime) / 86400
+    if AUTH_MAX_AGE_DAYS and dias > AUTH_MAX_AGE_DAYS:
+        return f"Sesión de {dias:.0f} días (máximo {AUTH_MAX_AGE_DAYS}) en {path}. Repetir el login."
+    if dias > AUTH_WARN_AGE_DAYS and (str(path), st.st_mtime_ns) not in _AUTH_WARNED:
+        _AUTH_WARNED.add((str(path), st.st_mtime_ns))
+        print(f"⚠️  Sesión de {dias:.0f} días en {path}, puede haber expirado")
+    return None
+
+
+def get_worker_script(plataforma_nombre: str, memo: Optional[Dict] = None) -> Optional[Path]:
+    """Ruta del worker de la plataforma si existe"""
+    entry = WORKER_SCRIPTS.get((plataforma_nombre or '').lower())
+    if not entry:
+        return None
+    script_path = BASE_DIR / entry[0]
+    return script_path if _stat(script_path, memo if memo is not None else {}) else None
+
+
+def auth_path(modelo_nombre: str, plataforma_nombre: str) -> Optional[Path]:
+    """Sesión guardada (storageState) que usa el worker de la plataforma para la modelo"""
+    entry = WORKER_SCRIPTS.get((plataforma_nombre or '').lower())
+    if not entry or not modelo_nombre:
+        return None
+    return BASE_DIR / 'modelos' / modelo_nombre / '.auth' / entry[1]
+
+
+def check_publicacion(publicacion: Dict, memo: Optional[Dict] = None) -> Optional[PreflightError]:
+    """
+    Valida una publicación hidratada (contenidos.modelos, cuentas_plataforma.plataformas).
+
+    Returns:
+        None si puede subirse; (error_class, mensaje) si fallaría seguro
+    """
+    memo = memo if memo is not None else {}
+    contenido = publicacion.get('contenidos') or {}
+    modelo = contenido.get('modelos') or {}
+    plataforma = (publicacion.get('cuentas_plataforma') or {}).get('plataformas') or {}
+    modelo_nombre = modelo.get('nombre', '')
+    plataforma_nombre = plataforma.get('nombre', '')
+
+    if not modelo_nombre:
+        return 'config', "Modelo no encontrado en relación"
+    if not plataforma_nombre:
+        return 'config', "Plataforma no encontrada en relación"
+
+    error = check_video(BASE_DIR / (contenido.get('archivo_path') or ''), memo) \
+        if contenido.get('archivo_path') else "Contenido sin archivo_path"
+    if error:
+        return 'file', error
+
+    if not get_worker_script(plataforma_nombre, memo):
+        return 'config', f"Worker no encontrado para plataforma: {plataforma_nombre}"
+
+    error = check_auth(auth_path(modelo_nombre, plataforma_nombre), memo)
+    if error:
+        return 'auth', error
+    return None
+
+
+def check_batch(publicaciones: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str, str]]]:
+    """
+    Valida un lote compartiendo los stat entre publicaciones.
+
+    Returns:
+        (válidas, [(publicación, error_class, mensaje), ...])
+    """
+    memo: Dict = {}
+    validas, invalidas = [], []
+    for pub in publicaciones:
+        error = check_publicacion(pub, memo)
+        if error:
+            invalidas.append((pub, *error))
+        else:
+            validas.append(pub)
+    return validas, invalidas
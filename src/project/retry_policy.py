@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Retry Policy - Reintentos de publicaciones fallidas
+Decide, según la clase de error y la etapa del upload en que falló, si
+una publicación fallida vuelve a 'programada' o queda en 'fallido':
+
+- Solo se reintenta lo que seguro no llegó a la plataforma. Los workers
+  informan la etapa (workers/lib/events.js):
+    pre_upload: antes de enviar el video → network, timeout, platform,
+                rate_limit, unknown
+    upload:     la petición de subida respondió 5xx o 429 (la plataforma
+                no aceptó el video) → platform, rate_limit. Un corte de red
+                o un timeout a mitad de subida no: pudo haber llegado
+    uploaded:   la plataforma ya aceptó el video (p. ej. falló el paso de
+                detalles) → nunca: re-subir lo publicaría dos veces;
+                queda en 'fallido' para revisión manual
+  Sin etapa conocida (worker sin eventos, worker cortado a mitad) no hay
+  reintento automático.
+- Definitivos siempre: auth (sesión expirada: requiere login manual),
+  file (archivo inexistente o inválido), rejected (4xx de la plataforma),
+  config (modelo/plataforma/worker inexistente)
+
+El nuevo horario usa backoff exponencial con jitter (los fallos de una
+caída de la plataforma no se reintentan todos a la vez) y se ubica con las
+mismas reglas que el scheduler: dentro de la ventana diaria de la modelo
+(hora_inicio + ventana_horas, hora Bogotá), a ≥ MIN_GAP_MINUTES de las
+demás publicaciones de la modelo y sin pasar el tope diario de contenidos
+distintos. El total de intentos se limita con MAX_INTENTOS.
+"""
+
+import os
+import random
+import datetime as dt
+from typing import Dict, Iterable, Optional, Set
+
+from slot_allocator import SlotAllocator, MAX_CONTENIDOS_POR_DIA
+
+MAX_INTENTOS = int(os.getenv("MAX_INTENTOS", "3"))
+RETRY_BASE_SECONDS = int(os.getenv("RETRY_BASE_SECONDS", "300"))
+RETRY_MAX_SECONDS = int(os.getenv("RETRY_MAX_SECONDS", "21600"))
+# Mismo gap que el scheduler entre publicaciones de una modelo
+RETRY_GAP_MINUTES = int(os.getenv("MIN_GAP_MINUTES", "10"))
+# Días (desde el fin del backoff) en los que buscar un slot libre
+RETRY_SLOT_HORIZON_DAYS = int(os.getenv("RETRY_SLOT_HORIZON_DAYS", "7"))
+# Zona del scheduler (hora_inicio es hora local de Bogotá)
+TZ_LOCAL = dt.timezone(dt.timedelta(hours=-5))
+
+# Etapa del upload en que falló el worker -> clases reintentables
+RETRYABLE_BY_STAGE = {
+    'pre_upload': {'network', 'timeout', 'platform', 'rate_limit', 'unknown'},
+    'upload': {'platform', 'rate_limit'},
+    'uploaded': set(),
+}
+# Un 429 pide esperar más que un error transitorio
+BACKOFF_FACTOR = {'rate_limit': 4}
+
+
+def is_retryable(error_class: Optional[str], intentos: int, stage: Optional[str] = None) -> bool:
+    """
+    Args:
+        intentos: Intentos ya realizados, contando el que acaba de fallar
+        stage: Etapa del upload (pre_upload | upload | uploaded); None si no se sabe
+    """
+    clases = RETRYABLE_BY_STAGE.get(stage, set())
+    return (error_class or 'unknown') in clases and intentos < MAX_INTENTOS
+
+
+def backoff_seconds(intentos: int, error_class: Optional[str] = None, rng=random) -> float:
+    """
+    Espera antes del reintento: base × 2^(intentos-1), con tope, y jitter
+    en [50%, 100%] para repartir los reintentos de fallos simultáneos.
+    """
+    factor = BACKOFF_FACTOR.get(error_class, 1)
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * factor * 2 ** max(0, intentos - 1))
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+def find_retry_slot(
+    earliest: dt.datetime,
+    occupied: Iterable[dt.datetime],
+    hora_inicio: str,
+    ventana_horas: float,
+    contenidos_por_dia: Optional[Dict[str, Set[str]]] = None,
+    contenido_id: Optional[str] = None,
+    gap_minutes: int = RETRY_GAP_MINUTES,
+    horizon_days: int = RETRY_SLOT_HORIZON_DAYS
+) -> Optional[dt.datetime]:
+    """
+    Primer horario ≥ earliest dentro de la ventana diaria de la modelo, a
+    ≥ gap de sus slots ocupados, en un día que no supere el tope de
+    contenidos distintos (el propio contenido no suma si ya está ese día).
+
+    Args:
+        occupied: Slots de las publicaciones pendientes/publicadas de la modelo
+        contenidos_por_dia: Fecha local 'YYYY-MM-DD' -> contenido_ids con publicaciones
+
+    Returns:
+        El horario, o None si no hay hueco en horizon_days días
+    """
+    H, M = [int(x) for x in hora_inicio.split(":")]
+    slots = SlotAllocator(gap_minutes, occupied)
+    contenidos_por_dia = contenidos_por_dia or {}
+    not_before = earliest.replace(second=0, microsecond=0) + dt.timedelta(minutes=1)
+    first_day = earliest.astimezone(TZ_LOCAL).date()
+
+    for offset in range(horizon_days + 1):
+        day = first_day + dt.timedelta(days=offset)
+        contenidos = contenidos_por_dia.get(day.strftime("%Y-%m-%d"), set())
+        if contenido_id not in contenidos and len(contenidos) >= MAX_CONTENIDOS_POR_DIA:
+            continue
+
+        start = dt.datetime(day.year, day.month, day.day, H, M, tzinfo=TZ_LOCAL)
+        end = start + dt.timedelta(hours=ventana_horas)
+        if end < not_before:
+            continue
+        found = slots.find_n_slots(max(start, not_before), end, 1, not_before=not_before)
+        if found:
+            return found[0]
+    return None
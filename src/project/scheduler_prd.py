@@ -6,15 +6,19 @@ Usa exclusivamente el esquema PRD (contenidos, publicaciones, cuentas_plataforma
 """
 
 import os
-import random
+import time
 import datetime as dt
 from pathlib import Path
 from typing import List, Tuple, Dict, Optional
 from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
 
+from slot_allocator import SlotAllocator, MAX_CONTENIDOS_POR_DIA
+from wakeup import WakeupListener, AdaptiveBackoff, notify
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -37,6 +41,8 @@ supabase: Client = create_client(url, key)
 MIN_GAP_MINUTES = int(os.getenv("MIN_GAP_MINUTES", "10"))
 MAX_DAYS_AHEAD = int(os.getenv("MAX_DAYS_AHEAD", "30"))
 MAX_SAME_VIDEO = int(os.getenv("MAX_SAME_VIDEO", "6"))
+# Modelos programados en paralelo (1 = secuencial)
+SCHEDULER_MAX_WORKERS = int(os.getenv("SCHEDULER_MAX_WORKERS", "4"))
 
 
 def now_tz() -> dt.datetime:
@@ -74,11 +80,71 @@ def get_pending_contenidos() -> List[Dict]:
         return []
 
 
+# ---- Pre-check por ciclo: publicaciones existentes por contenido ----
+# contenido_id -> {estado: cantidad}
+_PUBLICACIONES_COUNT_CACHE: Dict[str, Dict[str, int]] = {}
+# Máximo de contenido_ids por query (límite práctico de longitud de URL)
+PRECHECK_CHUNK = 150
+# Filas por página: no más que el max-rows de PostgREST (1000 por defecto),
+# que trunca en silencio una respuesta más grande
+PRECHECK_PAGE_SIZE = int(os.getenv("PRECHECK_PAGE_SIZE", "1000"))
+
+
+def load_publicaciones_counts(contenido_ids: List[str]) -> bool:
+    """
+    Carga (por bloques de PRECHECK_CHUNK ids, paginando de a
+    PRECHECK_PAGE_SIZE filas) las publicaciones de todos los contenidos
+    pendientes, agrupadas por contenido y estado.
+    Con esto check_idempotencia y check_limits no hacen round-trips.
+    Retorna False si alguna query falla.
+    """
+    pendientes = list(dict.fromkeys(c for c in contenido_ids if c and c not in _PUBLICACIONES_COUNT_CACHE))
+    
+    for i in range(0, len(pendientes), PRECHECK_CHUNK):
+        chunk = pendientes[i:i + PRECHECK_CHUNK]
+        counts: Dict[str, Dict[str, int]] = {contenido_id: {} for contenido_id in chunk}
+        offset = 0
+        while True:
+            try:
+                publicaciones = supabase.table('publicaciones')\
+                    .select("id, contenido_id, estado")\
+                    .in_('contenido_id', chunk)\
+                    .order('id')\
+                    .range(offset, offset + PRECHECK_PAGE_SIZE - 1)\
+                    .execute()
+            except Exception as e:
+                logger.error(f"❌ Error en pre-check de publicaciones: {e}")
+                return False
+            
+            filas = publicaciones.data or []
+            for pub in filas:
+                por_estado = counts.setdefault(pub.get('contenido_id'), {})
+                estado = pub.get('estado')
+                por_estado[estado] = por_estado.get(estado, 0) + 1
+            if len(filas) < PRECHECK_PAGE_SIZE:
+                break
+            offset += PRECHECK_PAGE_SIZE
+        _PUBLICACIONES_COUNT_CACHE.update(counts)
+    
+    return True
+
+
+def register_publicaciones_count(contenido_id: str, n: int):
+    """Refleja en el pre-check las publicaciones recién programadas"""
+    por_estado = _PUBLICACIONES_COUNT_CACHE.get(contenido_id)
+    if por_estado is not None:
+        por_estado['programada'] = por_estado.get('programada', 0) + n
+
+
 def check_idempotencia(contenido_id: str) -> bool:
     """
     Verifica si el contenido ya tiene publicaciones creadas.
     Retorna True si ya tiene publicaciones (idempotencia)
     """
+    por_estado = _PUBLICACIONES_COUNT_CACHE.get(contenido_id)
+    if por_estado is not None:
+        return any(por_estado.get(e, 0) > 0 for e in ['programada', 'procesando', 'publicado'])
+    
     try:
         existing = supabase.table('publicaciones')\
             .select("id")\
@@ -97,6 +163,10 @@ def check_limits(contenido_id: str) -> bool:
     Verifica si el contenido alcanzó el límite MAX_SAME_VIDEO.
     Retorna True si alcanzó el límite
     """
+    por_estado = _PUBLICACIONES_COUNT_CACHE.get(contenido_id)
+    if por_estado is not None:
+        return sum(por_estado.values()) >= MAX_SAME_VIDEO
+    
     try:
         count_response = supabase.table('publicaciones')\
             .select("id", count="exact")\
@@ -110,213 +180,293 @@ def check_limits(contenido_id: str) -> bool:
         return False
 
 
-def get_cuentas_plataforma(modelo_id: str, plataformas_nombres: List[str]) -> List[Dict]:
+# ---- Caché por ciclo: cuentas_plataforma y configuración de modelos ----
+# modelo_id -> [{"id", "plataforma_id", "plataforma_nombre"}] (solo plataformas activas)
+_CUENTAS_CACHE: Dict[str, List[Dict]] = {}
+# modelo_id -> configuracion_distribucion normalizada (None si es inválida)
+_CONFIG_CACHE: Dict[str, Optional[Dict]] = {}
+
+
+def load_cuentas_cache(modelo_ids: List[str]) -> bool:
     """
-    Obtiene cuentas_plataforma válidas para un modelo y lista de plataformas.
-    Solo plataformas activas y que estén en la lista.
+    Carga en UNA sola query las cuentas_plataforma (con plataforma activa)
+    de todos los modelos indicados que aún no están en caché.
+    Retorna False si la query falla.
     """
+    pendientes = list({m for m in modelo_ids if m and m not in _CUENTAS_CACHE})
+    if not pendientes:
+        return True
+    
     try:
-        # Obtener todas las cuentas del modelo
         cuentas = supabase.table('cuentas_plataforma')\
-            .select("id, plataforma_id, plataformas!inner(nombre, activa)")\
-            .eq('modelo_id', modelo_id)\
+            .select("id, modelo_id, plataforma_id, plataformas!inner(nombre, activa)")\
+            .in_('modelo_id', pendientes)\
+            .eq('plataformas.activa', True)\
             .execute()
-        
-        if not cuentas.data:
-            return []
-        
-        # Filtrar por plataformas activas y en la lista
-        cuentas_validas = []
-        for cuenta in cuentas.data:
-            plataforma = cuenta.get('plataformas', {})
-            if isinstance(plataforma, dict):
-                nombre = plataforma.get('nombre', '').lower()
-                activa = plataforma.get('activa', False)
-                if activa and nombre in [p.lower() for p in plataformas_nombres]:
-                    cuentas_validas.append({
-                        'id': cuenta['id'],
-                        'plataforma_id': cuenta['plataforma_id'],
-                        'plataforma_nombre': nombre
-                    })
-        
-        return cuentas_validas
     except Exception as e:
         logger.error(f"❌ Error obteniendo cuentas_plataforma: {e}")
-        return []
+        return False
+    
+    for modelo_id in pendientes:
+        _CUENTAS_CACHE[modelo_id] = []
+    
+    for cuenta in cuentas.data or []:
+        plataforma = cuenta.get('plataformas', {})
+        if not isinstance(plataforma, dict):
+            continue
+        _CUENTAS_CACHE.setdefault(cuenta['modelo_id'], []).append({
+            'id': cuenta['id'],
+            'plataforma_id': cuenta['plataforma_id'],
+            'plataforma_nombre': plataforma.get('nombre', '').lower()
+        })
+    
+    return True
 
 
-def _within_window(candidate: dt.datetime, start: dt.datetime, end: dt.datetime) -> bool:
-    """Verifica si candidate está dentro de la ventana [start, end]"""
-    return start <= candidate <= end
+def prefetch_cycle_cache(contenidos: List[Dict]):
+    """
+    Precarga lo que el ciclo necesita para todos los contenidos pendientes:
+    publicaciones existentes por contenido y cuentas de sus modelos.
+    """
+    load_publicaciones_counts([c.get('id') for c in contenidos])
+    modelo_ids = [(c.get('modelos') or {}).get('id') or c.get('modelo_id') for c in contenidos]
+    load_cuentas_cache(modelo_ids)
 
 
-def _valid_gap(candidate: dt.datetime, others: List[dt.datetime], gap_min: int) -> bool:
-    """Verifica si candidate tiene gap mínimo con otros slots"""
-    for h in others:
-        if abs((candidate - h).total_seconds()) < gap_min * 60:
-            return False
-    return True
+def invalidate_cuentas_cache(modelo_id: Optional[str] = None):
+    """
+    Hook de invalidación del caché de cuentas y configuración.
+    Sin modelo_id invalida todos los modelos.
+    """
+    if modelo_id is None:
+        _CUENTAS_CACHE.clear()
+        _CONFIG_CACHE.clear()
+    else:
+        _CUENTAS_CACHE.pop(modelo_id, None)
+        _CONFIG_CACHE.pop(modelo_id, None)
 
 
-def _build_slots_for_day(n: int, start: dt.datetime, hours: int, occupied: List[dt.datetime]) -> List[dt.datetime]:
-    """
-    Construye N slots distribuidos en una ventana de horas.
-    Hereda lógica del scheduler antiguo.
-    """
-    gap = MIN_GAP_MINUTES
-    end = start + dt.timedelta(hours=hours)
-    
-    proposals: List[dt.datetime] = []
-    now_local = now_tz()
-    
-    # 1) Primer slot cerca de inicio
-    if n >= 1:
-        jitter = dt.timedelta(minutes=random.randint(0, 5))
-        c = (start + jitter).replace(second=0, microsecond=0)
-        if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
-            proposals.append(c)
-    
-    # 2) Segundo slot cerca de fin
-    if n >= 2:
-        jitter = dt.timedelta(minutes=random.randint(0, 5))
-        c = (end - jitter).replace(second=0, microsecond=0)
-        if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
-            proposals.append(c)
-    
-    # 3) Midpoint entre 1 y 2
-    if n >= 3 and len(proposals) >= 2:
-        a, b = sorted(proposals)[0], sorted(proposals)[-1]
-        c = (a + (b - a) / 2).replace(second=0, microsecond=0)
-        if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
-            proposals.append(c)
-    
-    # 4) Midpoints válidos entre ocupados + propuestos (≥ 2×gap)
-    def midpoints_fill():
-        nonlocal proposals
-        timeline = sorted(occupied + proposals)
-        made = 0
-        for i in range(len(timeline) - 1):
-            a, b = timeline[i], timeline[i + 1]
-            if (b - a) >= dt.timedelta(minutes=2 * gap):
-                c = (a + (b - a) / 2).replace(second=0, microsecond=0)
-                if _within_window(c, start, end) and _valid_gap(c, occupied + proposals, gap) and c >= now_local:
-                    proposals.append(c)
-                    made += 1
-                    if len(proposals) >= n:
-                        break
-        return made
-    
-    while len(proposals) < n and midpoints_fill() > 0:
-        pass
-    
-    # 5) Relleno hacia adelante en pasos de gap
-    t = start
-    while len(proposals) < n:
-        t = t.replace(second=0, microsecond=0)
-        if _within_window(t, start, end) and _valid_gap(t, occupied + proposals, gap) and t >= now_local:
-            proposals.append(t)
-        t += dt.timedelta(minutes=gap)
-        if t > end:
-            break
+def get_modelo_config(modelo: Dict) -> Optional[Dict]:
+    """
+    Extrae configuracion_distribucion del modelo (cacheada por ciclo).
+    Retorna None si la configuración es inválida.
+    """
+    modelo_id = modelo.get('id')
+    if modelo_id in _CONFIG_CACHE:
+        return _CONFIG_CACHE[modelo_id]
     
-    return sorted(proposals)[:n]
+    config = modelo.get('configuracion_distribucion', {})
+    if isinstance(config, dict):
+        parsed = {
+            "plataformas": config.get('plataformas', []),
+            "hora_inicio": config.get('hora_inicio', '12:00'),
+            "ventana_horas": config.get('ventana_horas', 5)
+        }
+    else:
+        parsed = None
+    
+    _CONFIG_CACHE[modelo_id] = parsed
+    return parsed
 
 
-def _distinct_contenidos_on_date(modelo_id: str, date_str: str) -> int:
+def get_cuentas_plataforma(modelo_id: str, plataformas_nombres: List[str]) -> List[Dict]:
     """
-    Cuenta contenidos distintos que tienen publicaciones en una fecha.
-    Adaptado para PRD: lee de publicaciones en lugar de tabla dinámica.
+    Obtiene cuentas_plataforma válidas para un modelo y lista de plataformas.
+    Solo plataformas activas y que estén en la lista.
+    Se resuelve desde el caché del ciclo (carga el modelo si no estaba precargado).
     """
+    if modelo_id not in _CUENTAS_CACHE and not load_cuentas_cache([modelo_id]):
+        return []
+    
+    nombres = {p.lower() for p in plataformas_nombres}
+    return [dict(c) for c in _CUENTAS_CACHE.get(modelo_id, []) if c['plataforma_nombre'] in nombres]
+
+
+def _parse_scheduled_time(st) -> Optional[dt.datetime]:
+    """Parsea scheduled_time (ISO) a datetime en zona Bogotá. None si no es válido."""
+    if not st or not isinstance(st, str):
+        return None
     try:
-        # Obtener publicaciones del modelo en esa fecha
-        fecha_inicio = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone(timedelta(hours=-5)))
-        fecha_fin = fecha_inicio + timedelta(days=1)
-        
-        publicaciones = supabase.table('publicaciones')\
-            .select("contenido_id")\
-            .gte('scheduled_time', fecha_inicio.isoformat())\
-            .lt('scheduled_time', fecha_fin.isoformat())\
-            .in_('estado', ['programada', 'procesando', 'publicado'])\
-            .execute()
-        
-        if not publicaciones.data:
-            return 0
-        
-        # Obtener contenidos únicos (verificar que pertenecen al modelo)
-        contenido_ids = set()
-        for pub in publicaciones.data:
-            contenido_id = pub.get('contenido_id')
-            if contenido_id:
-                # Verificar que el contenido pertenece al modelo
-                contenido = supabase.table('contenidos').select("modelo_id").eq('id', contenido_id).execute()
-                if contenido.data and contenido.data[0].get('modelo_id') == modelo_id:
-                    contenido_ids.add(contenido_id)
-        
-        return len(contenido_ids)
-    except Exception as e:
-        logger.error(f"❌ Error contando contenidos distintos: {e}")
-        return 0
+        dt_obj = datetime.fromisoformat(st.replace('Z', '+00:00'))
+        if dt_obj.tzinfo is None:
+            dt_obj = dt_obj.replace(tzinfo=timezone.utc)
+        return dt_obj.astimezone(timezone(timedelta(hours=-5)))
+    except ValueError:
+        return None
+
+
+# ---- Índice de ocupación (caché por ciclo) ----
+# modelo_id -> { "YYYY-MM-DD": {"contenidos": set(contenido_id), "slots": SlotAllocator} }
+_OCCUPANCY_CACHE: Dict[str, Dict[str, Dict]] = {}
+
+
+def _new_day_entry() -> Dict:
+    """Entrada vacía del índice de ocupación para un día"""
+    return {"contenidos": set(), "slots": SlotAllocator(MIN_GAP_MINUTES)}
 
 
-def _occupied_on_date(modelo_id: str, date_str: str) -> List[dt.datetime]:
+def load_occupancy_index(modelo_id: str) -> Dict[str, Dict]:
     """
-    Obtiene slots ocupados en una fecha para un modelo.
-    Adaptado para PRD: lee de publicaciones.
+    Construye el índice de ocupación de un modelo para toda la ventana
+    [hoy, hoy + MAX_DAYS_AHEAD] paginando de a PRECHECK_PAGE_SIZE filas
+    (una query por página, no una por día).
+    El filtro por modelo se hace en el servidor (contenidos!inner + eq), así
+    el volumen leído depende solo del modelo, no de toda la agencia.
+    
+    Returns:
+        Dict por fecha local con contenidos distintos y slots ocupados.
     """
-    try:
-        fecha_inicio = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone(timedelta(hours=-5)))
-        fecha_fin = fecha_inicio + timedelta(days=1)
-        
+    today = now_tz().date()
+    fecha_inicio = datetime(today.year, today.month, today.day, tzinfo=timezone(timedelta(hours=-5)))
+    fecha_fin = fecha_inicio + timedelta(days=MAX_DAYS_AHEAD + 1)
+    
+    index: Dict[str, Dict] = {}
+    offset = 0
+    while True:
         publicaciones = supabase.table('publicaciones')\
-            .select("scheduled_time, contenidos!inner(modelo_id)")\
+            .select("id, contenido_id, scheduled_time, contenidos!inner(modelo_id)")\
             .gte('scheduled_time', fecha_inicio.isoformat())\
             .lt('scheduled_time', fecha_fin.isoformat())\
             .in_('estado', ['programada', 'procesando', 'publicado'])\
+            .eq('contenidos.modelo_id', modelo_id)\
+            .order('id')\
+            .range(offset, offset + PRECHECK_PAGE_SIZE - 1)\
             .execute()
         
-        if not publicaciones.data:
-            return []
-        
-        occupied = []
-        for pub in publicaciones.data:
-            contenido = pub.get('contenidos', {})
-            if isinstance(contenido, dict) and contenido.get('modelo_id') == modelo_id:
-                st = pub.get('scheduled_time')
-                if st:
-                    try:
-                        # Parsear ISO format a datetime
-                        if isinstance(st, str):
-                            dt_obj = datetime.fromisoformat(st.replace('Z', '+00:00'))
-                            # Convertir a timezone local
-                            if dt_obj.tzinfo is None:
-                                dt_obj = dt_obj.replace(tzinfo=timezone.utc)
-                            dt_obj = dt_obj.astimezone(timezone(timedelta(hours=-5)))
-                            occupied.append(dt_obj)
-                    except:
-                        pass
-        
-        return sorted(occupied)
-    except Exception as e:
-        logger.error(f"❌ Error obteniendo slots ocupados: {e}")
-        return []
+        filas = publicaciones.data or []
+        for pub in filas:
+            scheduled = _parse_scheduled_time(pub.get('scheduled_time'))
+            if scheduled is None:
+                continue
+            day = index.setdefault(scheduled.strftime("%Y-%m-%d"), _new_day_entry())
+            if pub.get('contenido_id'):
+                day["contenidos"].add(pub['contenido_id'])
+            day["slots"].reserve(scheduled)
+        if len(filas) < PRECHECK_PAGE_SIZE:
+            break
+        offset += PRECHECK_PAGE_SIZE
+    
+    return index
+
+
+def get_occupancy_index(modelo_id: str) -> Dict[str, Dict]:
+    """Retorna el índice de ocupación del modelo, cargándolo una vez por ciclo"""
+    if modelo_id not in _OCCUPANCY_CACHE:
+        try:
+            _OCCUPANCY_CACHE[modelo_id] = load_occupancy_index(modelo_id)
+        except Exception as e:
+            # No cachear: el siguiente contenido del modelo reintenta la carga
+            logger.error(f"❌ Error cargando índice de ocupación: {e}")
+            return {}
+    return _OCCUPANCY_CACHE[modelo_id]
+
+
+def register_occupancy(modelo_id: str, contenido_id: str, scheduled_times: List[dt.datetime]):
+    """Refleja en el índice cacheado las publicaciones recién creadas"""
+    index = _OCCUPANCY_CACHE.get(modelo_id)
+    if index is None:
+        return
+    for scheduled in scheduled_times:
+        day = index.setdefault(scheduled.strftime("%Y-%m-%d"), _new_day_entry())
+        day["contenidos"].add(contenido_id)
+        day["slots"].reserve(scheduled)
+
+
+def reset_occupancy_cache():
+    """Invalida el índice de ocupación (inicio de cada ciclo)"""
+    _OCCUPANCY_CACHE.clear()
+
+
+def reset_cycle_cache():
+    """Invalida todos los cachés del ciclo (pre-check, ocupación, cuentas y configuración)"""
+    _PUBLICACIONES_COUNT_CACHE.clear()
+    reset_occupancy_cache()
+    invalidate_cuentas_cache()
+
+
+def _distinct_contenidos_on_date(modelo_id: str, date_str: str) -> int:
+    """
+    Cuenta contenidos distintos que tienen publicaciones en una fecha.
+    Se responde desde el índice de ocupación del modelo (distinct sobre
+    contenido_id ya filtrado por modelo_id), sin queries por publicación.
+    """
+    day = get_occupancy_index(modelo_id).get(date_str)
+    return len(day["contenidos"]) if day else 0
+
+
+def _slots_on_date(modelo_id: str, date_str: str) -> SlotAllocator:
+    """
+    Obtiene los slots ocupados en una fecha para un modelo.
+    Se responde desde el índice de ocupación del modelo.
+    """
+    day = get_occupancy_index(modelo_id).get(date_str)
+    return day["slots"] if day else SlotAllocator(MIN_GAP_MINUTES)
+
+
+# ---- Cursor "primer día libre" por modelo (persiste entre ciclos) ----
+# (modelo_id, n_plataformas, hora_inicio, ventana_horas) ->
+#   {"dia": date, "ocupacion": {"YYYY-MM-DD": slots ocupados al saltar ese día}}
+# Vive solo en memoria del proceso: no sobrevive a un reinicio (el primer
+# ciclo vuelve a buscar desde hoy). Cancelaciones y fallidos los escriben
+# otros procesos, así que no hay hook de invalidación: el cursor se descarta
+# solo cuando la ocupación de un día saltado baja (ver _cursor_offset).
+_DAY_CURSOR: Dict[tuple, Dict] = {}
+
+
+def _cursor_offset(key: tuple, modelo_id: str, today: dt.date) -> int:
+    """
+    Día (offset desde hoy) desde el que empezar a buscar.
+    El cursor se invalida si algún día saltado tiene ahora menos slots
+    ocupados que cuando se saltó (cancelaciones / fallidos liberaron espacio).
+    """
+    cursor = _DAY_CURSOR.get(key)
+    if not cursor:
+        return 0
+    
+    index = get_occupancy_index(modelo_id)
+    today_str = today.strftime("%Y-%m-%d")
+    for date_str, ocupados in cursor["ocupacion"].items():
+        if date_str < today_str:
+            continue
+        day = index.get(date_str)
+        if (len(day["slots"]) if day else 0) < ocupados:
+            _DAY_CURSOR.pop(key, None)
+            return 0
+    
+    return max(0, (cursor["dia"] - today).days)
+
+
+def _advance_cursor(key: tuple, modelo_id: str, today: dt.date, first_day: dt.date):
+    """Guarda first_day como primer día con capacidad y la ocupación de los días saltados"""
+    index = get_occupancy_index(modelo_id)
+    ocupacion = {}
+    for offset in range((first_day - today).days):
+        date_str = (today + dt.timedelta(days=offset)).strftime("%Y-%m-%d")
+        day = index.get(date_str)
+        ocupacion[date_str] = len(day["slots"]) if day else 0
+    _DAY_CURSOR[key] = {"dia": first_day, "ocupacion": ocupacion}
 
 
 def calculate_scheduled_times(modelo_id: str, n_plataformas: int, hora_inicio: str, ventana_horas: int) -> List[dt.datetime]:
     """
     Calcula scheduled_times distribuidos para N plataformas.
-    Busca desde hoy hasta MAX_DAYS_AHEAD días.
+    Busca desde el cursor de primer día libre del modelo (o hoy) hasta
+    MAX_DAYS_AHEAD días usando el índice de ocupación del modelo (una query
+    por modelo y ciclo, no una por día). Con backlog profundo no se vuelven
+    a recorrer los días ya llenos.
     """
     H, M = [int(x) for x in hora_inicio.split(":")]
     tz = dt.timezone(dt.timedelta(hours=-5))
     today = now_tz().date()
+    cursor_key = (modelo_id, n_plataformas, hora_inicio, ventana_horas)
     
     # Búsqueda hasta MAX_DAYS_AHEAD
-    for day_offset in range(MAX_DAYS_AHEAD + 1):
+    for day_offset in range(_cursor_offset(cursor_key, modelo_id, today), MAX_DAYS_AHEAD + 1):
         date_obj = today + dt.timedelta(days=day_offset)
         date_str = date_obj.strftime("%Y-%m-%d")
         
-        # Capacidad por día (3 videos distintos)
-        if _distinct_contenidos_on_date(modelo_id, date_str) >= 3:
+        # Capacidad por día (MAX_CONTENIDOS_POR_DIA videos distintos)
+        if _distinct_contenidos_on_date(modelo_id, date_str) >= MAX_CONTENIDOS_POR_DIA:
             continue
         
         start = dt.datetime(date_obj.year, date_obj.month, date_obj.day, H, M, 0, tzinfo=tz)
@@ -329,43 +479,52 @@ def calculate_scheduled_times(modelo_id: str, n_plataformas: int, hora_inicio: s
                 # la ventana de hoy ya pasó
                 continue
         
-        occupied = _occupied_on_date(modelo_id, date_str)
-        times = _build_slots_for_day(n_plataformas, start, ventana_horas, occupied)
+        slots = _slots_on_date(modelo_id, date_str)
+        times = slots.find_n_slots(start, end, n_plataformas, not_before=now_tz())
         
         if len(times) == n_plataformas:
-            # Éxito: retornar times
+            # Éxito: el cursor queda en este día (puede tener más capacidad)
+            _advance_cursor(cursor_key, modelo_id, today, date_obj)
             return times
     
-    # No se encontró espacio
+    # No se encontró espacio: el cursor queda tras la ventana
+    _advance_cursor(cursor_key, modelo_id, today, today + dt.timedelta(days=MAX_DAYS_AHEAD + 1))
     raise ValueError("sin_espacio")
 
 
+def build_publicaciones_rows(contenido: Dict, cuentas: List[Dict], scheduled_times: List[dt.datetime]) -> List[Dict]:
+    """Construye las filas de publicaciones (una por cuenta) para un contenido"""
+    caption = contenido.get('caption_generado', '') or ''
+    tags = contenido.get('tags_generados', []) or []
+    
+    return [
+        {
+            "contenido_id": contenido['id'],
+            "cuenta_plataforma_id": cuenta['id'],
+            "scheduled_time": scheduled_time.isoformat(),
+            "caption_usado": caption,
+            "tags_usados": tags if isinstance(tags, list) else [],
+            "estado": "programada",
+            "intentos": 0
+        }
+        for cuenta, scheduled_time in zip(cuentas, scheduled_times)
+    ]
+
+
 def create_publicaciones(contenido: Dict, cuentas: List[Dict], scheduled_times: List[dt.datetime]) -> bool:
     """
     Crea publicaciones para un contenido.
+    Un solo INSERT con todas las filas: un round-trip y todo o nada.
     Retorna True si todas se crean exitosamente.
     """
-    contenido_id = contenido['id']
-    caption = contenido.get('caption_generado', '') or ''
-    tags = contenido.get('tags_generados', []) or []
-    
     if len(cuentas) != len(scheduled_times):
         logger.error(f"❌ Mismatch: {len(cuentas)} cuentas vs {len(scheduled_times)} scheduled_times")
         return False
     
     try:
+        rows = build_publicaciones_rows(contenido, cuentas, scheduled_times)
+        supabase.table('publicaciones').insert(rows).execute()
         for cuenta, scheduled_time in zip(cuentas, scheduled_times):
-            data = {
-                "contenido_id": contenido_id,
-                "cuenta_plataforma_id": cuenta['id'],
-                "scheduled_time": scheduled_time.isoformat(),
-                "caption_usado": caption,
-                "tags_usados": tags if isinstance(tags, list) else [],
-                "estado": "programada",
-                "intentos": 0
-            }
-            
-            supabase.table('publicaciones').insert(data).execute()
             logger.info(f"   ✅ Publicación creada: {cuenta['plataforma_nombre']} @ {fmt_dt_local(scheduled_time)}")
         
         return True
@@ -376,6 +535,50 @@ def create_publicaciones(contenido: Dict, cuentas: List[Dict], scheduled_times:
         return False
 
 
+# RPC transaccional (Migracion/scripts/rpc_programar_contenido.sql).
+# Si no está instalada en la BD se usa el fallback insert + update.
+_RPC_PROGRAMAR_DISPONIBLE = True
+
+
+def programar_contenido(contenido: Dict, cuentas: List[Dict], scheduled_times: List[dt.datetime], estado: str = 'aprobado') -> bool:
+    """
+    Crea las publicaciones del contenido y lo marca con `estado` en una sola
+    llamada transaccional (RPC programar_contenido).
+    
+    Fallback si la RPC no existe: bulk insert + update_contenido_estado.
+    
+    Returns:
+        True si las publicaciones quedaron creadas y el contenido actualizado
+    """
+    global _RPC_PROGRAMAR_DISPONIBLE
+    
+    if len(cuentas) != len(scheduled_times):
+        logger.error(f"❌ Mismatch: {len(cuentas)} cuentas vs {len(scheduled_times)} scheduled_times")
+        return False
+    
+    if _RPC_PROGRAMAR_DISPONIBLE:
+        try:
+            supabase.rpc('programar_contenido', {
+                "p_contenido_id": contenido['id'],
+                "p_publicaciones": build_publicaciones_rows(contenido, cuentas, scheduled_times),
+                "p_estado": estado
+            }).execute()
+            for cuenta, scheduled_time in zip(cuentas, scheduled_times):
+                logger.info(f"   ✅ Publicación creada: {cuenta['plataforma_nombre']} @ {fmt_dt_local(scheduled_time)}")
+            return True
+        except Exception as e:
+            # PGRST202: la función no existe en el schema cache
+            if getattr(e, 'code', None) != 'PGRST202':
+                logger.error(f"❌ Error programando contenido (RPC): {e}")
+                return False
+            logger.warning("⚠️  RPC programar_contenido no instalada, usando insert + update")
+            _RPC_PROGRAMAR_DISPONIBLE = False
+    
+    if not create_publicaciones(contenido, cuentas, scheduled_times):
+        return False
+    return update_contenido_estado(contenido['id'], estado)
+
+
 def update_contenido_estado(contenido_id: str, estado: str) -> bool:
     """Actualiza el estado de un contenido"""
     try:
@@ -397,8 +600,8 @@ def process_contenido(contenido: Dict) -> bool:
     3. Obtiene configuración
     4. Obtiene cuentas
     5. Calcula scheduled_times
-    6. Crea publicaciones
-    7. Marca contenido como 'aprobado'
+    6. Crea publicaciones y
+    7. Marca contenido como 'aprobado' (misma llamada transaccional)
     
     Retorna True si se procesó exitosamente
     """
@@ -425,15 +628,15 @@ def process_contenido(contenido: Dict) -> bool:
     
     modelo_id = modelo.get('id')
     modelo_nombre = modelo.get('nombre', 'N/A')
-    config = modelo.get('configuracion_distribucion', {})
+    config = get_modelo_config(modelo)
     
-    if not isinstance(config, dict):
+    if config is None:
         logger.error(f"   ❌ Configuración inválida")
         return False
     
-    plataformas = config.get('plataformas', [])
-    hora_inicio = config.get('hora_inicio', '12:00')
-    ventana_horas = config.get('ventana_horas', 5)
+    plataformas = config['plataformas']
+    hora_inicio = config['hora_inicio']
+    ventana_horas = config['ventana_horas']
     
     if not plataformas or not isinstance(plataformas, list):
         logger.warning(f"   ⚠️  Modelo '{modelo_nombre}' no tiene plataformas configuradas")
@@ -466,53 +669,140 @@ def process_contenido(contenido: Dict) -> bool:
         traceback.print_exc()
         return False
     
-    # 6. Crear publicaciones
-    if not create_publicaciones(contenido, cuentas, scheduled_times):
-        logger.error(f"   ❌ Error creando publicaciones")
+    # 6-7. Crear publicaciones y marcar contenido como 'aprobado' (todo o nada)
+    if not programar_contenido(contenido, cuentas, scheduled_times, 'aprobado'):
+        logger.error(f"   ❌ Error creando publicaciones / actualizando estado del contenido")
         return False
     
-    # 7. Marcar contenido como 'aprobado' (solo si todo fue exitoso)
-    if update_contenido_estado(contenido_id, 'aprobado'):
-        logger.info(f"   ✅ Contenido marcado como 'aprobado'")
-        return True
+    register_occupancy(modelo_id, contenido_id, scheduled_times)
+    register_publicaciones_count(contenido_id, len(scheduled_times))
+    logger.info(f"   ✅ Contenido marcado como 'aprobado'")
+    return True
+
+
+def _modelo_id_of(contenido: Dict) -> Optional[str]:
+    """modelo_id de un contenido (relación embebida o columna)"""
+    modelo = contenido.get('modelos')
+    if isinstance(modelo, dict) and modelo.get('id'):
+        return modelo['id']
+    return contenido.get('modelo_id')
+
+
+def group_by_modelo(contenidos: List[Dict]) -> Dict[Optional[str], List[Dict]]:
+    """Agrupa contenidos por modelo conservando el orden de llegada"""
+    grupos: Dict[Optional[str], List[Dict]] = {}
+    for contenido in contenidos:
+        grupos.setdefault(_modelo_id_of(contenido), []).append(contenido)
+    return grupos
+
+
+def process_modelo_group(contenidos: List[Dict]) -> Tuple[int, int]:
+    """
+    Procesa en serie los contenidos de UN modelo (la asignación de slots
+    del modelo debe ser consistente). Un error en un contenido no detiene
+    al resto del grupo.
+    
+    Returns:
+        (procesados, saltados)
+    """
+    procesados = 0
+    saltados = 0
+    for contenido in contenidos:
+        try:
+            ok = process_contenido(contenido)
+        except Exception as e:
+            logger.error(f"❌ Error procesando contenido {contenido.get('id')}: {e}")
+            ok = False
+        if ok:
+            procesados += 1
+        else:
+            saltados += 1
+    return procesados, saltados
+
+
+def process_contenidos(contenidos: List[Dict]) -> Tuple[int, int]:
+    """
+    Procesa los contenidos pendientes agrupados por modelo.
+    Los grupos corren en paralelo (hasta SCHEDULER_MAX_WORKERS hilos); dentro
+    de un grupo los contenidos van en serie. Un modelo lento o sin espacio
+    no retrasa a los demás.
+    
+    Returns:
+        (procesados, saltados)
+    """
+    grupos = group_by_modelo(contenidos)
+    workers = min(SCHEDULER_MAX_WORKERS, len(grupos))
+    
+    if workers <= 1:
+        resultados = [process_modelo_group(grupo) for grupo in grupos.values()]
     else:
-        logger.error(f"   ❌ Error actualizando estado del contenido")
-        return False
+        resultados = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler") as pool:
+            futures = {pool.submit(process_modelo_group, grupo): modelo_id for modelo_id, grupo in grupos.items()}
+            for future in as_completed(futures):
+                try:
+                    resultados.append(future.result())
+                except Exception as e:
+                    # Aislamiento: el fallo de un modelo no afecta a los demás
+                    logger.error(f"❌ Error procesando modelo {futures[future]}: {e}")
+                    resultados.append((0, len(grupos[futures[future]])))
+    
+    return sum(r[0] for r in resultados), sum(r[1] for r in resultados)
+
+
+def run_cycle() -> Tuple[int, int]:
+    """
+    Ejecuta un ciclo completo del scheduler: recarga cachés, lee contenidos
+    pendientes y los programa.
+    
+    Returns:
+        (procesados, saltados)
+    """
+    # Nuevo ciclo: ocupación, cuentas y configuración se recargan desde la BD
+    reset_cycle_cache()
+    
+    # Obtener contenidos pendientes
+    contenidos = get_pending_contenidos()
+    
+    if not contenidos:
+        logger.info("💤 No hay contenidos pendientes. Esperando...")
+        return 0, 0
+    
+    logger.info(f"\n📬 {len(contenidos)} contenido(s) pendiente(s) encontrado(s)")
+    prefetch_cycle_cache(contenidos)
+    
+    procesados, saltados = process_contenidos(contenidos)
+    
+    logger.info(f"\n📊 Resumen: {procesados} procesados, {saltados} saltados")
+    return procesados, saltados
 
 
 def main():
     """
     Loop principal del scheduler.
     Lee contenidos y crea publicaciones.
+    Despierta al recibir aviso del bot (canal 'scheduler'); el poll con
+    backoff adaptativo queda como fallback.
     """
     logger.info("🚀 Iniciando Scheduler PRD")
     logger.info("=" * 60)
     
+    listener = WakeupListener('scheduler')
+    backoff = AdaptiveBackoff()
+    
     while True:
         try:
-            # Obtener contenidos pendientes
-            contenidos = get_pending_contenidos()
+            procesados, _ = run_cycle()
+            if procesados:
+                backoff.reset()
+                notify('poster')
             
-            if contenidos:
-                logger.info(f"\n📬 {len(contenidos)} contenido(s) pendiente(s) encontrado(s)")
-                
-                procesados = 0
-                saltados = 0
-                
-                for contenido in contenidos:
-                    if process_contenido(contenido):
-                        procesados += 1
-                    else:
-                        saltados += 1
-                
-                logger.info(f"\n📊 Resumen: {procesados} procesados, {saltados} saltados")
-            else:
-                logger.info("💤 No hay contenidos pendientes. Esperando...")
-            
-            # Esperar antes de la siguiente iteración
-            logger.info(f"\n💤 Esperando 60 segundos...")
-            import time
-            time.sleep(60)
+            # Esperar antes de la siguiente iteración (o hasta recibir aviso)
+            delay = backoff.next()
+            logger.info(f"\n💤 Esperando hasta {delay:.0f} segundos...")
+            if listener.wait(delay):
+                logger.info("🔔 Aviso recibido: nuevo contenido")
+                backoff.reset()
             
         except KeyboardInterrupt:
             logger.info("\n🛑 Deteniendo scheduler...")
@@ -522,12 +812,10 @@ def main():
             import traceback
             traceback.print_exc()
             logger.info("💤 Reintentando en 60 segundos...")
-            import time
             time.sleep(60)
+    
+    listener.close()
 
 
 if __name__ == "__main__":
     main()
-
-
-
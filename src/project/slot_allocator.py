@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Slot Allocator - Asignación de horarios de publicación
+Mantiene los slots ocupados de un día en una lista ordenada (bisect) y
+encuentra N slots libres con gap mínimo, con las mismas reglas de colocación
+que el scheduler: cerca del inicio, cerca del fin, midpoints y relleno hacia
+adelante en pasos de gap.
+"""
+
+import bisect
+import random
+import datetime as dt
+from typing import Iterable, List, Optional
+
+# Contenidos distintos de una modelo por día (scheduler y reintentos del poster)
+MAX_CONTENIDOS_POR_DIA = 3
+
+
+class SlotAllocator:
+    """
+    Slots ocupados de un día, ordenados.
+    Verificar el gap de un candidato cuesta O(log n): solo se comparan los
+    vecinos inmediatos en la lista ordenada.
+    """
+
+    def __init__(self, gap_minutes: int, occupied: Iterable[dt.datetime] = ()):
+        self.gap = dt.timedelta(minutes=gap_minutes)
+        self._slots: List[dt.datetime] = sorted(occupied)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def slots(self) -> List[dt.datetime]:
+        """Slots ocupados en orden cronológico"""
+        return list(self._slots)
+
+    def is_free(self, candidate: dt.datetime) -> bool:
+        """True si candidate está a ≥ gap de todos los slots ocupados"""
+        i = bisect.bisect_left(self._slots, candidate)
+        if i < len(self._slots) and self._slots[i] - candidate < self.gap:
+            return False
+        if i > 0 and candidate - self._slots[i - 1] < self.gap:
+            return False
+        return True
+
+    def reserve(self, slot: dt.datetime):
+        """Marca un slot como ocupado"""
+        bisect.insort(self._slots, slot)
+
+    def release(self, slot: dt.datetime) -> bool:
+        """Libera un slot ocupado. Retorna False si no estaba reservado"""
+        i = bisect.bisect_left(self._slots, slot)
+        if i < len(self._slots) and self._slots[i] == slot:
+            del self._slots[i]
+            return True
+        return False
+
+    def find_n_slots(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        n: int,
+        not_before: Optional[dt.datetime] = None,
+        rng=random
+    ) -> List[dt.datetime]:
+        """
+        Busca hasta N slots libres en la ventana [start, end].
+        No modifica los slots ocupados: el caller decide si los reserva.
+
+        Reglas (heredadas de _build_slots_for_day):
+        1. Primer slot cerca de inicio (jitter 0-5 min)
+        2. Segundo slot cerca de fin (jitter 0-5 min)
+        3. Midpoint entre 1 y 2
+        4. Midpoints entre ocupados + propuestos separados ≥ 2×gap
+        5. Relleno hacia adelante en pasos de gap
+
+        Returns:
+            Slots ordenados (puede haber menos de N si no caben)
+        """
+        proposals: List[dt.datetime] = []
+
+        def try_add(candidate: dt.datetime) -> bool:
+            if start <= candidate <= end and self.is_free(candidate) \
+                    and (not_before is None or candidate >= not_before):
+                self.reserve(candidate)
+                proposals.append(candidate)
+                return True
+            return False
+
+        try:
+            # 1) Primer slot cerca de inicio
+            if n >= 1:
+                jitter = dt.timedelta(minutes=rng.randint(0, 5))
+                try_add((start + jitter).replace(second=0, microsecond=0))
+
+            # 2) Segundo slot cerca de fin
+            if n >= 2:
+                jitter = dt.timedelta(minutes=rng.randint(0, 5))
+                try_add((end - jitter).replace(second=0, microsecond=0))
+
+            # 3) Midpoint entre 1 y 2
+            if n >= 3 and len(proposals) >= 2:
+                a, b = min(proposals), max(proposals)
+                try_add((a + (b - a) / 2).replace(second=0, microsecond=0))
+
+            # 4) Midpoints válidos entre ocupados + propuestos (≥ 2×gap)
+            while len(proposals) < n and self._midpoints_fill(n, proposals, try_add) > 0:
+                pass
+
+            # 5) Relleno hacia adelante en pasos de gap
+            t = start
+            while len(proposals) < n:
+                t = t.replace(second=0, microsecond=0)
+                try_add(t)
+                t += self.gap
+                if t > end:
+                    break
+        finally:
+            for slot in proposals:
+                self.release(slot)
+
+        return sorted(proposals)[:n]
+
+    def _midpoints_fill(self, n: int, proposals: List[dt.datetime], try_add) -> int:
+        """Una pasada de midpoints sobre el timeline actual. Retorna cuántos agregó"""
+        timeline = list(self._slots)
+        made = 0
+        for a, b in zip(timeline, timeline[1:]):
+            if (b - a) >= 2 * self.gap:
+                if try_add((a + (b - a) / 2).replace(second=0, microsecond=0)):
+                    made += 1
+                    if len(proposals) >= n:
+                        break
+        return made
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Staging - Preparación anticipada de publicaciones del poster
+Las publicaciones que vencen dentro de LOOKAHEAD_SECONDS se preparan antes
+de su horario, en segundo plano:
+
+1. Preflight (preflight.py): lo que fallaría se avisa ya; se falla al vencer
+   (la sesión o el archivo pueden arreglarse mientras tanto)
+2. Video a page cache: posix_fadvise(WILLNEED) o lectura por bloques
+3. Contexto del navegador de la cuenta cargado en el worker host
+
+Así el upload arranca en su horario sin el costo de arranque en frío.
+Cada publicación se prepara una vez por scheduled_time.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from preflight import BASE_DIR, auth_path, check_batch
+from worker_client import warm_context
+
+LOOKAHEAD_SECONDS = int(os.getenv("POSTER_LOOKAHEAD_SECONDS", "600"))
+STAGING_WORKERS = 2
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+STAGED_MAX_ENTRIES = 4096
+
+# publicacion_id -> scheduled_time ya preparado (solo lo toca el loop del poster)
+_STAGED: Dict[str, str] = {}
+_executor = ThreadPoolExecutor(max_workers=STAGING_WORKERS, thread_name_prefix="staging")
+
+
+def prefetch_file(path: Path):
+    """Pide al kernel que cargue el archivo en page cache"""
+    try:
+        with open(path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            else:
+                # Sin fadvise (macOS): leer y descartar, queda en caché igual
+                while f.read(READ_CHUNK_BYTES):
+                    pass
+    except OSError as e:
+        print(f"⚠️  Prefetch de {path} falló: {e}")
+
+
+def _stage_one(publicacion: Dict):
+    contenido = publicacion.get('contenidos') or {}
+    modelo_nombre = (contenido.get('modelos') or {}).get('nombre', '')
+    plataforma = (publicacion.get('cuentas_plataforma') or {}).get('plataformas') or {}
+
+    prefetch_file(BASE_DIR / contenido['archivo_path'])
+    storage_state = auth_path(modelo_nombre, plataforma.get('nombre', ''))
+    if storage_state:
+        warm_context(storage_state)
+
+
+def stage_publicaciones(publicaciones: List[Dict]) -> int:
+    """
+    Prepara en segundo plano las publicaciones próximas aún no preparadas.
+    Retorna cuántas encaminó.
+    """
+    nuevas = [pub for pub in publicaciones if _STAGED.get(pub['id']) != pub.get('scheduled_time')]
+    if not nuevas:
+        return 0
+
+    if len(_STAGED) >= STAGED_MAX_ENTRIES:
+        _STAGED.clear()
+    for pub in nuevas:
+        _STAGED[pub['id']] = pub.get('scheduled_time')
+
+    validas, invalidas = check_batch(nuevas)
+    now = datetime.now(timezone.utc)
+    for pub, error_class, error_msg in invalidas:
+        scheduled = datetime.fromisoformat(pub['scheduled_time'].replace('Z', '+00:00'))
+        minutos = max(0, (scheduled - now).total_seconds() / 60)
+        print(f"⚠️  Publicación {pub['id']} (en {minutos:.0f} min) fallará si no se corrige [{error_class}]: {error_msg}")
+
+    for pub in validas:
+        _executor.submit(_stage_one, pub)
+    if validas:
+        print(f"🧰 {len(validas)} publicación(es) próximas en preparación")
+    return len(validas)
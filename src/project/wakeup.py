@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Wakeup - Avisos locales entre procesos (bot → scheduler → poster)
+Cada proceso que espera escucha un socket Unix datagram por canal
+("scheduler", "poster"). Quien produce trabajo llama notify(canal) y el
+proceso despierta al instante en lugar de esperar el siguiente poll.
+
+Cada proceso oyente tiene su propio socket (<canal>.<pid>.sock) y notify
+avisa a todos los del canal: varias instancias del poster despiertan a la
+vez y ninguna borra el socket de otra.
+
+El poll sigue siendo el fallback: si el aviso se pierde (proceso caído,
+sistema sin AF_UNIX) el loop despierta igual al vencer la espera.
+
+main.py arranca el bot y el poster, no scheduler_prd.py: el canal
+"scheduler" solo tiene oyente si el scheduler se ejecuta por separado.
+"""
+
+import os
+import time
+import select
+import socket
+import logging
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+WAKEUP_DIR = Path(os.getenv("WAKEUP_DIR", str(Path(tempfile.gettempdir()) / "100trafico")))
+
+# Espera entre polls: mínima con trabajo, crece ×2 en ciclos ociosos hasta la máxima
+POLL_MIN_SECONDS = float(os.getenv("POLL_MIN_SECONDS", "10"))
+POLL_MAX_SECONDS = float(os.getenv("POLL_MAX_SECONDS", "300"))
+
+
+def socket_path(canal: str, pid: Optional[int] = None) -> Path:
+    """Ruta del socket de un canal para el proceso `pid` (por defecto, el actual)"""
+    return WAKEUP_DIR / f"{canal}.{os.getpid() if pid is None else pid}.sock"
+
+
+def _send(path: Path) -> bool:
+    """
+    Envía un aviso a un socket. Un socket sin proceso detrás (ECONNREFUSED)
+    es huérfano de un proceso que murió sin close(): se borra.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(b"1", str(path))
+        return True
+    except BlockingIOError:
+        # Cola del oyente llena: ya tiene avisos pendientes
+        return True
+    except ConnectionRefusedError:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        return False
+    except OSError:
+        return False
+
+
+def notify(canal: str) -> bool:
+    """
+    Despierta a los procesos que escuchan `canal`.
+    Best effort: retorna False si nadie escucha (nunca lanza excepción).
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    try:
+        paths = list(WAKEUP_DIR.glob(f"{canal}.*.sock"))
+    except OSError:
+        return False
+    # Sin cortocircuito: todos los oyentes reciben el aviso
+    return any([_send(path) for path in paths])
+
+
+def _socket_huerfano(path: Path) -> bool:
+    """True si `path` existe pero ningún proceso está escuchando en él"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(str(path))
+        return False
+    except ConnectionRefusedError:
+        return True
+    except OSError:
+        return False
+
+
+class WakeupListener:
+    """Socket de aviso de un canal; wait() reemplaza a time.sleep()"""
+
+    def __init__(self, canal: str):
+        self.path = socket_path(canal)
+        self.sock = None
+
+        if not hasattr(socket, "AF_UNIX"):
+            return
+        try:
+            WAKEUP_DIR.mkdir(parents=True, exist_ok=True)
+            # Mismo pid que un proceso anterior que murió sin close(). Si el
+            # socket sigue vivo (otro oyente de este proceso) bind falla y
+            # este oyente queda solo con polling.
+            if self.path.exists() and _socket_huerfano(self.path):
+                self.path.unlink()
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.bind(str(self.path))
+            self.sock.setblocking(False)
+        except OSError as e:
+            logger.warning(f"⚠️  Canal de aviso '{canal}' no disponible, solo polling: {e}")
+            if self.sock is not None:
+                self.sock.close()
+            self.sock = None
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Espera hasta `timeout` segundos o hasta recibir un aviso.
+        Retorna True si despertó por aviso.
+        """
+        if self.sock is None:
+            time.sleep(timeout)
+            return False
+
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return False
+
+        # Varios avisos seguidos cuentan como uno
+        while True:
+            try:
+                self.sock.recv(64)
+            except (BlockingIOError, InterruptedError):
+                break
+        return True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+class AdaptiveBackoff:
+    """Espera entre polls: reset() al haber trabajo, next() la duplica en ciclos ociosos"""
+
+    def __init__(self, min_seconds: float = POLL_MIN_SECONDS, max_seconds: float = POLL_MAX_SECONDS):
+        self.min_seconds = min_seconds
+        self.max_seconds = max(min_seconds, max_seconds)
+        self.current = min_seconds
+
+    def reset(self):
+        self.current = self.min_seconds
+
+    def next(self) -> float:
+        delay = self.current
+        self.current = min(self.current * 2, self.max_seconds)
+        return delay
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Worker Client - Ejecución de workers de Playwright para el poster
+Envía cada job al worker host persistente (workers/host/worker_host.js)
+por socket Unix: navegador ya abierto y sesión de la cuenta ya cargada.
+Si el host no está corriendo (o no soporta el worker) se ejecuta
+`npx playwright test <worker>` como antes.
+
+En ambos caminos la salida se consume en streaming, línea a línea. Las
+líneas JSON con clave "event" (workers/lib/events.js) son el protocolo:
+progress / result / error. Del resto solo se guardan las últimas líneas
+para el mensaje de error. Los workers sin eventos (p. ej. los generados
+desde el admin panel) se siguen juzgando por el exit code.
+
+Los eventos 'stage' indican hasta dónde llegó el upload: el poster solo
+reintenta fallos en los que el video seguro no llegó a la plataforma.
+"""
+
+import os
+import json
+import time
+import signal
+import socket
+import logging
+import threading
+import subprocess
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, Optional
+
+from wakeup import WAKEUP_DIR
+
+logger = logging.getLogger(__name__)
+
+WORKER_HOST_SOCKET = Path(os.getenv("WORKER_HOST_SOCKET", str(WAKEUP_DIR / "worker_host.sock")))
+WORKER_TIMEOUT_SECONDS = 300
+CONNECT_TIMEOUT_SECONDS = 2
+WARM_TIMEOUT_SECONDS = 60
+
+# Líneas de log retenidas para el mensaje de error
+TAIL_LINES = 40
+# Tras un evento de error, margen para que el worker termine por su cuenta
+ERROR_GRACE_SECONDS = 5
+
+
+class WorkerHostUnavailable(Exception):
+    """El host no está disponible para este job: usar el subprocess"""
+
+
+@dataclass
+class WorkerResult:
+    """Resultado de un job de worker"""
+    success: bool
+    url: Optional[str] = None
+    external_id: Optional[str] = None
+    error: Optional[str] = None
+    error_class: Optional[str] = None
+    # Etapa del upload al terminar (pre_upload | upload | uploaded), None si el worker no la informa
+    stage: Optional[str] = None
+    via: str = "subprocess"
+    duration_seconds: float = 0.0
+    tail: Deque[str] = field(default_factory=lambda: deque(maxlen=TAIL_LINES))
+
+
+class WorkerEventStream:
+    """
+    Consume la salida de un worker línea a línea.
+    on_event recibe cada evento estructurado (dict) en cuanto llega.
+    """
+
+    def __init__(self, on_event: Optional[Callable[[Dict], None]] = None):
+        self.on_event = on_event
+        self.result_event: Optional[Dict] = None
+        self.error_event: Optional[Dict] = None
+        self.stage: Optional[str] = None
+        self.tail: Deque[str] = deque(maxlen=TAIL_LINES)
+
+    def feed(self, line: str):
+        line = line.rstrip('\n')
+        start = line.find('{"event"')
+        if start >= 0:
+            try:
+                event = json.loads(line[start:])
+            except ValueError:
+                event = None
+            if isinstance(event, dict):
+                if event.get('event') == 'result':
+                    self.result_event = event
+                elif event.get('event') == 'error':
+                    self.error_event = event
+                if event.get('stage'):
+                    self.stage = event['stage']
+                if self.on_event:
+                    try:
+                        self.on_event(event)
+                    except Exception as e:
+                        logger.warning(f"⚠️  Error en callback de evento: {e}")
+                return
+        if line.strip():
+            self.tail.append(line)
+
+    def build_result(self, exit_ok: bool, via: str, started: float) -> WorkerResult:
+        """Resultado final: el evento 'result' manda; sin eventos, el exit code"""
+        result = WorkerResult(success=False, stage=self.stage, via=via,
+                              duration_seconds=time.monotonic() - started, tail=self.tail)
+
+        # Un 'result' exitoso significa que la plataforma ya aceptó el video:
+        # cuenta como publicado aunque el worker falle después (no re-subir)
+        if self.result_event is not None:
+            result.success = bool(self.result_event.get('success'))
+            result.url = self.result_event.get('url') or None
+            result.external_id = self.result_event.get('external_id')
+        elif self.error_event is None:
+            result.success = exit_ok
+
+        if not result.success:
+            if self.error_event is not None:
+                result.error = self.error_event.get('message')
+                result.error_class = self.error_event.get('error_class', 'unknown')
+            else:
+                result.error = "\n".join(list(self.tail)[-10:]) or "Error desconocido"
+                result.error_class = 'unknown'
+        return result
+
+
+def run_worker(
+    script: Path,
+    job_env: Dict[str, str],
+    cwd: Path,
+    timeout: int = WORKER_TIMEOUT_SECONDS,
+    on_event: Optional[Callable[[Dict], None]] = None
+) -> WorkerResult:
+    """
+    Ejecuta un worker: primero en el host persistente, si no, como subprocess.
+
+    Args:
+        script: Ruta del worker (workers/<plataforma>.js)
+        job_env: Variables del job (MODEL_NAME, VIDEO_PATH, VIDEO_TITLE, VIDEO_TAGS)
+        cwd: Directorio base del proyecto (para npx)
+        on_event: Callback por evento (progress/result/error) en vivo
+    """
+    try:
+        return run_via_host(script, job_env, timeout, on_event)
+    except WorkerHostUnavailable as e:
+        logger.info(f"ℹ️  Worker host no disponible ({e}), usando npx playwright test")
+    return run_via_subprocess(script, job_env, cwd, timeout, on_event)
+
+
+def run_via_subprocess(
+    script: Path,
+    job_env: Dict[str, str],
+    cwd: Path,
+    timeout: int = WORKER_TIMEOUT_SECONDS,
+    on_event: Optional[Callable[[Dict], None]] = None
+) -> WorkerResult:
+    """`npx playwright test <worker>` leyendo stdout+stderr en streaming"""
+    started = time.monotonic()
+    stream = WorkerEventStream(on_event)
+    env = os.environ.copy()
+    env.update(job_env)
+
+    proc = subprocess.Popen(
+        ["npx", "playwright", "test", str(script)],
+        env=env, cwd=str(cwd), text=True, bufsize=1,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        start_new_session=True  # npx → node → chromium: matar el grupo completo
+    )
+
+    # Watchdog: mata el worker al vencer el timeout o poco después de un error
+    deadline = [started + timeout]
+    timed_out = threading.Event()
+
+    def watchdog():
+        while proc.poll() is None:
+            if time.monotonic() >= deadline[0]:
+                timed_out.set()
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except (OSError, AttributeError):
+                    proc.kill()
+                return
+            time.sleep(0.5)
+
+    threading.Thread(target=watchdog, daemon=True).start()
+
+    for line in proc.stdout:
+        stream.feed(line)
+        if stream.error_event is not None:
+            deadline[0] = min(deadline[0], time.monotonic() + ERROR_GRACE_SECONDS)
+    proc.wait()
+
+    result = stream.build_result(proc.returncode == 0, "subprocess", started)
+    if timed_out.is_set() and not result.success and stream.error_event is None:
+        result.error = f"Worker timeout (más de {timeout // 60} minutos)"
+        result.error_class = 'timeout'
+    return result
+
+
+def run_via_host(
+    script: Path,
+    job_env: Dict[str, str],
+    timeout: int = WORKER_TIMEOUT_SECONDS,
+    on_event: Optional[Callable[[Dict], None]] = None
+) -> WorkerResult:
+    """
+    Envía el job al worker host y consume sus eventos en streaming.
+    Lanza WorkerHostUnavailable solo si el job no llegó a ejecutarse.
+    """
+    if not hasattr(socket, "AF_UNIX") or not WORKER_HOST_SOCKET.exists():
+        raise WorkerHostUnavailable("socket inexistente")
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+    try:
+        sock.connect(str(WORKER_HOST_SOCKET))
+    except OSError as e:
+        sock.close()
+        raise WorkerHostUnavailable(str(e))
+
+    started = time.monotonic()
+    stream = WorkerEventStream(on_event)
+    host_result = None
+    timed_out = False
+    with sock:
+        # Margen sobre el timeout del host, que corta el job por su cuenta
+        sock.settimeout(timeout + 30)
+        request = {"type": "run", "script": str(script), "env": job_env, "timeout_ms": timeout * 1000}
+        sock.sendall(json.dumps(request).encode('utf-8') + b"\n")
+
+        try:
+            for message in _host_messages(sock.makefile('r', encoding='utf-8')):
+                if message.get('type') == 'log':
+                    stream.feed(message.get('line', ''))
+                elif message.get('type') == 'result':
+                    host_result = message
+        except socket.timeout:
+            timed_out = True
+
+    if host_result is not None and host_result.get('unsupported'):
+        raise WorkerHostUnavailable(host_result.get('error', 'worker no soportado'))
+
+    if host_result is None and not timed_out:
+        stream.tail.append("Worker host desconectado antes de terminar el job")
+    elif host_result is not None and not host_result.get('ok') and stream.error_event is None:
+        stream.tail.append(host_result.get('error', 'Error desconocido'))
+
+    result = stream.build_result(bool(host_result and host_result.get('ok')), "host", started)
+    if not result.success and (timed_out or (host_result and host_result.get('timeout'))):
+        result.error = f"Worker timeout (más de {timeout // 60} minutos)"
+        result.error_class = 'timeout'
+    return result
+
+
+def warm_context(storage_state: Path) -> bool:
+    """
+    Pide al host que cargue la sesión de una cuenta (lookahead del poster)
+    para que el job que llegue después encuentre el contexto caliente.
+    Retorna False si el host no está o no pudo cargarla.
+    """
+    if not hasattr(socket, "AF_UNIX") or not WORKER_HOST_SOCKET.exists():
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+            sock.connect(str(WORKER_HOST_SOCKET))
+            sock.settimeout(WARM_TIMEOUT_SECONDS)
+            sock.sendall(json.dumps({"type": "warm", "storage_state": str(storage_state)}).encode('utf-8') + b"\n")
+            for message in _host_messages(sock.makefile('r', encoding='utf-8')):
+                if message.get('type') == 'warmed':
+                    if not message.get('ok'):
+                        logger.warning(f"⚠️  Worker host no pudo cargar {storage_state}: {message.get('error')}")
+                    return bool(message.get('ok'))
+    except OSError as e:
+        logger.info(f"ℹ️  Warm-up de {storage_state} no realizado: {e}")
+    return False
+
+
+def _host_messages(lines: Iterable[str]):
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
@@ -0,0 +1,14 @@
+"""
+Configuración común de los tests unitarios (python -m pytest desde la raíz).
+
+Los módulos de src/project crean el cliente de Supabase al importarse: se
+definen credenciales falsas antes de cualquier import y cada test que habla
+con la BD sustituye `modulo.supabase` por Migracion/scripts/fake_supabase.py.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_ANON_KEY", "fake.fake.fake")
+os.environ.setdefault("WAKEUP_DIR", tempfile.mkdtemp(prefix="wakeup_"))
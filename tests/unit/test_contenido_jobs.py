@@ -0,0 +1,146 @@
+"""Registro idempotente de contenidos y cola de jobs: persistencia y replay"""
+
+import asyncio
+import json
+from dataclasses import asdict
+
+import pytest
+
+from database import contenidos_prd
+from fake_supabase import FakeSupabase
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(contenidos_prd, 'supabase', fake)
+    monkeypatch.setattr(contenidos_prd, '_HASH_DISPONIBLE', True)
+    monkeypatch.setattr(contenidos_prd, '_notify_scheduler', lambda: None)
+    fake.seed('modelos', [{'id': 'm1', 'nombre': 'ana'}])
+    return fake
+
+
+def test_registrar_contenido_es_idempotente_por_archivo(fake):
+    primero = contenidos_prd.registrar_contenido('ana', 'modelos/ana/a.mp4', content_hash='h1')
+    assert primero['creado'] is True
+
+    # Reproceso del mismo job tras un reinicio
+    repetido = contenidos_prd.registrar_contenido('ana', 'modelos/ana/a.mp4', content_hash='h1')
+    assert repetido == {**primero, 'creado': False}
+    assert len(fake.tables['contenidos']) == 1
+
+
+def test_registrar_contenido_detecta_el_mismo_video_con_otro_archivo(fake):
+    primero = contenidos_prd.registrar_contenido('ana', 'modelos/ana/a.mp4', content_hash='h1')
+    duplicado = contenidos_prd.registrar_contenido('ana', 'modelos/ana/b.mp4', content_hash='h1')
+
+    assert duplicado == {'id': primero['id'], 'archivo_path': 'modelos/ana/a.mp4', 'creado': False}
+    assert len(fake.tables['contenidos']) == 1
+
+
+def test_registrar_contenido_modelo_inexistente(fake):
+    assert contenidos_prd.registrar_contenido('nadie', 'modelos/nadie/a.mp4') is None
+
+
+# ---- ContenidoJobQueue (requiere python-telegram-bot) ----
+
+@pytest.fixture
+def jobs():
+    pytest.importorskip("telegram")
+    import contenido_jobs
+    return contenido_jobs
+
+
+class _Bot:
+    def __init__(self):
+        self.mensajes = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.mensajes.append((chat_id, text))
+
+
+def _job(jobs, archivo='modelos/ana/a.mp4'):
+    return jobs.ContenidoJob(chat_id=7, modelo='ana', archivo_path=archivo, meta_path='a.json',
+                             enviado_por='ana', que_vendes=['x'], outfit=['y'], content_hash='h1')
+
+
+async def _drain(queue):
+    await asyncio.wait_for(queue._queue.join(), 5)
+    for task in queue._tasks:
+        task.cancel()
+
+
+def test_submit_persiste_el_job_hasta_terminar(jobs, tmp_path, monkeypatch):
+    queue = jobs.ContenidoJobQueue(tmp_path, workers=1)
+    job = _job(jobs)
+    vistos = []
+
+    def process(j):
+        # Mientras corre, el job sigue en disco por si el bot se reinicia
+        vistos.append(json.loads((tmp_path / f"{j.id}.json").read_text(encoding="utf-8")))
+        return True, "listo"
+    monkeypatch.setattr(jobs, 'process_contenido_job', process)
+
+    async def main():
+        bot = _Bot()
+        assert await queue.submit(job, bot) == 0
+        await _drain(queue)
+        return bot
+
+    bot = asyncio.run(main())
+    assert vistos == [asdict(job)]
+    assert bot.mensajes == [(7, "listo")]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_start_reprocesa_los_jobs_pendientes(jobs, tmp_path, monkeypatch):
+    job = _job(jobs)
+    (tmp_path / f"{job.id}.json").write_text(json.dumps(asdict(job)), encoding="utf-8")
+    (tmp_path / "roto.json").write_text("{no es json", encoding="utf-8")
+    procesados = []
+    monkeypatch.setattr(jobs, 'process_contenido_job', lambda j: procesados.append(j) or (True, "ok"))
+
+    async def main():
+        queue = jobs.ContenidoJobQueue(tmp_path, workers=2)
+        await queue.start(_Bot())
+        await _drain(queue)
+
+    asyncio.run(main())
+    assert procesados == [job]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_job_que_revienta_queda_para_el_proximo_arranque(jobs, tmp_path, monkeypatch):
+    def process(j):
+        raise RuntimeError("sin red")
+    monkeypatch.setattr(jobs, 'process_contenido_job', process)
+    job = _job(jobs)
+
+    async def main():
+        queue = jobs.ContenidoJobQueue(tmp_path, workers=1)
+        await queue.submit(job, _Bot())
+        await _drain(queue)
+
+    asyncio.run(main())
+    assert [p.name for p in tmp_path.iterdir()] == [f"{job.id}.json"]
+
+
+def test_video_duplicado_no_pisa_el_contenido_y_borra_la_copia(jobs, fake, tmp_path, monkeypatch):
+    pytest.importorskip("google.generativeai")
+    import caption
+    monkeypatch.setattr(jobs, 'BASE_DIR', tmp_path)
+    original = contenidos_prd.registrar_contenido('ana', 'modelos/ana/a.mp4', content_hash='h1')
+    copia, meta = tmp_path / 'modelos/ana/b.mp4', tmp_path / 'b.json'
+    copia.parent.mkdir(parents=True)
+    copia.write_bytes(b"video")
+    meta.write_text("{}")
+    monkeypatch.setattr(caption, 'generate_caption_and_tags',
+                        lambda *a: pytest.fail("no debe generar caption para un duplicado"))
+
+    job = _job(jobs, 'modelos/ana/b.mp4')
+    job.meta_path = str(meta)
+    ok, mensaje = jobs.process_contenido_job(job)
+
+    assert (ok, mensaje) == (True, jobs.MENSAJE_DUPLICADO)
+    assert not copia.exists() and not meta.exists()
+    assert fake.get('contenidos', original['id']).get('caption_generado') is None
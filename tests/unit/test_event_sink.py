@@ -0,0 +1,182 @@
+"""EventSink: envío por lotes, journal, reenvío de huérfanos y deduplicación"""
+
+import fcntl
+import json
+import os
+
+import threading
+import time
+
+import pytest
+
+from event_sink import EventSink
+from fake_supabase import FakeAPIError, FakeSupabase
+
+
+class _Sender:
+    """send_fn sobre FakeSupabase con el mismo upsert idempotente que poster_prd"""
+
+    def __init__(self):
+        self.db = FakeSupabase()
+        self.lotes = []
+        self.caido = False
+
+    def __call__(self, rows):
+        if self.caido:
+            raise ConnectionError("sin red")
+        self.lotes.append(len(rows))
+        self.db.table('eventos_sistema').upsert(rows, on_conflict='id', ignore_duplicates=True).execute()
+
+    @property
+    def filas(self):
+        return self.db.tables.get('eventos_sistema', [])
+
+
+@pytest.fixture
+def sender():
+    return _Sender()
+
+
+def _sink(sender, journal_dir, **kwargs):
+    kwargs.setdefault('flush_seconds', 60)   # flush explícito en los tests
+    return EventSink(sender, journal_dir, **kwargs)
+
+
+def _journal(tmp_path):
+    return tmp_path / f"eventos_{os.getpid()}.ndjson"
+
+
+def _leer(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_envia_por_lotes_y_vacia_el_journal(sender, tmp_path):
+    sink = _sink(sender, tmp_path, batch_size=2)
+    for i in range(5):
+        sink.emit({"tipo": "t", "descripcion": str(i)})
+
+    assert sink.flush() is True
+    assert [f['descripcion'] for f in sender.filas] == ['0', '1', '2', '3', '4']
+    assert all(n <= 2 for n in sender.lotes)
+    assert _leer(_journal(tmp_path)) == []
+
+    sink.close()
+    assert not _journal(tmp_path).exists()
+
+
+def test_flushes_concurrentes_no_pierden_eventos(tmp_path):
+    # Hilo de fondo y flush explícito a la vez: el segundo espera al primero
+    liberar = threading.Event()
+    en_envio, enviados, solapes = [], [], []
+
+    def send(rows):
+        en_envio.append(1)
+        solapes.append(len(en_envio))
+        liberar.wait(5)
+        enviados.extend(r['descripcion'] for r in rows)
+        en_envio.pop()
+
+    sink = EventSink(send, tmp_path, batch_size=2, flush_seconds=60)
+    for i in range(5):
+        sink.emit({"tipo": "t", "descripcion": str(i)})
+    hilos = [threading.Thread(target=sink.flush) for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.1)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert max(solapes) == 1
+    assert sorted(set(enviados)) == ['0', '1', '2', '3', '4']
+    assert sink.pending() == 0
+    sink.close()
+
+
+def test_fallo_de_red_deja_los_eventos_en_buffer_y_journal(sender, tmp_path):
+    sink = _sink(sender, tmp_path)
+    sender.caido = True
+    sink.emit({"tipo": "a"})
+    sink.emit({"tipo": "b"})
+
+    assert sink.flush() is False
+    assert sink.pending() == 2
+    assert [e['tipo'] for e in _leer(_journal(tmp_path))] == ['a', 'b']
+
+    sender.caido = False
+    assert sink.flush() is True
+    assert sink.pending() == 0
+    sink.close()
+
+
+def test_rechazo_del_servidor_descarta_solo_el_evento_invalido(tmp_path):
+    enviados = []
+
+    def send(rows):
+        if any(r['tipo'] == 'invalido' for r in rows):
+            raise FakeAPIError("invalid input value for enum", code='22P02')
+        enviados.extend(r['tipo'] for r in rows)
+
+    sink = EventSink(send, tmp_path, flush_seconds=60)
+    for tipo in ('a', 'invalido', 'b'):
+        sink.emit({"tipo": tipo})
+    assert sink.flush() is True
+    assert enviados == ['a', 'b']
+    sink.close()
+
+
+def test_reenvia_journals_huerfanos_sin_duplicar(sender, tmp_path):
+    # Proceso caído: sus eventos quedaron en el journal; uno ya había llegado
+    # a la BD antes del crash (insert hecho, journal sin truncar)
+    huerfano = tmp_path / "eventos_999999.ndjson"
+    eventos = [{"id": f"e{i}", "tipo": "t"} for i in range(3)]
+    huerfano.write_text("".join(json.dumps(e) + "\n" for e in eventos) + '{"id": "cortad', encoding='utf-8')
+    sender.db.seed('eventos_sistema', [eventos[0]])
+
+    sink = _sink(sender, tmp_path)
+    sink.start()
+    assert not huerfano.exists()
+    assert [e['id'] for e in _leer(_journal(tmp_path))] == ['e0', 'e1', 'e2']
+
+    assert sink.flush() is True
+    assert sorted(f['id'] for f in sender.filas) == ['e0', 'e1', 'e2']
+    sink.close()
+
+
+def test_no_adopta_journals_de_procesos_vivos(sender, tmp_path):
+    vivo = tmp_path / "eventos_999999.ndjson"
+    vivo.write_text(json.dumps({"id": "v1", "tipo": "t"}) + "\n", encoding='utf-8')
+    with open(vivo, 'r') as f:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        sink = _sink(sender, tmp_path)
+        sink.start()
+        assert sink.pending() == 0
+        assert vivo.exists()
+        sink.close()
+
+
+def test_journal_propio_en_uso_usa_otro_nombre(sender, tmp_path):
+    # Mismo pid en otro contenedor sobre el mismo volumen de logs
+    ocupado = _journal(tmp_path)
+    ocupado.write_text(json.dumps({"id": "x1", "tipo": "ajeno"}) + "\n", encoding='utf-8')
+    with open(ocupado, 'r') as f:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        sink = _sink(sender, tmp_path)
+        sink.emit({"tipo": "propio"})
+
+        propios = [p for p in tmp_path.glob(f"eventos_{os.getpid()}_*.ndjson")]
+        assert len(propios) == 1
+        assert [e['tipo'] for e in _leer(propios[0])] == ['propio']
+        assert [e['tipo'] for e in _leer(ocupado)] == ['ajeno']
+        sink.close()
+
+
+def test_emit_tras_close_se_descarta(sender, tmp_path):
+    sink = _sink(sender, tmp_path)
+    sink.emit({"tipo": "a"})
+    sink.close()
+    sink.emit({"tipo": "tarde"})
+
+    assert [f['tipo'] for f in sender.filas] == ['a']
+    assert sink.pending() == 0
+    assert not list(tmp_path.glob("eventos_*.ndjson"))
@@ -0,0 +1,233 @@
+"""Ingest: cadena de estrategias, copia retomable, limpieza de .part y hash en la copia"""
+
+import asyncio
+import errno
+import hashlib
+import os
+import time
+
+import pytest
+
+import ingest
+
+CHUNK = 4096
+
+
+@pytest.fixture
+def origen(tmp_path):
+    src_dir, dst_dir = tmp_path / "bot-api", tmp_path / "modelo"
+    src_dir.mkdir()
+    dst_dir.mkdir()
+    src = src_dir / "file_1.mp4"
+    src.write_bytes(os.urandom(CHUNK * 5 + 123))
+    return str(src), str(dst_dir / "video.mp4")
+
+
+@pytest.fixture
+def sin_atajos(monkeypatch):
+    """Filesystem sin hardlink ni reflink entre origen y destino"""
+    def no_soportado(*args, **kwargs):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    monkeypatch.setattr(ingest.os, 'link', no_soportado)
+    monkeypatch.setattr(ingest.fcntl, 'ioctl', no_soportado)
+    monkeypatch.setattr(ingest, 'COPY_CHUNK_BYTES', CHUNK)
+
+
+def _sin_copia_en_kernel(monkeypatch):
+    def no_soportado(*args, **kwargs):
+        raise OSError(errno.ENOSYS, "Function not implemented")
+    monkeypatch.setattr(ingest.os, 'copy_file_range', no_soportado, raising=False)
+    monkeypatch.setattr(ingest.os, 'sendfile', no_soportado, raising=False)
+
+
+def _leer(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_hardlink_si_estan_en_el_mismo_filesystem(origen):
+    src, dst = origen
+    assert ingest.transfer_file(src, dst) == "hardlink"
+    assert os.path.samefile(src, dst)
+
+
+def test_rename_solo_con_move_source(origen, sin_atajos, monkeypatch):
+    src, dst = origen
+    datos = _leer(src)
+    monkeypatch.setattr(ingest, 'INGEST_MOVE_SOURCE', True)
+    assert ingest.transfer_file(src, dst) == "rename"
+    assert not os.path.exists(src)
+    assert _leer(dst) == datos
+
+
+def test_copia_en_kernel_con_progreso(origen, sin_atajos):
+    src, dst = origen
+    progreso = []
+    metodo = ingest.transfer_file(src, dst, lambda copiados, total: progreso.append((copiados, total)))
+
+    assert metodo == "copy_file_range/sendfile"
+    assert _leer(dst) == _leer(src)
+    total = os.path.getsize(src)
+    assert progreso[-1] == (total, total)
+    assert [c for c, _ in progreso] == sorted(c for c, _ in progreso)
+    assert os.listdir(os.path.dirname(dst)) == ["video.mp4"]
+
+
+def test_copia_por_bloques_sin_soporte_del_kernel(origen, sin_atajos, monkeypatch):
+    _sin_copia_en_kernel(monkeypatch)
+    src, dst = origen
+    assert ingest.transfer_file(src, dst) == "copia por bloques"
+    assert _leer(dst) == _leer(src)
+
+
+def test_error_real_no_pasa_a_la_siguiente_estrategia(origen, monkeypatch):
+    def disco_lleno(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "No space left on device")
+    monkeypatch.setattr(ingest.os, 'link', disco_lleno)
+    with pytest.raises(OSError):
+        ingest.transfer_file(*origen)
+
+
+def _copia_cortada(src, dst, despues_de):
+    def progress(copiados, total):
+        if copiados >= despues_de:
+            raise ConnectionError("corte")
+    with pytest.raises(ConnectionError):
+        ingest.copy_with_progress(src, dst, progress)
+
+
+@pytest.mark.parametrize('kernel', [True, False])
+def test_copia_cortada_se_retoma_desde_la_part(origen, sin_atajos, monkeypatch, kernel):
+    if not kernel:
+        _sin_copia_en_kernel(monkeypatch)
+    src, dst = origen
+    part = ingest.partial_path(src, dst)
+    _copia_cortada(src, dst, CHUNK * 2)
+    assert os.path.getsize(part) == CHUNK * 2
+    assert os.path.exists(part + ".src")
+
+    progreso = []
+    metodo = ingest.copy_with_progress(src, dst, lambda c, t: progreso.append(c))
+    assert metodo.endswith("(retomada)")
+    assert progreso[0] == CHUNK * 3
+    assert _leer(dst) == _leer(src)
+    assert not os.path.exists(part) and not os.path.exists(part + ".src")
+
+
+def test_part_de_otro_origen_con_el_mismo_nombre_no_se_retoma(origen, sin_atajos):
+    src, dst = origen
+    _copia_cortada(src, dst, CHUNK * 2)
+
+    # El Bot API reutiliza file_1.mp4 para otro video
+    os.unlink(src)
+    with open(src, 'wb') as f:
+        f.write(os.urandom(CHUNK * 4))
+
+    metodo = ingest.copy_with_progress(src, dst)
+    assert not metodo.endswith("(retomada)")
+    assert _leer(dst) == _leer(src)
+
+
+def test_part_sin_sidecar_empieza_de_cero(origen, sin_atajos):
+    src, dst = origen
+    part = ingest.partial_path(src, dst)
+    with open(part, 'wb') as f:
+        f.write(b"basura" * 100)
+
+    assert not ingest.copy_with_progress(src, dst).endswith("(retomada)")
+    assert _leer(dst) == _leer(src)
+
+
+def test_cleanup_borra_solo_las_part_abandonadas(tmp_path):
+    vieja, nueva, video = tmp_path / ".a.mp4.part", tmp_path / ".b.mp4.part", tmp_path / "c.mp4"
+    for path in (vieja, nueva, video):
+        path.write_bytes(b"x")
+    (tmp_path / ".a.mp4.part.src").write_text("{}")
+    hace_dos_dias = time.time() - 48 * 3600
+    os.utime(vieja, (hace_dos_dias, hace_dos_dias))
+    os.utime(video, (hace_dos_dias, hace_dos_dias))
+
+    assert ingest.cleanup_partials(str(tmp_path), max_age_hours=24) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".b.mp4.part", "c.mp4"]
+
+
+def test_hash_es_sha256_del_contenido(origen):
+    src, _ = origen
+    assert asyncio.run(ingest.content_hash(src)) == hashlib.sha256(_leer(src)).hexdigest()
+
+
+@pytest.fixture
+def sin_relectura(monkeypatch):
+    """Falla si el hash se calcula con una lectura aparte del video"""
+    monkeypatch.setattr(ingest, 'hash_file', lambda path: pytest.fail(f"relectura de {path}"))
+
+
+@pytest.mark.parametrize('kernel', [True, False])
+def test_copia_calcula_el_hash_con_los_mismos_bloques(origen, sin_atajos, sin_relectura, monkeypatch, kernel):
+    if not kernel:
+        _sin_copia_en_kernel(monkeypatch)
+    src, dst = origen
+    size, digest = ingest.copy_local_file(src, dst)
+    assert size == os.path.getsize(src)
+    assert digest == hashlib.sha256(_leer(src)).hexdigest()
+    assert _leer(dst) == _leer(src)
+
+
+def test_copia_retomada_incluye_la_part_en_el_hash(origen, sin_atajos, sin_relectura):
+    src, dst = origen
+    _copia_cortada(src, dst, CHUNK * 2)
+    _, digest = ingest.copy_local_file(src, dst)
+    assert digest == hashlib.sha256(_leer(src)).hexdigest()
+
+
+def test_sin_copia_el_hash_se_lee_del_destino(origen):
+    src, dst = origen
+    _, digest = ingest.copy_local_file(src, dst)
+    assert os.path.samefile(src, dst)
+    assert digest == hashlib.sha256(_leer(src)).hexdigest()
+
+
+def test_fix_de_permisos_reintenta_con_copia_real(origen, monkeypatch):
+    src, dst = origen
+    chmods = []
+    monkeypatch.setattr(ingest, 'fix_permissions', chmods.append)
+    intentos = []
+    original = ingest._try_link
+
+    def link(s, d):
+        intentos.append(s)
+        if len(intentos) == 1:
+            raise PermissionError(errno.EACCES, "Permission denied")
+        return original(s, d)
+    monkeypatch.setattr(ingest, '_try_link', link)
+
+    _, digest = ingest.copy_local_file(src, dst)
+    assert chmods == [src]
+    # El chmod no se comparte con modelos/: no se enlazó tras aplicarlo
+    assert intentos == [src]
+    assert not os.path.samefile(src, dst)
+    assert digest == hashlib.sha256(_leer(src)).hexdigest()
+
+
+def test_ingest_local_file_no_bloquea_el_loop(origen, sin_atajos):
+    src, dst = origen
+
+    async def main():
+        latidos = 0
+
+        async def latido():
+            nonlocal latidos
+            while True:
+                latidos += 1
+                await asyncio.sleep(0)
+
+        tarea = asyncio.create_task(latido())
+        size = await ingest.ingest_local_file(src, dst)
+        tarea.cancel()
+        return size, latidos
+
+    (size, digest), latidos = asyncio.run(main())
+    assert size == os.path.getsize(src)
+    assert digest == hashlib.sha256(_leer(src)).hexdigest()
+    assert latidos > 0
+    assert _leer(dst) == _leer(src)
@@ -0,0 +1,128 @@
+"""ModelRegistry: lookup, refresco incremental y caché negativa"""
+
+import json
+import os
+
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def modelos(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, 'MODEL_REGISTRY_REFRESH_SECONDS', 0)
+    monkeypatch.setattr(model_registry, 'MODEL_NEGATIVE_TTL_SECONDS', 60)
+    return tmp_path
+
+
+def _config(modelos, modelo, user_id, mtime_ns=None):
+    carpeta = modelos / modelo
+    carpeta.mkdir(exist_ok=True)
+    path = carpeta / "config.json"
+    path.write_text(json.dumps({"telegram_user_id": user_id}), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def test_lookup_por_user_id(modelos):
+    _config(modelos, "ana", 111)
+    _config(modelos, "bea", "222 ")
+    _config(modelos, "sin_id", "")
+    (modelos / "suelto.txt").write_text("x")
+
+    registry = ModelRegistry(modelos)
+    assert registry.refresh() is True
+    assert registry.lookup(111) == "ana"
+    assert registry.lookup("222") == "bea"
+    assert registry.lookup(333) is None
+    assert len(registry) == 2
+
+
+def test_refresco_incremental_solo_relee_lo_que_cambio(modelos, monkeypatch):
+    _config(modelos, "ana", 111, mtime_ns=1_000)
+    path_bea = _config(modelos, "bea", 222, mtime_ns=1_000)
+    registry = ModelRegistry(modelos)
+    registry.refresh()
+
+    leidos = []
+    original = ModelRegistry._read_user_id
+    monkeypatch.setattr(ModelRegistry, '_read_user_id',
+                        staticmethod(lambda p: leidos.append(p) or original(p)))
+    assert registry.refresh() is False
+    assert leidos == []
+
+    _config(modelos, "bea", 999, mtime_ns=2_000)
+    assert registry.refresh() is True
+    assert leidos == [str(path_bea)]
+    assert registry.lookup(999) == "bea"
+    assert registry.lookup(222) is None
+
+    assert registry.refresh(force=True) is True
+    assert len(leidos) == 3
+
+
+def test_config_borrado_sale_del_indice(modelos):
+    path = _config(modelos, "ana", 111)
+    registry = ModelRegistry(modelos)
+    registry.refresh()
+
+    os.unlink(path)
+    assert registry.refresh() is True
+    assert registry.lookup(111) is None
+    assert len(registry) == 0
+
+
+def test_modelo_nuevo_aparece_en_el_proximo_lookup(modelos):
+    registry = ModelRegistry(modelos)
+    assert registry.lookup(111) is None
+    _config(modelos, "ana", 111)
+    # La caché negativa se limpia solo con un refresco con cambios
+    assert registry.refresh() is True
+    assert registry.lookup(111) == "ana"
+
+
+def test_cache_negativa_evita_refrescos_hasta_que_vence(modelos, monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(model_registry.time, 'monotonic', lambda: reloj[0])
+    registry = ModelRegistry(modelos)
+    refrescos = []
+    original = registry.refresh
+    monkeypatch.setattr(registry, 'refresh', lambda force=False: refrescos.append(1) or original(force))
+
+    assert registry.lookup(111) is None
+    assert registry.lookup(111) is None
+    assert len(refrescos) == 1
+
+    # El config aparece mientras el id está en la caché negativa: no se ve todavía
+    _config(modelos, "ana", 111)
+    reloj[0] += 59
+    assert registry.lookup(111) is None
+    assert len(refrescos) == 1
+
+    reloj[0] += 2
+    assert registry.lookup(111) == "ana"
+    assert len(refrescos) == 2
+
+
+def test_intervalo_minimo_entre_refrescos(modelos, monkeypatch):
+    monkeypatch.setattr(model_registry, 'MODEL_REGISTRY_REFRESH_SECONDS', 3600)
+    registry = ModelRegistry(modelos)
+    registry.refresh()
+    _config(modelos, "ana", 111)
+    # Refrescado hace menos del intervalo: el lookup no vuelve a escanear
+    assert registry.lookup(111) is None
+    assert registry.refresh() is True
+    assert registry.lookup(111) == "ana"
+
+
+def test_config_invalido_no_rompe_el_refresco(modelos):
+    (modelos / "rota").mkdir()
+    (modelos / "rota" / "config.json").write_text("{no es json", encoding="utf-8")
+    _config(modelos, "ana", 111)
+
+    registry = ModelRegistry(modelos)
+    registry.refresh()
+    assert registry.lookup(111) == "ana"
+    assert len(registry) == 1
@@ -0,0 +1,170 @@
+"""Lease de publicaciones en poster_prd: claim, robo tras vencer y reaper"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import poster_prd
+from fake_supabase import PRD_FUNCTIONS, FakeAPIError, FakeSupabase
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSupabase()
+    eventos = []
+    monkeypatch.setattr(poster_prd, 'supabase', fake)
+    monkeypatch.setattr(poster_prd, '_LEASE_DISPONIBLE', True)
+    monkeypatch.setattr(poster_prd, '_RPC_TRANSICION_DISPONIBLE', True)
+    monkeypatch.setattr(poster_prd, 'POSTER_ID', 'poster-a')
+    monkeypatch.setattr(poster_prd, 'create_evento_sistema',
+                        lambda tipo, pub_id=None, *a, **k: eventos.append((tipo, pub_id)))
+    fake.eventos = eventos
+    fake.seed('publicaciones', [
+        {'id': f'p{i}', 'estado': 'programada', 'intentos': 0, 'lease_owner': None, 'lease_until': None}
+        for i in range(1, 4)
+    ])
+    return fake
+
+
+def _vencer_lease(fake, pub_id):
+    pasado = datetime.now(timezone.utc) - timedelta(seconds=1)
+    fake.get('publicaciones', pub_id)['lease_until'] = pasado.isoformat()
+
+
+def test_claim_toma_la_fila_una_sola_vez(fake, monkeypatch):
+    assert poster_prd.claim_publicacion('p1') is True
+    fila = fake.get('publicaciones', 'p1')
+    assert fila['estado'] == 'procesando'
+    assert fila['lease_owner'] == 'poster-a'
+    lease_until = datetime.fromisoformat(fila['lease_until'])
+    assert lease_until > datetime.now(timezone.utc) + timedelta(seconds=poster_prd.POSTER_LEASE_SECONDS - 60)
+
+    monkeypatch.setattr(poster_prd, 'POSTER_ID', 'poster-b')
+    assert poster_prd.claim_publicacion('p1') is False
+    assert fake.get('publicaciones', 'p1')['lease_owner'] == 'poster-a'
+
+
+def test_claim_en_lote_solo_retorna_las_reclamadas(fake, monkeypatch):
+    assert poster_prd.claim_publicaciones(['p1']) == {'p1'}
+    monkeypatch.setattr(poster_prd, 'POSTER_ID', 'poster-b')
+    assert poster_prd.claim_publicaciones(['p1', 'p2', 'p3']) == {'p2', 'p3'}
+    assert poster_prd.claim_publicaciones([]) == set()
+    assert fake.get('publicaciones', 'p2')['lease_owner'] == 'poster-b'
+
+
+def test_reaper_solo_libera_leases_vencidos(fake, monkeypatch):
+    poster_prd.claim_publicaciones(['p1', 'p2'])
+    _vencer_lease(fake, 'p1')
+
+    assert poster_prd.reap_expired_leases() == 1
+    p1, p2 = fake.get('publicaciones', 'p1'), fake.get('publicaciones', 'p2')
+    assert (p1['estado'], p1['lease_owner'], p1['lease_until']) == ('programada', None, None)
+    assert (p2['estado'], p2['lease_owner']) == ('procesando', 'poster-a')
+    assert fake.eventos == [('lease_expirado', 'p1')]
+
+
+@pytest.mark.parametrize('con_rpc', [True, False])
+def test_lease_robado_no_pisa_el_estado_del_nuevo_duenio(fake, monkeypatch, con_rpc):
+    if not con_rpc:
+        monkeypatch.setattr(poster_prd, '_RPC_TRANSICION_DISPONIBLE', False)
+    assert poster_prd.claim_publicacion('p1')
+    _vencer_lease(fake, 'p1')
+    poster_prd.reap_expired_leases()
+
+    # Otra instancia la reclama mientras la primera sigue subiendo
+    monkeypatch.setattr(poster_prd, 'POSTER_ID', 'poster-b')
+    assert poster_prd.claim_publicacion('p1')
+
+    # La primera termina tarde: su transición no se aplica
+    assert poster_prd.transicionar_publicacion(
+        'p1', 'publicado', evento_tipo='publicacion_exitosa', lease_owner='poster-a'
+    ) is False
+    fila = fake.get('publicaciones', 'p1')
+    assert (fila['estado'], fila['lease_owner']) == ('procesando', 'poster-b')
+    assert not fake.tables.get('eventos_sistema')
+    assert ('publicacion_exitosa', 'p1') not in fake.eventos
+
+    # El dueño actual sí puede cerrarla y libera el lease
+    assert poster_prd.transicionar_publicacion(
+        'p1', 'publicado', evento_tipo='publicacion_exitosa', lease_owner='poster-b'
+    ) is True
+    fila = fake.get('publicaciones', 'p1')
+    assert (fila['estado'], fila['lease_owner'], fila['lease_until']) == ('publicado', None, None)
+
+
+def test_sin_columnas_lease_el_claim_sigue_siendo_atomico(fake, monkeypatch):
+    fake.fail_next = FakeAPIError("Could not find the 'lease_owner' column", code='PGRST204')
+
+    assert poster_prd.claim_publicacion('p1') is True
+    assert poster_prd._LEASE_DISPONIBLE is False
+    fila = fake.get('publicaciones', 'p1')
+    assert fila['estado'] == 'procesando'
+    assert fila['lease_owner'] is None
+
+    assert poster_prd.claim_publicacion('p1') is False
+    assert poster_prd.claim_publicaciones(['p1', 'p2']) == {'p2'}
+    # Sin lease no hay nada que vencer
+    assert poster_prd.reap_expired_leases() == 0
+
+
+class _RPCCaida:
+    """transicionar_publicacion que falla (error transitorio de PostgREST) mientras caida > 0"""
+
+    def __init__(self, caida):
+        self.caida = caida
+
+    def __call__(self, db, **params):
+        if self.caida:
+            self.caida -= 1
+            raise FakeAPIError("upstream timeout", code='PGRST000')
+        return PRD_FUNCTIONS['transicionar_publicacion'](db, **params)
+
+
+@pytest.fixture
+def pendientes(tmp_path, monkeypatch):
+    monkeypatch.setattr(poster_prd, 'PUBLICADOS_PENDIENTES_DIR', tmp_path)
+    monkeypatch.setattr(poster_prd, 'PUBLICADO_BACKOFF_SECONDS', 0)
+    return tmp_path
+
+
+def test_publicado_se_reintenta_ante_un_error_transitorio(fake, pendientes):
+    assert poster_prd.claim_publicacion('p1')
+    fake.register_function('transicionar_publicacion', _RPCCaida(1))
+
+    assert poster_prd.registrar_publicado('p1', None, "ok", 'https://x/v1') is True
+    fila = fake.get('publicaciones', 'p1')
+    assert (fila['estado'], fila['url_publicacion'], fila['lease_owner']) == ('publicado', 'https://x/v1', None)
+    assert list(pendientes.iterdir()) == []
+
+
+def test_publicado_no_escrito_no_vuelve_a_programada(fake, pendientes):
+    assert poster_prd.claim_publicacion('p1')
+    fake.register_function('transicionar_publicacion', _RPCCaida(poster_prd.PUBLICADO_REINTENTOS))
+    # El upload tardó más que el lease
+    _vencer_lease(fake, 'p1')
+
+    assert poster_prd.registrar_publicado('p1', None, "ok", 'https://x/v1') is False
+    # Lease extendido: el reaper no la devuelve a 'programada' para subirla otra vez
+    assert poster_prd.reap_expired_leases() == 0
+    assert fake.get('publicaciones', 'p1')['estado'] == 'procesando'
+    assert [p.name for p in pendientes.iterdir()] == ['p1.json']
+
+    # Con la BD de vuelta, el siguiente ciclo la marca publicada
+    assert poster_prd.replay_publicados_pendientes() == 1
+    fila = fake.get('publicaciones', 'p1')
+    assert (fila['estado'], fila['url_publicacion']) == ('publicado', 'https://x/v1')
+    assert list(pendientes.iterdir()) == []
+    assert poster_prd.replay_publicados_pendientes() == 0
+
+
+def test_replay_aplica_publicado_aunque_el_reaper_la_haya_liberado(fake, pendientes, monkeypatch):
+    assert poster_prd.claim_publicacion('p1')
+    fake.register_function('transicionar_publicacion', _RPCCaida(poster_prd.PUBLICADO_REINTENTOS))
+    # BD caída también para extender el lease
+    monkeypatch.setattr(poster_prd, 'extender_lease', lambda pub_id: False)
+    assert poster_prd.registrar_publicado('p1', None, "ok", None) is False
+
+    _vencer_lease(fake, 'p1')
+    poster_prd.reap_expired_leases()
+    assert poster_prd.replay_publicados_pendientes() == 1
+    assert fake.get('publicaciones', 'p1')['estado'] == 'publicado'
@@ -0,0 +1,150 @@
+"""PosterPool: límites de concurrencia, deduplicación y shutdown"""
+
+import threading
+import time
+
+import poster_pool
+from poster_pool import PosterPool
+
+
+def _pub(pub_id, plataforma='kams', cuenta=None, scheduled_time='t1'):
+    return {'id': pub_id, 'plataforma': plataforma, 'cuenta': cuenta or f"c_{pub_id}",
+            'scheduled_time': scheduled_time}
+
+
+class _Recorder:
+    """process_fn que bloquea hasta release() y registra la concurrencia máxima"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gate = threading.Event()
+        self.running = []
+        self.done = []
+        self.max_total = 0
+        self.max_plataforma = {}
+        self.max_cuenta = {}
+
+    def __call__(self, pub):
+        with self.lock:
+            self.running.append(pub)
+            self.max_total = max(self.max_total, len(self.running))
+            for campo, maximos in (('plataforma', self.max_plataforma), ('cuenta', self.max_cuenta)):
+                n = sum(1 for p in self.running if p[campo] == pub[campo])
+                maximos[pub[campo]] = max(maximos.get(pub[campo], 0), n)
+        self.gate.wait(5)
+        with self.lock:
+            self.running.remove(pub)
+            self.done.append(pub['id'])
+
+    def wait_running(self, n, timeout=5):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            with self.lock:
+                if len(self.running) >= n:
+                    return True
+            time.sleep(0.01)
+        return False
+
+
+def _pool(recorder, **kwargs):
+    return PosterPool(recorder, lambda p: (p['plataforma'], p['cuenta']), **kwargs)
+
+
+def test_respeta_limites_global_plataforma_y_cuenta():
+    rec = _Recorder()
+    pool = _pool(rec, max_workers=3, max_per_plataforma=2, max_per_cuenta=1)
+    pubs = [
+        _pub('a1', 'kams', 'ca'), _pub('a2', 'kams', 'ca'),       # misma cuenta
+        _pub('b1', 'kams', 'cb'), _pub('c1', 'kams', 'cc'),       # tope de plataforma
+        _pub('x1', 'xxxfollow', 'cx'), _pub('x2', 'xxxfollow', 'cy'),
+    ]
+    assert pool.submit(pubs) == 6
+
+    assert rec.wait_running(3)
+    time.sleep(0.05)
+    with rec.lock:
+        corriendo = {p['id'] for p in rec.running}
+    # Global 3: a1 y b1 (kams, 2 por plataforma) y x1; a2 espera a su cuenta
+    assert corriendo == {'a1', 'b1', 'x1'}
+
+    rec.gate.set()
+    assert pool.wait_idle(5)
+    assert sorted(rec.done) == sorted(p['id'] for p in pubs)
+    assert rec.max_total <= 3
+    assert max(rec.max_plataforma.values()) <= 2
+    assert max(rec.max_cuenta.values()) == 1
+    pool.shutdown()
+
+
+def test_una_cuenta_ocupada_no_bloquea_a_las_siguientes():
+    rec = _Recorder()
+    pool = _pool(rec, max_workers=2, max_per_plataforma=2, max_per_cuenta=1)
+    pool.submit([_pub('a1', cuenta='ca'), _pub('a2', cuenta='ca'), _pub('b1', cuenta='cb')])
+
+    assert rec.wait_running(2)
+    with rec.lock:
+        assert {p['id'] for p in rec.running} == {'a1', 'b1'}
+    rec.gate.set()
+    assert pool.wait_idle(5)
+    pool.shutdown()
+
+
+def test_ignora_duplicados_en_cola_y_recien_terminados():
+    rec = _Recorder()
+    pool = _pool(rec, max_workers=1)
+    assert pool.submit([_pub('a'), _pub('b')]) == 2
+    # En cola o corriendo: no se vuelven a encolar
+    assert pool.submit([_pub('a'), _pub('b')]) == 0
+
+    rec.gate.set()
+    assert pool.wait_idle(5)
+    # Recién terminada con el mismo scheduled_time: lectura vieja, se ignora
+    assert pool.submit([_pub('a')]) == 0
+    # Reprogramada (reintento): se acepta
+    assert pool.submit([_pub('a', scheduled_time='t2')]) == 1
+    assert pool.wait_idle(5)
+    assert sorted(rec.done) == ['a', 'a', 'b']
+    pool.shutdown()
+
+
+def test_recien_terminados_vencen_tras_el_ttl(monkeypatch):
+    rec = _Recorder()
+    rec.gate.set()
+    pool = _pool(rec)
+    pool.submit([_pub('a')])
+    assert pool.wait_idle(5)
+
+    monkeypatch.setattr(poster_pool, 'RECENT_TTL_SECONDS', -1)
+    assert pool.submit([_pub('a')]) == 1
+    assert pool.wait_idle(5)
+    pool.shutdown()
+
+
+def test_un_error_no_controlado_libera_el_slot():
+    hechos = []
+
+    def process(pub):
+        if pub['id'] == 'boom':
+            raise RuntimeError("fallo")
+        hechos.append(pub['id'])
+
+    pool = PosterPool(process, lambda p: ('kams', 'misma_cuenta'), max_workers=1)
+    pool.submit([_pub('boom'), _pub('ok')])
+    assert pool.wait_idle(5)
+    assert hechos == ['ok']
+    assert pool.running() == 0
+    pool.shutdown()
+
+
+def test_shutdown_descarta_la_cola_y_espera_a_las_que_corren():
+    rec = _Recorder()
+    pool = _pool(rec, max_workers=1)
+    pool.submit([_pub('a'), _pub('b'), _pub('c')])
+    assert rec.wait_running(1)
+    assert pool.pending() == 3
+
+    threading.Timer(0.1, rec.gate.set).start()
+    pool.shutdown(wait=True)
+
+    assert rec.done == ['a']
+    assert pool.pending() == 0
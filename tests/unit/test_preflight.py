@@ -0,0 +1,208 @@
+"""Preflight: cabecera de video y su caché, sesiones guardadas, lotes y rechazo sin pasar por el pool"""
+
+import os
+import time
+
+import pytest
+
+import poster_prd
+import preflight
+from fake_supabase import FakeSupabase
+
+MP4 = b'\x00\x00\x00\x20ftypisom\x00\x00\x02\x00'
+MOV = b'\x00\x00\x00\x08wide\x00\x00\x00\x00'
+WEBM = b'\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\xf7\x81'
+AVI = b'RIFF\x24\x10\x00\x00AVI LIST'
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    monkeypatch.setattr(preflight, 'BASE_DIR', tmp_path)
+    monkeypatch.setattr(preflight, '_FILE_CACHE', {})
+    monkeypatch.setattr(preflight, '_AUTH_WARNED', set())
+    (tmp_path / 'workers').mkdir()
+    (tmp_path / 'workers' / 'kams.js').write_text("// worker")
+    auth = tmp_path / 'modelos' / 'ana' / '.auth'
+    auth.mkdir(parents=True)
+    (auth / 'user.json').write_text("{}")
+    return tmp_path
+
+
+def _video(base, nombre, contenido):
+    path = base / 'modelos' / 'ana' / nombre
+    path.write_bytes(contenido)
+    return path
+
+
+# ---- Cabecera del video ----
+
+@pytest.mark.parametrize('cabecera', [MP4, MOV, WEBM, AVI], ids=['mp4', 'mov', 'webm', 'avi'])
+def test_contenedores_aceptados(base, cabecera):
+    assert preflight.check_video(_video(base, 'v.mp4', cabecera + b'\x00' * 100)) is None
+
+
+@pytest.mark.parametrize('contenido', [
+    b'RIFF\x24\x10\x00\x00WAVEfmt ' + b'\x00' * 10,
+    b'<html><body>404</body></html>',
+    b'\x00' * 64,
+], ids=['wav', 'html', 'ceros'])
+def test_archivo_que_no_es_video(base, contenido):
+    error = preflight.check_video(_video(base, 'v.mp4', contenido))
+    assert error.startswith("Archivo sin cabecera de video reconocible")
+
+
+def test_archivo_vacio_o_inexistente(base):
+    assert preflight.check_video(_video(base, 'v.mp4', b'')).startswith("Archivo vacío")
+    assert preflight.check_video(base / 'no.mp4').startswith("Archivo no encontrado")
+
+
+def test_cache_por_mtime_y_tamanio(base):
+    path = _video(base, 'v.mp4', b'x' * len(MP4))
+    os.utime(path, ns=(1_000, 1_000))
+    assert preflight.check_video(path) is not None
+
+    # Mismo (mtime_ns, tamaño): no se vuelve a abrir aunque el contenido cambie
+    path.write_bytes(MP4)
+    os.utime(path, ns=(1_000, 1_000))
+    assert preflight.check_video(path) is not None
+
+    os.utime(path, ns=(2_000, 2_000))
+    assert preflight.check_video(path) is None
+    assert preflight._FILE_CACHE[str(path)] == (2_000, len(MP4), None)
+
+    path.write_bytes(MP4 + b'\x00')
+    os.utime(path, ns=(2_000, 2_000))
+    assert preflight.check_video(path) is None
+
+
+def test_cache_acotada(base, monkeypatch):
+    monkeypatch.setattr(preflight, 'CACHE_MAX_ENTRIES', 3)
+    for i in range(5):
+        preflight.check_video(_video(base, f'v{i}.mp4', MP4))
+    assert len(preflight._FILE_CACHE) <= 3
+
+
+# ---- Sesiones guardadas ----
+
+def _envejecer(path, dias):
+    antes = time.time() - dias * 86400
+    os.utime(path, (antes, antes))
+
+
+def test_sesion_inexistente_falla(base):
+    error = preflight.check_auth(base / 'modelos' / 'bea' / '.auth' / 'user.json')
+    assert error.startswith("No hay sesión guardada")
+
+
+def test_sesion_vieja_solo_avisa_una_vez(base, monkeypatch, capsys):
+    monkeypatch.setattr(preflight, 'AUTH_MAX_AGE_DAYS', 0)
+    path = preflight.auth_path('ana', 'kams')
+    _envejecer(path, preflight.AUTH_WARN_AGE_DAYS + 5)
+
+    assert preflight.check_auth(path) is None
+    assert preflight.check_auth(path) is None
+    assert capsys.readouterr().out.count("puede haber expirado") == 1
+
+
+def test_sesion_mas_vieja_que_el_maximo_falla(base, monkeypatch):
+    monkeypatch.setattr(preflight, 'AUTH_MAX_AGE_DAYS', 10)
+    path = preflight.auth_path('ana', 'kams')
+    _envejecer(path, 11)
+    assert "Repetir el login" in preflight.check_auth(path)
+    _envejecer(path, 9)
+    assert preflight.check_auth(path) is None
+
+
+def test_auth_path_por_plataforma(base):
+    assert preflight.auth_path('ana', 'Kams.com') == base / 'modelos' / 'ana' / '.auth' / 'user.json'
+    assert preflight.auth_path('ana', 'xxxfollow').name == 'xxxfollow.json'
+    assert preflight.auth_path('ana', 'otra') is None
+    assert preflight.auth_path('', 'kams') is None
+
+
+# ---- Lotes ----
+
+def _publicacion(pub_id, archivo='modelos/ana/v.mp4', modelo='ana', plataforma='kams'):
+    return {
+        'id': pub_id, 'contenido_id': 'c1', 'estado': 'programada', 'intentos': 0,
+        'contenidos': {'id': 'c1', 'modelo_id': 'm1', 'archivo_path': archivo,
+                       'modelos': {'id': 'm1', 'nombre': modelo} if modelo else None},
+        'cuentas_plataforma': {'plataformas': {'nombre': plataforma} if plataforma else None},
+    }
+
+
+def test_check_batch_clasifica_por_error_class(base):
+    _video(base, 'v.mp4', MP4)
+    _video(base, 'avi.mp4', AVI + b'\x00' * 100)
+    _video(base, 'roto.mp4', b'nada')
+    validas, invalidas = preflight.check_batch([
+        _publicacion('ok'),
+        _publicacion('avi', archivo='modelos/ana/avi.mp4'),
+        _publicacion('roto', archivo='modelos/ana/roto.mp4'),
+        _publicacion('sin_archivo', archivo=None),
+        _publicacion('sin_worker', plataforma='xxxfollow'),
+        _publicacion('sin_sesion', modelo='bea', archivo='modelos/ana/v.mp4'),
+        _publicacion('sin_modelo', modelo=None),
+        _publicacion('sin_plataforma', plataforma=None),
+    ])
+
+    assert [p['id'] for p in validas] == ['ok', 'avi']
+    assert {p['id']: clase for p, clase, _ in invalidas} == {
+        'roto': 'file', 'sin_archivo': 'file', 'sin_worker': 'config',
+        'sin_sesion': 'auth', 'sin_modelo': 'config', 'sin_plataforma': 'config',
+    }
+
+
+def test_check_batch_hace_un_stat_por_ruta(base, monkeypatch):
+    _video(base, 'v.mp4', MP4)
+    stats = []
+    original = preflight.Path.stat
+    monkeypatch.setattr(preflight.Path, 'stat', lambda self, *a, **k: stats.append(str(self)) or original(self, *a, **k))
+
+    validas, _ = preflight.check_batch([_publicacion(f'p{i}') for i in range(10)])
+    assert len(validas) == 10
+    # video, worker y sesión: una vez por lote
+    assert len(stats) == 3
+
+
+# ---- rechazar_invalidas ----
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(poster_prd, 'supabase', fake)
+    monkeypatch.setattr(poster_prd, '_LEASE_DISPONIBLE', True)
+    monkeypatch.setattr(poster_prd, '_RPC_TRANSICION_DISPONIBLE', True)
+    monkeypatch.setattr(poster_prd, 'POSTER_ID', 'poster-a')
+    monkeypatch.setattr(poster_prd, 'create_evento_sistema', lambda *a, **k: None)
+    fake.seed('contenidos', [{'id': 'c1', 'modelo_id': 'm1'}])
+    fake.seed('publicaciones', [
+        {'id': pub_id, 'contenido_id': 'c1', 'estado': 'programada', 'intentos': 0,
+         'lease_owner': None, 'lease_until': None}
+        for pub_id in ('roto', 'sin_sesion', 'tomada')
+    ])
+    return fake
+
+
+def test_rechazar_invalidas_falla_solo_las_que_reclama(base, fake, monkeypatch):
+    _video(base, 'v.mp4', MP4)
+    _video(base, 'roto.mp4', b'nada')
+    monkeypatch.setattr(poster_prd, 'POSTER_ID', 'poster-b')
+    assert poster_prd.claim_publicacion('tomada')
+    monkeypatch.setattr(poster_prd, 'POSTER_ID', 'poster-a')
+
+    _, invalidas = preflight.check_batch([
+        _publicacion('roto', archivo='modelos/ana/roto.mp4'),
+        _publicacion('sin_sesion', modelo='bea'),
+        _publicacion('tomada', archivo='modelos/ana/roto.mp4'),
+    ])
+    assert poster_prd.rechazar_invalidas(invalidas) == 2
+
+    roto, sin_sesion, tomada = (fake.get('publicaciones', p) for p in ('roto', 'sin_sesion', 'tomada'))
+    # 'file' y 'auth' no se reintentan: quedan fallidas para revisión
+    assert (roto['estado'], roto['intentos'], roto['lease_owner']) == ('fallido', 1, None)
+    assert roto['ultimo_error'].startswith("Archivo sin cabecera de video reconocible")
+    assert sin_sesion['estado'] == 'fallido'
+    assert sin_sesion['ultimo_error'].startswith("No hay sesión guardada")
+    # Otra instancia ya la está subiendo: no se toca
+    assert (tomada['estado'], tomada['lease_owner'], tomada['intentos']) == ('procesando', 'poster-b', 0)
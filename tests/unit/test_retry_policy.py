@@ -0,0 +1,174 @@
+"""Reintentos: clases por etapa, backoff, ubicación del slot y fallar_publicacion"""
+
+import datetime as dt
+
+import pytest
+
+import poster_prd
+import retry_policy
+from fake_supabase import PRD_FUNCTIONS, FakeSupabase
+from retry_policy import TZ_LOCAL, backoff_seconds, find_retry_slot, is_retryable
+from slot_allocator import MAX_CONTENIDOS_POR_DIA
+
+
+def _local(dia, hora, minuto=0):
+    return dt.datetime(2026, 3, dia, hora, minuto, tzinfo=TZ_LOCAL)
+
+
+@pytest.mark.parametrize('error_class, stage, esperado', [
+    ('network', 'pre_upload', True),
+    ('timeout', 'pre_upload', True),
+    ('unknown', 'pre_upload', True),
+    (None, 'pre_upload', True),
+    ('platform', 'upload', True),
+    ('rate_limit', 'upload', True),
+    # Corte a mitad de subida: el video pudo llegar
+    ('network', 'upload', False),
+    ('timeout', 'upload', False),
+    ('platform', 'uploaded', False),
+    ('network', None, False),
+    ('auth', 'pre_upload', False),
+    ('file', 'pre_upload', False),
+    ('rejected', 'pre_upload', False),
+    ('config', 'pre_upload', False),
+])
+def test_is_retryable_por_clase_y_etapa(error_class, stage, esperado):
+    assert is_retryable(error_class, 1, stage) is esperado
+
+
+def test_is_retryable_respeta_max_intentos():
+    assert is_retryable('network', retry_policy.MAX_INTENTOS - 1, 'pre_upload')
+    assert not is_retryable('network', retry_policy.MAX_INTENTOS, 'pre_upload')
+
+
+class _Rng:
+    def __init__(self, valor):
+        self.valor = valor
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.valor
+
+
+def test_backoff_exponencial_con_jitter_y_tope():
+    base = retry_policy.RETRY_BASE_SECONDS
+    assert backoff_seconds(1, rng=_Rng(0)) == base / 2
+    assert backoff_seconds(1, rng=_Rng(1)) == base
+    assert backoff_seconds(3, rng=_Rng(1)) == base * 4
+    assert backoff_seconds(2, 'rate_limit', rng=_Rng(1)) == base * 4 * 2
+    assert backoff_seconds(50, rng=_Rng(1)) == retry_policy.RETRY_MAX_SECONDS
+
+
+def test_slot_dentro_de_la_ventana_y_lejos_de_los_ocupados():
+    earliest = _local(10, 13, 2)
+    ocupados = [_local(10, 13, 5), _local(10, 13, 20)]
+    for _ in range(20):
+        slot = find_retry_slot(earliest, ocupados, '12:00', 5, gap_minutes=10)
+        assert earliest < slot <= _local(10, 17)
+        assert all(abs(slot - o) >= dt.timedelta(minutes=10) for o in ocupados)
+
+
+def test_slot_pasa_al_dia_siguiente_si_la_ventana_termino():
+    slot = find_retry_slot(_local(10, 18), [], '12:00', 5)
+    assert _local(11, 12) <= slot <= _local(11, 17)
+
+
+def test_slot_salta_dias_con_el_tope_de_contenidos():
+    lleno = {f"c{i}" for i in range(MAX_CONTENIDOS_POR_DIA)}
+    por_dia = {'2026-03-10': lleno, '2026-03-11': lleno}
+
+    slot = find_retry_slot(_local(10, 8), [], '12:00', 5, por_dia, contenido_id='otro')
+    assert slot.astimezone(TZ_LOCAL).date() == dt.date(2026, 3, 12)
+
+    # El propio contenido ya cuenta en el tope de ese día
+    slot = find_retry_slot(_local(10, 8), [], '12:00', 5, por_dia, contenido_id='c0')
+    assert slot.astimezone(TZ_LOCAL).date() == dt.date(2026, 3, 10)
+
+
+def test_sin_hueco_en_el_horizonte_retorna_none():
+    # Ventana de 5 minutos ocupada en el medio todos los días
+    ocupados = [_local(10 + d, 12, 2) for d in range(4)]
+    assert find_retry_slot(_local(10, 8), ocupados, '12:00', 5 / 60, horizon_days=3) is None
+
+
+# ---- fallar_publicacion con FakeSupabase ----
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(poster_prd, 'supabase', fake)
+    monkeypatch.setattr(poster_prd, '_LEASE_DISPONIBLE', True)
+    monkeypatch.setattr(poster_prd, '_RPC_TRANSICION_DISPONIBLE', True)
+    monkeypatch.setattr(poster_prd, '_RPC_SCHEDULED_TIME_DISPONIBLE', True)
+    monkeypatch.setattr(poster_prd, 'create_evento_sistema', lambda *a, **k: None)
+    fake.seed('contenidos', [{'id': 'c1', 'modelo_id': 'm1'}, {'id': 'c2', 'modelo_id': 'm1'}])
+    return fake
+
+
+def _publicacion(fake, pub_id='p1', intentos=0):
+    fila = {'id': pub_id, 'contenido_id': 'c1', 'estado': 'procesando', 'intentos': intentos,
+            'lease_owner': poster_prd.POSTER_ID,
+            'scheduled_time': dt.datetime.now(dt.timezone.utc).isoformat()}
+    fake.seed('publicaciones', [fila])
+    config = {'hora_inicio': '00:00', 'ventana_horas': 23.9}
+    return {**fila, 'contenidos': {'id': 'c1', 'modelo_id': 'm1',
+                                   'modelos': {'id': 'm1', 'configuracion_distribucion': config}}}
+
+
+def test_fallo_reintentable_vuelve_a_programada_en_un_slot_libre(fake):
+    otra = dt.datetime.now(dt.timezone.utc) + dt.timedelta(minutes=30)
+    fake.seed('publicaciones', [{'id': 'otra', 'contenido_id': 'c2', 'estado': 'programada',
+                                 'scheduled_time': otra.isoformat()}])
+    pub = _publicacion(fake)
+
+    assert poster_prd.fallar_publicacion(pub, 'm1', 'net down', 'network', 'pre_upload')
+    fila = fake.get('publicaciones', 'p1')
+    assert (fila['estado'], fila['intentos'], fila['lease_owner']) == ('programada', 1, None)
+    slot = dt.datetime.fromisoformat(fila['scheduled_time'])
+    assert slot > dt.datetime.now(dt.timezone.utc)
+    assert abs(slot - otra) >= dt.timedelta(minutes=retry_policy.RETRY_GAP_MINUTES)
+
+
+def test_fallo_a_mitad_de_subida_queda_fallido_para_revision(fake):
+    pub = _publicacion(fake)
+    assert poster_prd.fallar_publicacion(pub, 'm1', 'socket hang up', 'network', 'upload')
+    fila = fake.get('publicaciones', 'p1')
+    assert fila['estado'] == 'fallido'
+    assert fila['ultimo_error'].startswith("Revisar manualmente")
+
+
+def test_sin_intentos_restantes_queda_fallido(fake):
+    pub = _publicacion(fake, intentos=retry_policy.MAX_INTENTOS - 1)
+    assert poster_prd.fallar_publicacion(pub, 'm1', 'net down', 'network', 'pre_upload')
+    fila = fake.get('publicaciones', 'p1')
+    assert (fila['estado'], fila['intentos']) == ('fallido', retry_policy.MAX_INTENTOS)
+    assert fila['ultimo_error'] == 'net down'
+
+
+def test_rpc_sin_p_scheduled_time_solo_desactiva_la_rpc_para_reintentos(fake):
+    # Versión de rpc_transicionar_publicacion.sql anterior a p_scheduled_time
+    nueva = PRD_FUNCTIONS['transicionar_publicacion']
+
+    def transicionar_antigua(db, p_publicacion_id, p_estado, p_ultimo_error=None, p_url_publicacion=None,
+                             p_incrementar_intentos=False, p_lease_owner=None, p_evento_tipo=None,
+                             p_evento_descripcion='', p_modelo_id=None, p_realizado_por='sistema'):
+        return nueva(db, p_publicacion_id, p_estado, p_ultimo_error, p_url_publicacion,
+                     p_incrementar_intentos, p_lease_owner, p_evento_tipo, p_evento_descripcion,
+                     p_modelo_id, p_realizado_por)
+    fake.register_function('transicionar_publicacion', transicionar_antigua)
+
+    pub = _publicacion(fake)
+    assert poster_prd.fallar_publicacion(pub, 'm1', 'net down', 'network', 'pre_upload')
+    fila = fake.get('publicaciones', 'p1')
+    assert (fila['estado'], fila['intentos'], fila['lease_owner']) == ('programada', 1, None)
+    assert dt.datetime.fromisoformat(fila['scheduled_time']) > dt.datetime.now(dt.timezone.utc)
+    assert poster_prd._RPC_SCHEDULED_TIME_DISPONIBLE is False
+    assert poster_prd._RPC_TRANSICION_DISPONIBLE is True
+
+    # El resto de las transiciones sigue por la RPC (estado + evento atómicos)
+    _publicacion(fake, 'p2')
+    fake.reset_counters()
+    assert poster_prd.transicionar_publicacion('p2', 'publicado', 'publicacion_exitosa',
+                                               lease_owner=poster_prd.POSTER_ID)
+    assert fake.query_log == [('rpc', 'transicionar_publicacion')]
+    assert fake.get('publicaciones', 'p2')['estado'] == 'publicado'
+    assert [e['tipo'] for e in fake.tables['eventos_sistema']] == ['publicacion_exitosa']
@@ -0,0 +1,310 @@
+"""Scheduler PRD: índice de ocupación, pre-check paginado, RPC programar_contenido, cursor y grupos por modelo"""
+
+import datetime as dt
+import threading
+
+import pytest
+
+import scheduler_prd
+from fake_supabase import FakeAPIError, FakeSupabase
+from slot_allocator import MAX_CONTENIDOS_POR_DIA
+
+TZ = dt.timezone(dt.timedelta(hours=-5))
+AHORA = dt.datetime(2026, 3, 10, 8, 0, tzinfo=TZ)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(scheduler_prd, 'supabase', fake)
+    monkeypatch.setattr(scheduler_prd, 'now_tz', lambda: AHORA)
+    monkeypatch.setattr(scheduler_prd, '_RPC_PROGRAMAR_DISPONIBLE', True)
+    scheduler_prd.reset_cycle_cache()
+    scheduler_prd._DAY_CURSOR.clear()
+    fake.seed('contenidos', [{'id': f'{m}c{i}', 'modelo_id': m, 'estado': 'nuevo'}
+                             for m in ('m1', 'm2') for i in range(8)])
+    yield fake
+    scheduler_prd.reset_cycle_cache()
+    scheduler_prd._DAY_CURSOR.clear()
+
+
+def _pub(pub_id, contenido_id, dia, hora, minuto=0, estado='programada'):
+    scheduled = dt.datetime(2026, 3, dia, hora, minuto, tzinfo=TZ)
+    return {'id': pub_id, 'contenido_id': contenido_id, 'estado': estado,
+            'scheduled_time': scheduled.isoformat()}
+
+
+def _selects(fake, tabla='publicaciones'):
+    return fake.query_log.count(('select', tabla))
+
+
+# ---- Índice de ocupación ----
+
+def test_indice_por_dia_solo_del_modelo_y_estados_activos(fake):
+    fake.seed('publicaciones', [
+        _pub('p1', 'm1c0', 10, 12),
+        _pub('p2', 'm1c0', 10, 13),
+        _pub('p3', 'm1c1', 10, 14, estado='publicado'),
+        _pub('p4', 'm1c2', 10, 15, estado='fallido'),
+        _pub('p5', 'm1c3', 11, 12, estado='procesando'),
+        _pub('p6', 'm2c0', 10, 12),
+        # Fuera de la ventana [hoy, hoy + MAX_DAYS_AHEAD]
+        _pub('p7', 'm1c4', 9, 12),
+    ])
+
+    index = scheduler_prd.load_occupancy_index('m1')
+    assert sorted(index) == ['2026-03-10', '2026-03-11']
+    assert index['2026-03-10']['contenidos'] == {'m1c0', 'm1c1'}
+    assert len(index['2026-03-10']['slots']) == 3
+    assert index['2026-03-11']['contenidos'] == {'m1c3'}
+
+
+def test_indice_paginado_lee_todas_las_filas(fake, monkeypatch):
+    monkeypatch.setattr(scheduler_prd, 'PRECHECK_PAGE_SIZE', 3)
+    fake.seed('publicaciones', [_pub(f'p{i}', f'm1c{i}', 10 + i, 12) for i in range(7)])
+
+    fake.reset_counters()
+    index = scheduler_prd.load_occupancy_index('m1')
+    assert sum(len(d['slots']) for d in index.values()) == 7
+    # 3 + 3 + 1: la página corta termina la lectura
+    assert _selects(fake) == 3
+
+
+def test_indice_cacheado_por_ciclo_e_invalidado_al_reiniciar(fake):
+    fake.seed('publicaciones', [_pub('p1', 'm1c0', 10, 12)])
+    fake.reset_counters()
+
+    index = scheduler_prd.get_occupancy_index('m1')
+    assert scheduler_prd.get_occupancy_index('m1') is index
+    assert _selects(fake) == 1
+
+    nuevo = dt.datetime(2026, 3, 10, 14, tzinfo=TZ)
+    scheduler_prd.register_occupancy('m1', 'm1c1', [nuevo])
+    assert index['2026-03-10']['contenidos'] == {'m1c0', 'm1c1'}
+    assert not index['2026-03-10']['slots'].is_free(nuevo)
+
+    # Publicación cancelada por fuera del scheduler: el siguiente ciclo la ve
+    fake.get('publicaciones', 'p1')['estado'] = 'cancelada'
+    scheduler_prd.reset_cycle_cache()
+    assert scheduler_prd.get_occupancy_index('m1') == {}
+    assert _selects(fake) == 2
+
+
+def test_error_cargando_el_indice_no_se_cachea(fake):
+    fake.seed('publicaciones', [_pub('p1', 'm1c0', 10, 12)])
+    fake.fail_next = FakeAPIError("upstream timeout", code='PGRST000')
+
+    assert scheduler_prd.get_occupancy_index('m1') == {}
+    assert '2026-03-10' in scheduler_prd.get_occupancy_index('m1')
+
+
+# ---- Pre-check paginado ----
+
+def test_precheck_paginado_agrupa_por_contenido_y_estado(fake, monkeypatch):
+    monkeypatch.setattr(scheduler_prd, 'PRECHECK_PAGE_SIZE', 2)
+    monkeypatch.setattr(scheduler_prd, 'MAX_SAME_VIDEO', 3)
+    fake.seed('publicaciones', [
+        _pub('p1', 'm1c0', 10, 12, estado='fallido'),
+        _pub('p2', 'm1c0', 10, 13, estado='fallido'),
+        _pub('p3', 'm1c0', 10, 14, estado='cancelada'),
+        _pub('p4', 'm1c1', 10, 15),
+        _pub('p5', 'm2c0', 10, 16),
+    ])
+
+    fake.reset_counters()
+    assert scheduler_prd.load_publicaciones_counts(['m1c0', 'm1c1', 'm1c2', 'm1c0'])
+    # 4 filas en páginas de 2: la tercera (vacía) cierra la lectura
+    assert _selects(fake) == 3
+    assert scheduler_prd._PUBLICACIONES_COUNT_CACHE == {
+        'm1c0': {'fallido': 2, 'cancelada': 1},
+        'm1c1': {'programada': 1},
+        'm1c2': {},
+    }
+
+    # Ya cargados: ni las comprobaciones ni una segunda carga consultan la BD
+    fake.reset_counters()
+    assert scheduler_prd.load_publicaciones_counts(['m1c0'])
+    assert not scheduler_prd.check_idempotencia('m1c0')
+    assert scheduler_prd.check_limits('m1c0')
+    assert scheduler_prd.check_idempotencia('m1c1')
+    assert not scheduler_prd.check_limits('m1c2')
+    assert fake.query_log == []
+
+
+def test_precheck_con_error_no_cachea_el_bloque(fake):
+    fake.fail_next = FakeAPIError("upstream timeout", code='PGRST000')
+    assert scheduler_prd.load_publicaciones_counts(['m1c0']) is False
+    assert 'm1c0' not in scheduler_prd._PUBLICACIONES_COUNT_CACHE
+
+
+# ---- programar_contenido: RPC y fallback ----
+
+def _cuentas(n=2):
+    return [{'id': f'cuenta{i}', 'plataforma_nombre': f'plat{i}'} for i in range(n)]
+
+
+def _times(n=2):
+    return [dt.datetime(2026, 3, 10, 12 + i, tzinfo=TZ) for i in range(n)]
+
+
+def test_programar_contenido_por_rpc(fake):
+    fake.reset_counters()
+    assert scheduler_prd.programar_contenido({'id': 'm1c0'}, _cuentas(), _times())
+    assert fake.query_log == [('rpc', 'programar_contenido')]
+    assert fake.get('contenidos', 'm1c0')['estado'] == 'aprobado'
+    assert sorted(p['cuenta_plataforma_id'] for p in fake.tables['publicaciones']) == ['cuenta0', 'cuenta1']
+
+
+def test_programar_contenido_sin_rpc_usa_insert_y_update(fake):
+    del fake.functions['programar_contenido']
+
+    fake.reset_counters()
+    assert scheduler_prd.programar_contenido({'id': 'm1c0'}, _cuentas(), _times())
+    assert scheduler_prd._RPC_PROGRAMAR_DISPONIBLE is False
+    assert fake.query_log == [('rpc', 'programar_contenido'), ('insert', 'publicaciones'),
+                              ('update', 'contenidos')]
+    assert fake.get('contenidos', 'm1c0')['estado'] == 'aprobado'
+
+    # PGRST202 desactiva la RPC para el resto del proceso
+    fake.reset_counters()
+    assert scheduler_prd.programar_contenido({'id': 'm1c1'}, _cuentas(1), _times(1))
+    assert fake.query_log == [('insert', 'publicaciones'), ('update', 'contenidos')]
+
+
+def test_programar_contenido_error_de_la_rpc_no_hace_fallback(fake):
+    fake.get('contenidos', 'm1c0')['estado'] = 'aprobado'
+
+    fake.reset_counters()
+    assert scheduler_prd.programar_contenido({'id': 'm1c0'}, _cuentas(), _times()) is False
+    assert scheduler_prd._RPC_PROGRAMAR_DISPONIBLE is True
+    assert fake.query_log == [('rpc', 'programar_contenido')]
+    assert not fake.tables.get('publicaciones')
+
+
+def test_programar_contenido_mismatch_no_llama_a_la_bd(fake):
+    fake.reset_counters()
+    assert scheduler_prd.programar_contenido({'id': 'm1c0'}, _cuentas(2), _times(1)) is False
+    assert fake.query_log == []
+
+
+# ---- Cursor de primer día libre ----
+
+def _llenar_dias(fake, dias):
+    """Deja cada día con MAX_CONTENIDOS_POR_DIA contenidos distintos de m1"""
+    fake.seed('publicaciones', [
+        _pub(f'lleno{dia}_{i}', f'm1c{i}', dia, 12, 20 * i)
+        for dia in dias for i in range(MAX_CONTENIDOS_POR_DIA)
+    ])
+
+
+@pytest.fixture
+def dias_consultados(monkeypatch):
+    consultados = []
+    original = scheduler_prd._distinct_contenidos_on_date
+
+    def distinct(modelo_id, date_str):
+        consultados.append(date_str)
+        return original(modelo_id, date_str)
+    monkeypatch.setattr(scheduler_prd, '_distinct_contenidos_on_date', distinct)
+    return consultados
+
+
+def test_cursor_avanza_y_no_recorre_dias_llenos(fake, dias_consultados):
+    _llenar_dias(fake, [10, 11, 12])
+
+    times = scheduler_prd.calculate_scheduled_times('m1', 2, '12:00', 5)
+    assert {t.date() for t in times} == {dt.date(2026, 3, 13)}
+    assert dias_consultados == ['2026-03-10', '2026-03-11', '2026-03-12', '2026-03-13']
+    cursor = scheduler_prd._DAY_CURSOR[('m1', 2, '12:00', 5)]
+    assert cursor['dia'] == dt.date(2026, 3, 13)
+
+    # Ciclo siguiente: empieza en el cursor
+    scheduler_prd.reset_cycle_cache()
+    dias_consultados.clear()
+    times = scheduler_prd.calculate_scheduled_times('m1', 2, '12:00', 5)
+    assert {t.date() for t in times} == {dt.date(2026, 3, 13)}
+    assert dias_consultados == ['2026-03-13']
+
+
+def test_cursor_se_descarta_si_un_dia_saltado_se_libera(fake, dias_consultados):
+    _llenar_dias(fake, [10, 11, 12])
+    scheduler_prd.calculate_scheduled_times('m1', 1, '12:00', 5)
+
+    # El poster (otro proceso) falla una publicación del día 11
+    fake.get('publicaciones', 'lleno11_0')['estado'] = 'fallido'
+    scheduler_prd.reset_cycle_cache()
+    dias_consultados.clear()
+
+    times = scheduler_prd.calculate_scheduled_times('m1', 1, '12:00', 5)
+    assert times[0].date() == dt.date(2026, 3, 11)
+    assert dias_consultados[0] == '2026-03-10'
+    assert scheduler_prd._DAY_CURSOR[('m1', 1, '12:00', 5)]['dia'] == dt.date(2026, 3, 11)
+
+
+def test_sin_espacio_deja_el_cursor_tras_la_ventana(fake, monkeypatch):
+    monkeypatch.setattr(scheduler_prd, 'MAX_DAYS_AHEAD', 2)
+    _llenar_dias(fake, [10, 11, 12])
+
+    with pytest.raises(ValueError, match="sin_espacio"):
+        scheduler_prd.calculate_scheduled_times('m1', 1, '12:00', 5)
+    assert scheduler_prd._DAY_CURSOR[('m1', 1, '12:00', 5)]['dia'] == dt.date(2026, 3, 13)
+
+
+# ---- Agrupación por modelo ----
+
+def test_group_by_modelo_conserva_el_orden():
+    contenidos = [{'id': 'a', 'modelos': {'id': 'm1'}}, {'id': 'b', 'modelo_id': 'm2'},
+                  {'id': 'c', 'modelos': {'id': 'm1'}}, {'id': 'd'}]
+    grupos = scheduler_prd.group_by_modelo(contenidos)
+    assert {m: [c['id'] for c in g] for m, g in grupos.items()} == {'m1': ['a', 'c'], 'm2': ['b'], None: ['d']}
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_process_contenidos_serie_por_modelo_y_fallos_aislados(monkeypatch, workers):
+    monkeypatch.setattr(scheduler_prd, 'SCHEDULER_MAX_WORKERS', workers)
+    vistos = {}
+    lock = threading.Lock()
+
+    def process(contenido):
+        with lock:
+            vistos.setdefault(contenido['modelo_id'], []).append((contenido['id'], threading.current_thread().name))
+        if contenido['id'] == 'm1-1':
+            raise RuntimeError("boom")
+        return contenido['id'] != 'm2-0'
+    monkeypatch.setattr(scheduler_prd, 'process_contenido', process)
+
+    contenidos = [{'id': f'{m}-{i}', 'modelo_id': m} for i in range(3) for m in ('m1', 'm2', 'm3')]
+    assert scheduler_prd.process_contenidos(contenidos) == (7, 2)
+
+    for m in ('m1', 'm2', 'm3'):
+        assert [c for c, _ in vistos[m]] == [f'{m}-{i}' for i in range(3)]
+        # Un modelo se procesa entero en un solo hilo
+        assert len({hilo for _, hilo in vistos[m]}) == 1
+
+
+def test_run_cycle_programa_todos_los_modelos_sin_choques(fake, monkeypatch):
+    monkeypatch.setattr(scheduler_prd, 'SCHEDULER_MAX_WORKERS', 4)
+    fake.tables['contenidos'] = []
+    fake.seed('plataformas', [{'id': 'pk', 'nombre': 'kams', 'activa': True},
+                              {'id': 'px', 'nombre': 'xxxfollow', 'activa': True}])
+    config = {'plataformas': ['kams', 'xxxfollow'], 'hora_inicio': '12:00', 'ventana_horas': 5}
+    for m in ('m1', 'm2'):
+        fake.seed('modelos', [{'id': m, 'nombre': m, 'configuracion_distribucion': config}])
+        fake.seed('cuentas_plataforma', [{'id': f'{m}-{p}', 'modelo_id': m, 'plataforma_id': p}
+                                         for p in ('pk', 'px')])
+        fake.seed('contenidos', [{'id': f'{m}c{i}', 'modelo_id': m, 'estado': 'nuevo',
+                                  'recibido_at': f'2026-03-10T0{i}:00:00'} for i in range(5)])
+
+    assert scheduler_prd.run_cycle() == (10, 0)
+    assert all(c['estado'] == 'aprobado' for c in fake.tables['contenidos'])
+
+    gap = dt.timedelta(minutes=scheduler_prd.MIN_GAP_MINUTES)
+    for m in ('m1', 'm2'):
+        pubs = [p for p in fake.tables['publicaciones'] if p['cuenta_plataforma_id'].startswith(m)]
+        assert len(pubs) == 10
+        slots = sorted(dt.datetime.fromisoformat(p['scheduled_time']) for p in pubs)
+        assert all(b - a >= gap for a, b in zip(slots, slots[1:]))
+        por_dia = {}
+        for p in pubs:
+            por_dia.setdefault(p['scheduled_time'][:10], set()).add(p['contenido_id'])
+        assert all(len(c) <= MAX_CONTENIDOS_POR_DIA for c in por_dia.values())
@@ -0,0 +1,115 @@
+"""SlotAllocator: equivalencia con _build_slots_for_day original y garantías de colocación"""
+
+import datetime as dt
+import random
+
+import pytest
+
+import scheduler_prd
+from bench_slot_allocator import TZ, build_slots_for_day_legacy, random_case
+from fake_supabase import FakeSupabase
+from slot_allocator import MAX_CONTENIDOS_POR_DIA, SlotAllocator
+
+CASOS = 500
+
+
+def _allocator_slots(case):
+    allocator = SlotAllocator(case["gap"], case["occupied"])
+    antes = allocator.slots()
+    end = case["start"] + dt.timedelta(hours=case["hours"])
+    slots = allocator.find_n_slots(case["start"], end, case["n"], not_before=case["now"])
+    # find_n_slots no reserva: el caller decide
+    assert allocator.slots() == antes
+    return slots
+
+
+def _casos():
+    rng = random.Random(42)
+    return [random_case(rng) for _ in range(CASOS)]
+
+
+@pytest.mark.parametrize('semilla, case', list(enumerate(_casos())))
+def test_mismos_slots_que_el_original(semilla, case):
+    random.seed(semilla)
+    esperado = build_slots_for_day_legacy(case["n"], case["start"], case["hours"], list(case["occupied"]),
+                                          case["gap"], case["now"])
+    random.seed(semilla)
+    assert _allocator_slots(case) == esperado
+
+
+@pytest.mark.parametrize('case', _casos())
+def test_slots_en_ventana_despues_de_ahora_y_con_gap(case):
+    slots = _allocator_slots(case)
+    gap = dt.timedelta(minutes=case["gap"])
+    end = case["start"] + dt.timedelta(hours=case["hours"])
+
+    assert len(slots) <= case["n"]
+    assert slots == sorted(slots)
+    for i, slot in enumerate(slots):
+        assert case["start"] <= slot <= end
+        assert slot >= case["now"]
+        assert all(abs(slot - o) >= gap for o in case["occupied"])
+        assert all(otro - slot >= gap for otro in slots[i + 1:])
+
+
+def test_reserve_release_restauran_el_estado():
+    rng = random.Random(7)
+    base = dt.datetime(2026, 1, 15, tzinfo=TZ)
+    ocupados = [base + dt.timedelta(minutes=rng.randint(0, 24 * 60 - 1)) for _ in range(30)]
+    allocator = SlotAllocator(10, ocupados)
+    inicial = allocator.slots()
+
+    t = base + dt.timedelta(hours=30)
+    allocator.reserve(t)
+    assert not allocator.is_free(t + dt.timedelta(minutes=9))
+    assert allocator.is_free(t + dt.timedelta(minutes=10))
+    assert allocator.release(t) is True
+    assert allocator.release(t) is False
+    assert allocator.slots() == inicial
+    assert allocator.slots() == sorted(ocupados)
+
+
+# ---- Tope diario en el scheduler (ocupación aleatoria) ----
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    fake = FakeSupabase()
+    monkeypatch.setattr(scheduler_prd, 'supabase', fake)
+    scheduler_prd.reset_cycle_cache()
+    scheduler_prd._DAY_CURSOR.clear()
+    yield fake
+    scheduler_prd.reset_cycle_cache()
+    scheduler_prd._DAY_CURSOR.clear()
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_scheduler_respeta_tope_diario_y_gap(scheduler, semilla):
+    rng = random.Random(semilla)
+    hoy = scheduler_prd.now_tz().replace(hour=0, minute=0, second=0, microsecond=0)
+    contenidos = [{'id': f'c{i}', 'modelo_id': 'm1'} for i in range(12)]
+    scheduler.seed('contenidos', contenidos)
+    scheduler.seed('publicaciones', [
+        {'id': f'p{i}', 'contenido_id': rng.choice(contenidos)['id'], 'estado': 'programada',
+         'scheduled_time': (hoy + dt.timedelta(days=rng.randint(0, 6), hours=12,
+                                               minutes=rng.randint(0, 299))).isoformat()}
+        for i in range(40)
+    ])
+
+    indice = scheduler_prd.get_occupancy_index('m1')
+    for i in range(15):
+        times = scheduler_prd.calculate_scheduled_times('m1', rng.randint(1, 3), '12:00', 5)
+        scheduler_prd.register_occupancy('m1', f'nuevo{i}', times)
+
+    gap = dt.timedelta(minutes=scheduler_prd.MIN_GAP_MINUTES)
+    for dia, entrada in indice.items():
+        nuevos = {c for c in entrada["contenidos"] if c.startswith('nuevo')}
+        if nuevos:
+            assert len(entrada["contenidos"]) <= MAX_CONTENIDOS_POR_DIA, dia
+    # Ningún slot nuevo a menos del gap de otro
+    todos = sorted(s for entrada in indice.values() for s in entrada["slots"].slots())
+    originales = {scheduler_prd._parse_scheduled_time(p['scheduled_time'])
+                  for p in scheduler.tables['publicaciones']}
+    for a, b in zip(todos, todos[1:]):
+        if a in originales and b in originales:
+            continue
+        assert b - a >= gap
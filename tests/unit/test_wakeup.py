@@ -0,0 +1,116 @@
+"""Avisos entre procesos: un socket por oyente, huérfanos y backoff"""
+
+import shutil
+import socket
+import tempfile
+from pathlib import Path
+
+import pytest
+
+import wakeup
+from wakeup import AdaptiveBackoff, WakeupListener, notify
+
+
+@pytest.fixture
+def wakeup_dir(monkeypatch):
+    # Ruta corta: sun_path admite ~108 bytes
+    path = Path(tempfile.mkdtemp(prefix="wk"))
+    monkeypatch.setattr(wakeup, 'WAKEUP_DIR', path)
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _listener(monkeypatch, canal, pid):
+    monkeypatch.setattr(wakeup.os, 'getpid', lambda: pid)
+    return WakeupListener(canal)
+
+
+def _huerfano(path):
+    """Socket que quedó en disco tras morir su proceso sin close()"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(str(path))
+    sock.close()
+
+
+def test_notify_despierta_al_oyente_y_agrupa_avisos(wakeup_dir):
+    listener = WakeupListener('poster')
+    try:
+        assert listener.wait(0) is False
+        assert notify('poster') and notify('poster')
+        assert listener.wait(1) is True
+        assert listener.wait(0) is False
+    finally:
+        listener.close()
+    assert not listener.path.exists()
+    assert notify('poster') is False
+
+
+def test_cada_proceso_tiene_su_socket_y_todos_despiertan(wakeup_dir, monkeypatch):
+    a = _listener(monkeypatch, 'poster', 100)
+    b = _listener(monkeypatch, 'poster', 200)
+    otro = _listener(monkeypatch, 'scheduler', 300)
+    try:
+        assert a.path != b.path
+        assert notify('poster') is True
+        assert a.wait(1) and b.wait(1)
+        assert otro.wait(0) is False
+    finally:
+        for listener in (a, b, otro):
+            listener.close()
+
+
+def test_oyente_vivo_no_pierde_su_socket(wakeup_dir, monkeypatch):
+    vivo = _listener(monkeypatch, 'poster', 100)
+    # Segundo oyente con la misma ruta: no la borra, queda solo con polling
+    segundo = _listener(monkeypatch, 'poster', 100)
+    try:
+        assert vivo.sock is not None
+        assert segundo.sock is None
+        assert notify('poster') is True
+        assert vivo.wait(1) is True
+    finally:
+        segundo.close()
+        vivo.close()
+
+
+def test_socket_huerfano_se_reemplaza_al_arrancar(wakeup_dir, monkeypatch):
+    _huerfano(wakeup.socket_path('poster', 100))
+
+    listener = _listener(monkeypatch, 'poster', 100)
+    try:
+        assert listener.sock is not None
+        assert notify('poster') is True
+        assert listener.wait(1) is True
+    finally:
+        listener.close()
+
+
+def test_notify_borra_los_sockets_huerfanos(wakeup_dir, monkeypatch):
+    huerfano = wakeup.socket_path('poster', 100)
+    _huerfano(huerfano)
+    listener = _listener(monkeypatch, 'poster', 200)
+    try:
+        assert notify('poster') is True
+        assert not huerfano.exists()
+        assert listener.wait(1) is True
+    finally:
+        listener.close()
+    assert notify('poster') is False
+
+
+def test_notify_no_bloquea_con_la_cola_llena(wakeup_dir):
+    listener = WakeupListener('poster')
+    try:
+        # El oyente está ocupado y no drena: notify sigue retornando
+        for _ in range(2000):
+            assert notify('poster') is True
+        assert listener.wait(1) is True
+    finally:
+        listener.close()
+
+
+def test_backoff_se_duplica_hasta_el_maximo_y_reset():
+    backoff = AdaptiveBackoff(10, 35)
+    assert [backoff.next() for _ in range(4)] == [10, 20, 35, 35]
+    backoff.reset()
+    assert backoff.next() == 10
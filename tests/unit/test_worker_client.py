@@ -0,0 +1,238 @@
+"""Cliente de workers: protocolo NDJSON de eventos, etapa del upload y host → subprocess"""
+
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import worker_client
+from worker_client import TAIL_LINES, WorkerEventStream
+
+
+def _ev(**campos):
+    return json.dumps(campos)
+
+
+def _stream(lineas, on_event=None):
+    stream = WorkerEventStream(on_event)
+    for linea in lineas:
+        stream.feed(linea + "\n")
+    return stream
+
+
+# ---- WorkerEventStream ----
+
+def test_eventos_ndjson_con_prefijo_y_lineas_de_log():
+    eventos = []
+    stream = _stream([
+        "Running 1 test using 1 worker",
+        "[chromium] › kams.js:12 " + _ev(event="progress", stage="pre_upload", message="login"),
+        "",
+        '{"event": roto',
+        _ev(event="result", success=True, url="https://k/v/1", external_id="1"),
+    ], eventos.append)
+
+    assert [e['event'] for e in eventos] == ['progress', 'result']
+    assert stream.result_event['url'] == "https://k/v/1"
+    # Los eventos no van al tail; las líneas vacías tampoco
+    assert list(stream.tail) == ["Running 1 test using 1 worker", '{"event": roto']
+
+
+def test_tail_acotado_y_callback_que_falla_no_corta_el_stream():
+    def revienta(evento):
+        raise RuntimeError("callback roto")
+
+    stream = _stream([f"linea {i}" for i in range(TAIL_LINES + 5)]
+                     + [_ev(event="error", message="x", error_class="network")], revienta)
+    assert len(stream.tail) == TAIL_LINES
+    assert stream.tail[0] == "linea 5"
+    assert stream.error_event['error_class'] == "network"
+
+
+def test_la_etapa_es_la_ultima_informada():
+    stream = _stream([
+        _ev(event="progress", stage="pre_upload"),
+        _ev(event="progress", message="sin etapa"),
+        _ev(event="progress", stage="upload"),
+        _ev(event="progress", stage="uploaded"),
+        _ev(event="error", message="timeout esperando la url", error_class="timeout"),
+    ])
+    result = stream.build_result(False, "host", time.monotonic())
+    assert (result.success, result.stage, result.error_class) == (False, "uploaded", "timeout")
+    assert _stream(["solo log"]).build_result(False, "host", time.monotonic()).stage is None
+
+
+@pytest.mark.parametrize('lineas, exit_ok, esperado', [
+    # 'result' exitoso manda aunque después haya error y exit code != 0: no re-subir
+    ([_ev(event="result", success=True, url="u"), _ev(event="error", message="cierre")], False, (True, None, None)),
+    # 'result' fallido: el mensaje y la clase salen del evento de error
+    ([_ev(event="error", message="rechazado", error_class="rejected"), _ev(event="result", success=False)],
+     True, (False, "rechazado", "rejected")),
+    # Solo error: falla aunque el proceso salga con 0; sin clase es 'unknown'
+    ([_ev(event="error", message="boom")], True, (False, "boom", "unknown")),
+    # Sin eventos: el exit code decide
+    (["ok"], True, (True, None, None)),
+    (["fallo 1", "fallo 2"], False, (False, "fallo 1\nfallo 2", "unknown")),
+    ([], False, (False, "Error desconocido", "unknown")),
+])
+def test_que_evento_decide_el_resultado(lineas, exit_ok, esperado):
+    result = _stream(lineas).build_result(exit_ok, "subprocess", time.monotonic())
+    assert (result.success, result.error, result.error_class) == esperado
+    assert result.via == "subprocess"
+
+
+def test_sin_result_el_error_toma_las_ultimas_lineas():
+    result = _stream([f"l{i}" for i in range(15)]).build_result(False, "host", time.monotonic())
+    assert result.error == "\n".join(f"l{i}" for i in range(5, 15))
+
+
+# ---- run_worker: host persistente y fallback a subprocess ----
+
+@pytest.fixture
+def host_socket(monkeypatch):
+    # Ruta corta: sun_path admite ~108 bytes
+    directorio = Path(tempfile.mkdtemp(prefix="wh"))
+    path = directorio / "worker_host.sock"
+    monkeypatch.setattr(worker_client, 'WORKER_HOST_SOCKET', path)
+    yield path
+    shutil.rmtree(directorio, ignore_errors=True)
+
+
+class _FakeHost:
+    """Worker host de una conexión que responde con mensajes guionados"""
+
+    def __init__(self, path, mensajes):
+        self.pedidos = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(str(path))
+        self.server.listen(1)
+        self.thread = threading.Thread(target=self._serve, args=(mensajes,), daemon=True)
+        self.thread.start()
+
+    def _serve(self, mensajes):
+        conn, _ = self.server.accept()
+        with conn, conn.makefile('r', encoding='utf-8') as lector:
+            self.pedidos.append(json.loads(lector.readline()))
+            for mensaje in mensajes:
+                conn.sendall((json.dumps(mensaje) + "\n").encode('utf-8'))
+
+    def close(self):
+        self.thread.join(5)
+        self.server.close()
+
+
+@pytest.fixture
+def npx(monkeypatch):
+    """Reemplaza `npx playwright test` por un proceso Python que imprime las líneas guionadas"""
+    guion = {'lineas': [], 'exit': 0, 'dormir': 0}
+    llamadas = []
+    popen = subprocess.Popen
+
+    def fake_popen(args, **kwargs):
+        llamadas.append(args)
+        codigo = (f"import sys, time\n"
+                  f"for l in {guion['lineas']!r}: print(l, flush=True)\n"
+                  f"time.sleep({guion['dormir']})\n"
+                  f"sys.exit({guion['exit']})\n")
+        return popen([sys.executable, "-c", codigo], **kwargs)
+    monkeypatch.setattr(worker_client.subprocess, 'Popen', fake_popen)
+    guion['llamadas'] = llamadas
+    return guion
+
+
+def _run(tmp_path, **kwargs):
+    eventos = []
+    result = worker_client.run_worker(Path("workers/kams.js"), {"MODEL_NAME": "ana"}, tmp_path,
+                                      on_event=eventos.append, **kwargs)
+    return result, eventos
+
+
+def test_sin_host_usa_el_subprocess(tmp_path, host_socket, npx):
+    npx['lineas'] = [_ev(event="progress", stage="upload"),
+                     _ev(event="result", success=True, url="https://k/v/2", stage="uploaded")]
+    result, eventos = _run(tmp_path)
+
+    assert npx['llamadas'] == [["npx", "playwright", "test", "workers/kams.js"]]
+    assert (result.success, result.via, result.url, result.stage) == (True, "subprocess", "https://k/v/2", "uploaded")
+    assert [e['event'] for e in eventos] == ['progress', 'result']
+
+
+def test_job_en_el_host(tmp_path, host_socket, npx):
+    host = _FakeHost(host_socket, [
+        {"type": "log", "line": "cargando sesión"},
+        {"type": "log", "line": _ev(event="progress", stage="upload")},
+        {"type": "log", "line": _ev(event="result", success=True, url="https://k/v/3")},
+        {"type": "result", "ok": True},
+    ])
+    result, eventos = _run(tmp_path, timeout=60)
+    host.close()
+
+    assert host.pedidos == [{"type": "run", "script": "workers/kams.js", "env": {"MODEL_NAME": "ana"},
+                             "timeout_ms": 60000}]
+    assert (result.success, result.via, result.url, result.stage) == (True, "host", "https://k/v/3", "upload")
+    assert npx['llamadas'] == []
+    assert list(result.tail) == ["cargando sesión"]
+
+
+def test_worker_no_soportado_por_el_host_pasa_al_subprocess(tmp_path, host_socket, npx):
+    host = _FakeHost(host_socket, [{"type": "result", "ok": False, "unsupported": True,
+                                    "error": "worker sin export run"}])
+    npx['lineas'] = ["sin eventos"]
+    result, _ = _run(tmp_path)
+    host.close()
+
+    assert (result.success, result.via) == (True, "subprocess")
+    assert len(npx['llamadas']) == 1
+
+
+def test_host_que_se_cae_a_mitad_del_job_no_se_reejecuta(tmp_path, host_socket, npx):
+    host = _FakeHost(host_socket, [{"type": "log", "line": _ev(event="progress", stage="upload")}])
+    result, _ = _run(tmp_path)
+    host.close()
+
+    # El job ya corrió en el host: no se repite por subprocess (podría duplicar el upload)
+    assert npx['llamadas'] == []
+    assert (result.success, result.via, result.stage) == (False, "host", "upload")
+    assert result.error == "Worker host desconectado antes de terminar el job"
+
+
+def test_host_con_error_sin_evento_usa_su_mensaje(tmp_path, host_socket, npx):
+    host = _FakeHost(host_socket, [{"type": "result", "ok": False, "error": "page crashed"}])
+    result, _ = _run(tmp_path)
+    host.close()
+    assert (result.success, result.error, result.error_class) == (False, "page crashed", "unknown")
+
+
+def test_host_que_informa_timeout(tmp_path, host_socket, npx):
+    host = _FakeHost(host_socket, [{"type": "result", "ok": False, "timeout": True, "error": "timeout"}])
+    result, _ = _run(tmp_path, timeout=120)
+    host.close()
+    assert (result.error, result.error_class) == ("Worker timeout (más de 2 minutos)", "timeout")
+
+
+def test_subprocess_con_evento_de_error_se_corta_tras_el_margen(tmp_path, host_socket, npx, monkeypatch):
+    monkeypatch.setattr(worker_client, 'ERROR_GRACE_SECONDS', 0.5)
+    npx['lineas'] = [_ev(event="error", message="login fallido", error_class="auth", stage="pre_upload")]
+    npx['dormir'] = 60
+
+    inicio = time.monotonic()
+    result, _ = _run(tmp_path)
+    assert time.monotonic() - inicio < 10
+    assert (result.success, result.error, result.error_class, result.stage) == \
+        (False, "login fallido", "auth", "pre_upload")
+
+
+def test_subprocess_que_vence_el_timeout(tmp_path, host_socket, npx):
+    npx['lineas'] = ["subiendo"]
+    npx['dormir'] = 60
+
+    result, _ = _run(tmp_path, timeout=1)
+    assert (result.success, result.error_class) == (False, "timeout")
+    assert result.error.startswith("Worker timeout")
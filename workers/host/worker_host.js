@@ -0,0 +1,444 @@
+#!/usr/bin/env node
+/**
+ * Worker Host - Navegador Playwright persistente para el poster
+ *
+ * Mantiene un Chromium abierto y un contexto reutilizable por archivo de
+ * sesión (storageState de cada cuenta). Recibe jobs del poster por un socket
+ * Unix y ejecuta los workers de workers/*.js SIN modificarlos: el host
+ * provee su propio `test` (en lugar de @playwright/test) y un `browser` cuyo
+ * newContext() devuelve el contexto caliente de la cuenta.
+ *
+ * Protocolo (una conexión por job, JSON por línea):
+ *   → {"type": "run", "script": "/abs/workers/kams.js", "env": {...}, "timeout_ms": 300000}
+ *   ← {"type": "log", "stream": "stdout"|"stderr", "line": "..."}   (0..n, en vivo)
+ *   ← {"type": "result", "ok": true|false, "error": "...", "timeout": bool, "unsupported": bool}
+ *
+ *   → {"type": "ping"}   ← {"type": "pong", "contexts": n}
+ *
+ *   → {"type": "warm", "storage_state": "/abs/modelos/x/.auth/user.json"}
+ *   ← {"type": "warmed", "ok": true|false, "error": "...", "contexts": n}
+ *   (lookahead del poster: carga la sesión antes de que llegue el job)
+ *
+ * Los eventos del worker (workers/lib/events.js) viajan como líneas de log,
+ * igual que por stdout en el camino `npx playwright test`.
+ *
+ * "unsupported" indica que el worker usa algo que el host no emula y solo
+ * se reporta si se detecta al cargarlo (fixtures declarados en los tests,
+ * hooks no emulados), antes de ejecutar nada: el poster cae a
+ * `npx playwright test`. Una vez empezado el test, cualquier error es un
+ * fallo normal (re-ejecutarlo podría publicar dos veces).
+ *
+ * Timeout: se cierran las páginas del job y su contexto deja de entregarse
+ * a jobs nuevos (se cierra cuando ningún job lo usa), así un job vencido no
+ * sigue operando la sesión mientras el poster lo reintenta.
+ *
+ * Uso:
+ *   node workers/host/worker_host.js
+ */
+
+const fs = require('fs');
+const os = require('os');
+const net = require('net');
+const path = require('path');
+const util = require('util');
+const vm = require('vm');
+const Module = require('module');
+const { chromium } = require('playwright');
+
+// ==========================================
+// CONFIGURACIÓN
+// ==========================================
+const WAKEUP_DIR = process.env.WAKEUP_DIR || path.join(os.tmpdir(), '100trafico');
+const SOCKET_PATH = process.env.WORKER_HOST_SOCKET || path.join(WAKEUP_DIR, 'worker_host.sock');
+const JOB_TIMEOUT_MS = parseInt(process.env.WORKER_JOB_TIMEOUT_MS || '300000', 10);
+const CONTEXT_IDLE_MS = parseInt(process.env.WORKER_CONTEXT_IDLE_MS || '1800000', 10);
+const HEADLESS = process.env.HEADLESS !== 'false';
+
+// Fixtures de @playwright/test que el host no provee (solo `browser`)
+const UNSUPPORTED_FIXTURES = ['page', 'context', 'request'];
+
+class UnsupportedError extends Error {}
+
+// ==========================================
+// NAVEGADOR Y CONTEXTOS
+// ==========================================
+let browserPromise = null;
+// storageState (ruta absoluta) -> { key, promise, mtimeMs, jobs, lastUsed, retired }
+const contexts = new Map();
+
+async function getBrowser() {
+  if (browserPromise) {
+    const browser = await browserPromise.catch(() => null);
+    if (browser && browser.isConnected()) return browser;
+  }
+  console.log('🌐 Lanzando Chromium...');
+  browserPromise = chromium.launch({ headless: HEADLESS });
+  const browser = await browserPromise;
+  browser.on('disconnected', () => {
+    console.log('⚠️  Chromium desconectado, se relanzará en el próximo job');
+    contexts.clear();
+  });
+  return browser;
+}
+
+/**
+ * Contexto caliente para un storageState en archivo.
+ * Si el archivo cambió (nuevo login) y nadie lo usa, se recrea.
+ */
+async function acquireContext(options) {
+  const key = path.resolve(options.storageState);
+  const mtimeMs = fs.statSync(key).mtimeMs;
+
+  let entry = contexts.get(key);
+  if (entry && entry.mtimeMs !== mtimeMs && entry.jobs === 0) {
+    contexts.delete(key);
+    entry.promise.then(ctx => ctx.close()).catch(() => {});
+    entry = null;
+  }
+  if (!entry) {
+    entry = {
+      key,
+      promise: getBrowser().then(browser => browser.newContext({ ...options, storageState: key })),
+      mtimeMs,
+      jobs: 0,
+      lastUsed: Date.now(),
+    };
+    contexts.set(key, entry);
+    entry.promise.catch(() => { if (contexts.get(key) === entry) contexts.delete(key); });
+    console.log(`📂 Sesión cargada: ${key}`);
+  }
+
+  entry.jobs += 1;
+  try {
+    return { entry, context: await entry.promise };
+  } catch (e) {
+    entry.jobs -= 1;
+    throw e;
+  }
+}
+
+function releaseContext(entry) {
+  entry.jobs -= 1;
+  entry.lastUsed = Date.now();
+  if (entry.retired && entry.jobs === 0) {
+    entry.promise.then(ctx => ctx.close()).catch(() => {});
+  }
+}
+
+/**
+ * El contexto deja de entregarse a jobs nuevos (el próximo job de la cuenta
+ * recibe uno limpio); se cierra cuando lo liberen los jobs que lo usan.
+ */
+function retireContext(entry) {
+  if (contexts.get(entry.key) === entry) contexts.delete(entry.key);
+  if (!entry.retired) console.log(`🧯 Sesión retirada tras timeout: ${entry.key}`);
+  entry.retired = true;
+}
+
+// Cerrar contextos ociosos para no acumular memoria
+setInterval(() => {
+  const now = Date.now();
+  for (const [key, entry] of contexts) {
+    if (entry.jobs === 0 && now - entry.lastUsed > CONTEXT_IDLE_MS) {
+      contexts.delete(key);
+      entry.promise.then(ctx => ctx.close()).catch(() => {});
+      console.log(`🧹 Sesión cerrada por inactividad: ${key}`);
+    }
+  }
+}, 60000).unref();
+
+// ==========================================
+// EMULACIÓN DEL RUNNER DE PLAYWRIGHT
+// ==========================================
+
+/** `browser` del job: newContext() reutiliza el contexto de la cuenta */
+function makeJobBrowser(job) {
+  return {
+    newContext: async (options = {}) => {
+      if (job.closed) throw new Error('job terminado por timeout');
+      let context;
+      if (typeof options.storageState === 'string') {
+        const acquired = await acquireContext(options);
+        job.entries.push(acquired.entry);
+        context = acquired.context;
+      } else {
+        // Sin sesión en archivo: contexto efímero del job
+        context = await (await getBrowser()).newContext(options);
+        job.ephemeral.push(context);
+      }
+      return contextHandle(context, job);
+    },
+    isConnected: () => true,
+  };
+}
+
+/** Contexto compartido: close() solo cierra las páginas abiertas por el job */
+function contextHandle(context, job) {
+  return new Proxy(context, {
+    get(target, prop) {
+      if (prop === 'newPage') {
+        return async () => {
+          if (job.closed) throw new Error('job terminado por timeout');
+          const page = await target.newPage();
+          job.pages.push(page);
+          return page;
+        };
+      }
+      if (prop === 'close') {
+        return async () => closeJobPages(job);
+      }
+      const value = target[prop];
+      return typeof value === 'function' ? value.bind(target) : value;
+    },
+  });
+}
+
+async function closeJobPages(job) {
+  const pages = job.pages.splice(0);
+  await Promise.all(pages.map(page => page.close().catch(() => {})));
+}
+
+function makeFixtures(job) {
+  const fixtures = { browser: makeJobBrowser(job) };
+  for (const name of UNSUPPORTED_FIXTURES) {
+    // Ya filtrado al cargar (checkFixtures); si llega aquí es un fallo normal
+    Object.defineProperty(fixtures, name, {
+      get() { throw new Error(`fixture '${name}' no soportado por el worker host`); },
+    });
+  }
+  return fixtures;
+}
+
+/**
+ * Fixtures que pide una función de test/hook, leídos de su primer
+ * parámetro (Playwright exige desestructurarlo: `async ({ browser }) => ...`).
+ * null si el parámetro no es un patrón de objeto.
+ */
+function declaredFixtures(fn) {
+  const source = Function.prototype.toString.call(fn);
+  const params = source.match(/^[^(=]*\(\s*\{([^}]*)\}/);
+  if (!params) return /^[^(=]*\(\s*\)/.test(source) ? [] : null;
+  return params[1].split(',').map(p => p.split(/[:=]/)[0].trim()).filter(Boolean);
+}
+
+/** Lanza UnsupportedError si algún test/hook pide un fixture que el host no provee */
+function checkFixtures(collected) {
+  const fns = [...collected.beforeEach, ...collected.tests.map(t => t.fn), ...collected.afterEach];
+  for (const fn of fns) {
+    const names = declaredFixtures(fn);
+    if (names === null) {
+      throw new UnsupportedError('fixtures del test no desestructurados, no se pueden validar');
+    }
+    const unsupported = names.find(name => UNSUPPORTED_FIXTURES.includes(name));
+    if (unsupported) {
+      throw new UnsupportedError(`fixture '${unsupported}' no soportado por el worker host`);
+    }
+  }
+}
+
+/** Reemplazo de `test` de @playwright/test que solo recolecta los tests */
+function makeTestShim(collected) {
+  const test = (title, fn) => collected.tests.push({ title, fn });
+  test.describe = (title, fn) => (typeof title === 'function' ? title() : fn());
+  test.describe.serial = test.describe;
+  test.describe.configure = () => {};
+  test.only = test;
+  test.skip = () => {};
+  test.setTimeout = () => {};
+  test.beforeEach = fn => collected.beforeEach.push(fn);
+  test.afterEach = fn => collected.afterEach.push(fn);
+  test.step = async (title, fn) => fn();
+  // Se llaman al cargar el módulo: se detectan antes de ejecutar nada
+  for (const hook of ['beforeAll', 'afterAll', 'use', 'extend']) {
+    test[hook] = () => { throw new UnsupportedError(`test.${hook} no soportado por el worker host`); };
+  }
+  return test;
+}
+
+function makeConsole(emit) {
+  const write = stream => (...args) => emit({ type: 'log', stream, line: util.format(...args) });
+  return {
+    log: write('stdout'),
+    info: write('stdout'),
+    debug: write('stdout'),
+    warn: write('stderr'),
+    error: write('stderr'),
+  };
+}
+
+/**
+ * Carga el worker con process.env y console propios del job (los workers
+ * leen su configuración de process.env al cargar el módulo).
+ */
+function loadWorker(scriptPath, env, jobConsole, collected) {
+  const shim = makeTestShim(collected);
+  const source = fs.readFileSync(scriptPath, 'utf8').replace(/^#!.*/, '');
+  let playwrightTest = null;
+  const baseRequire = Module.createRequire(scriptPath);
+  const jobRequire = id => {
+    if (id === '@playwright/test') {
+      if (!playwrightTest) {
+        let expect;
+        try {
+          ({ expect } = baseRequire('@playwright/test'));
+        } catch (e) {
+          // Sin @playwright/test instalado: si el worker llama a expect, no se emula
+          if (/\bexpect\s*[.(]/.test(source)) {
+            throw new UnsupportedError('expect no disponible en el worker host');
+          }
+          expect = () => { throw new Error('expect no disponible en el worker host'); };
+        }
+        playwrightTest = { test: shim, expect };
+      }
+      return playwrightTest;
+    }
+    return baseRequire(id);
+  };
+
+  const jobProcess = Object.create(process, { env: { value: env, enumerable: true } });
+  const wrapper = vm.runInThisContext(
+    `(function (exports, require, module, __filename, __dirname, process, console) {${source}\n})`,
+    { filename: scriptPath }
+  );
+  const mod = { exports: {} };
+  wrapper.call(mod.exports, mod.exports, jobRequire, mod, scriptPath, path.dirname(scriptPath), jobProcess, jobConsole);
+
+  if (collected.tests.length === 0) {
+    throw new UnsupportedError('el worker no declara ningún test');
+  }
+  checkFixtures(collected);
+}
+
+// ==========================================
+// JOBS
+// ==========================================
+async function runJob(request, emit) {
+  const job = { pages: [], entries: [], ephemeral: [], closed: false };
+  const collected = { tests: [], beforeEach: [], afterEach: [] };
+  const timeoutMs = request.timeout_ms || JOB_TIMEOUT_MS;
+  const started = Date.now();
+  let timer = null;
+  let running = false;
+  let timedOut = false;
+
+  try {
+    const scriptPath = path.resolve(request.script);
+    const env = { ...process.env, ...(request.env || {}) };
+    loadWorker(scriptPath, env, makeConsole(emit), collected);
+
+    const fixtures = makeFixtures(job);
+    running = true;
+    const run = (async () => {
+      for (const t of collected.tests) {
+        for (const fn of collected.beforeEach) await fn(fixtures);
+        await t.fn(fixtures, { title: t.title });
+        for (const fn of collected.afterEach) await fn(fixtures);
+      }
+    })();
+    run.catch(() => {});  // Tras un timeout sigue corriendo: su error ya no importa
+    const timeout = new Promise((_, reject) => {
+      timer = setTimeout(() => {
+        timedOut = true;
+        reject(Object.assign(new Error(`timeout (${timeoutMs} ms)`), { timeout: true }));
+      }, timeoutMs);
+    });
+
+    await Promise.race([run, timeout]);
+    emit({ type: 'result', ok: true, duration_ms: Date.now() - started });
+  } catch (e) {
+    emit({
+      type: 'result',
+      ok: false,
+      error: e && e.message ? e.message : String(e),
+      timeout: timedOut,
+      // Solo antes de empezar: re-ejecutar un test empezado podría publicar dos veces
+      unsupported: !running && e instanceof UnsupportedError,
+      duration_ms: Date.now() - started,
+    });
+  } finally {
+    clearTimeout(timer);
+    job.closed = true;
+    if (timedOut) job.entries.forEach(retireContext);
+    await closeJobPages(job);
+    job.entries.forEach(releaseContext);
+    await Promise.all(job.ephemeral.map(ctx => ctx.close().catch(() => {})));
+  }
+}
+
+/** Carga el contexto de una sesión sin ejecutar nada (no cuenta como job) */
+async function warmContext(request, emit) {
+  try {
+    const { entry } = await acquireContext({ storageState: request.storage_state });
+    releaseContext(entry);
+    emit({ type: 'warmed', ok: true, contexts: contexts.size });
+  } catch (e) {
+    emit({ type: 'warmed', ok: false, error: e && e.message ? e.message : String(e), contexts: contexts.size });
+  }
+}
+
+function handleConnection(sock) {
+  let buffer = '';
+  let started = false;
+  const emit = event => {
+    if (!sock.destroyed) sock.write(JSON.stringify(event) + '\n');
+  };
+
+  sock.setEncoding('utf8');
+  sock.on('error', () => {});
+  sock.on('data', async chunk => {
+    if (started) return;
+    buffer += chunk;
+    const nl = buffer.indexOf('\n');
+    if (nl < 0) return;
+    started = true;
+
+    let request;
+    try {
+      request = JSON.parse(buffer.slice(0, nl));
+    } catch (e) {
+      emit({ type: 'result', ok: false, error: `request inválido: ${e.message}` });
+      sock.end();
+      return;
+    }
+
+    if (request.type === 'ping') {
+      emit({ type: 'pong', contexts: contexts.size });
+    } else if (request.type === 'warm') {
+      await warmContext(request, emit);
+    } else {
+      console.log(`🚀 Job: ${path.basename(request.script || '?')} (${(request.env || {}).MODEL_NAME || '?'})`);
+      await runJob(request, emit);
+    }
+    sock.end();
+  });
+}
+
+// ==========================================
+// ARRANQUE
+// ==========================================
+function main() {
+  fs.mkdirSync(path.dirname(SOCKET_PATH), { recursive: true });
+  if (fs.existsSync(SOCKET_PATH)) fs.unlinkSync(SOCKET_PATH);  // Socket huérfano
+
+  const server = net.createServer(handleConnection);
+  server.listen(SOCKET_PATH, () => {
+    fs.chmodSync(SOCKET_PATH, 0o600);
+    console.log(`✅ Worker host escuchando en ${SOCKET_PATH}`);
+  });
+
+  // Navegador caliente desde el arranque
+  getBrowser().catch(e => console.error(`❌ Error lanzando Chromium: ${e.message}`));
+
+  const shutdown = async () => {
+    console.log('🛑 Deteniendo worker host...');
+    server.close();
+    try { fs.unlinkSync(SOCKET_PATH); } catch (e) { /* ya no existe */ }
+    const browser = browserPromise ? await browserPromise.catch(() => null) : null;
+    if (browser) await browser.close().catch(() => {});
+    process.exit(0);
+  };
+  process.on('SIGINT', shutdown);
+  process.on('SIGTERM', shutdown);
+}
+
+main();
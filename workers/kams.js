@@ -1,6 +1,7 @@
 const { test, expect } = require('@playwright/test');
 const path = require('path');
 const fs = require('fs');
+const { createEmitter } = require('./lib/events');
 
 // ==========================================
 // CONFIGURACIÓN
@@ -20,9 +21,12 @@ const VIDEO_PATH = process.env.VIDEO_PATH;
 const VIDEO_TITLE = process.env.VIDEO_TITLE || 'Default Title';
 const VIDEO_TAGS = process.env.VIDEO_TAGS || 'tag1,tag2';
 
+// Eventos NDJSON para el poster (progreso, resultado, clase de error)
+const events = createEmitter(console);
+
 test.describe('Automatización API Kams', () => {
 
-  test('Subida vía API Inyectada', async ({ browser }) => {
+  test('Subida vía API Inyectada', events.guard(async ({ browser }) => {
     // Validaciones previas
     if (!fs.existsSync(authFile)) {
       throw new Error('❌ No hay credenciales guardadas. Ejecuta el login manual primero.');
@@ -58,6 +62,11 @@ test.describe('Automatización API Kams', () => {
     // 3. Ejecutar la lógica de subida dentro del navegador
     console.log('🚀 Iniciando subida vía API interna...');
 
+    // Progreso de la subida (XHR upload.onprogress → Node)
+    await page.exposeFunction('__workerProgress', (loaded, total) => events.progress('upload', loaded, total));
+    // Etapa del upload (pre_upload → upload → uploaded) para la política de reintentos
+    await page.exposeFunction('__workerStage', stage => events.stage(stage));
+
     const result = await page.evaluate(async ({ title, tags }) => {
       // --- CÓDIGO QUE CORRE DENTRO DEL NAVEGADOR ---
 
@@ -95,21 +104,28 @@ test.describe('Automatización API Kams', () => {
       const formData = new FormData();
       formData.append('video', file);
 
-      const uploadResponse = await fetch('https://api.kams.com/v1/videos/upload', {
-        method: 'POST',
-        body: formData,
-        headers: {
-          'Accept': 'application/json, text/plain, */*',
-          'Authorization': `Bearer ${authToken}`
-        }
+      await window.__workerStage('upload');
+      // XHR en lugar de fetch: expone el progreso de bytes enviados
+      const uploadResponse = await new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        xhr.open('POST', 'https://api.kams.com/v1/videos/upload');
+        xhr.setRequestHeader('Accept', 'application/json, text/plain, */*');
+        xhr.setRequestHeader('Authorization', `Bearer ${authToken}`);
+        xhr.upload.onprogress = (e) => {
+          if (e.lengthComputable) window.__workerProgress(e.loaded, e.total);
+        };
+        xhr.onload = () => resolve({ ok: xhr.status >= 200 && xhr.status < 300, status: xhr.status, text: xhr.responseText });
+        xhr.onerror = () => reject(new Error('Error de red en la subida'));
+        xhr.send(formData);
       });
 
       if (!uploadResponse.ok) {
-        const errorText = await uploadResponse.text();
-        throw new Error(`Error en subida: ${uploadResponse.status} - ${errorText}`);
+        throw new Error(`Error en subida: ${uploadResponse.status} - ${uploadResponse.text}`);
       }
 
-      const uploadData = await uploadResponse.json();
+      // Desde aquí el video ya está en Kams: un reintento lo subiría dos veces
+      await window.__workerStage('uploaded');
+      const uploadData = JSON.parse(uploadResponse.text);
       console.log('✅ Subida completada. Respuesta:', uploadData);
 
       // Obtener videoId de la respuesta
@@ -145,7 +161,8 @@ test.describe('Automatización API Kams', () => {
       }
 
       const detailsData = await detailsResponse.json();
-      return { success: true, videoId, details: detailsData };
+      const url = detailsData.url || (detailsData.data && detailsData.data.url) || null;
+      return { success: true, videoId, url, details: detailsData };
 
     }, { title: VIDEO_TITLE, tags: VIDEO_TAGS });
 
@@ -153,13 +170,13 @@ test.describe('Automatización API Kams', () => {
 
     if (result.success) {
       console.log(`✅ VIDEO PUBLICADO EXITOSAMENTE! ID: ${result.videoId}`);
+      events.result(true, { external_id: result.videoId, url: result.url });
     } else {
       console.error('❌ Falló la secuencia:', result.message);
       if (result.step === 'upload') {
         console.log('🔍 Respuesta de subida para análisis:', result.response);
       }
+      throw new Error(`Falló la secuencia (${result.step}): ${result.message}`);
     }
-
-    await context.close();
-  });
+  }));
 });
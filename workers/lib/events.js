@@ -0,0 +1,113 @@
+/**
+ * Eventos estructurados de los workers (NDJSON por stdout)
+ *
+ * Cada evento es una línea JSON con la clave "event"; el poster las lee en
+ * streaming tanto del worker host como de `npx playwright test`:
+ *   {"event": "stage", "stage": "upload"}
+ *   {"event": "progress", "step": "upload", "bytes": 1048576, "total": 52428800}
+ *   {"event": "result", "success": true, "url": "...", "external_id": "..."}
+ *   {"event": "error", "error_class": "auth", "stage": "pre_upload", "message": "..."}
+ *
+ * Etapas (el poster solo reintenta lo que no llegó a la plataforma):
+ *   pre_upload  todavía no se envió el video
+ *   upload      petición de subida en curso
+ *   uploaded    la plataforma ya tiene el video/post: un reintento lo duplicaría
+ *
+ * Uso en un worker:
+ *   const { createEmitter } = require('./lib/events');
+ *   const events = createEmitter(console);
+ *   test('Subida', events.guard(async ({ browser }) => { ... }));
+ */
+
+// Progreso: como máximo un evento por cada PROGRESS_STEP del total
+const PROGRESS_STEP = 0.05;
+
+/**
+ * Clase de error para la política de reintentos del poster.
+ * auth | rate_limit | platform | rejected | network | file | unknown
+ */
+function classifyError(error) {
+  const message = (error && error.message) ? error.message : String(error);
+  const status = message.match(/:\s*([45]\d\d)\b/);  // 'Error en subida: 500 - ...'
+
+  if (status) {
+    if (status[1] === '401' || status[1] === '403') return 'auth';
+    if (status[1] === '429') return 'rate_limit';
+    return status[1].startsWith('5') ? 'platform' : 'rejected';
+  }
+  if (/token|cookie|sesi[oó]n|credenciales|logue|login/i.test(message)) return 'auth';
+  if (/error de red|network|failed to fetch|net::|ECONN|ETIMEDOUT|socket/i.test(message)) return 'network';
+  if (/archivo|file/i.test(message)) return 'file';
+  return 'unknown';
+}
+
+/** `out` es el console del worker (en el worker host, el del job) */
+function createEmitter(out = console) {
+  let lastFraction = -1;
+  let currentStage = 'pre_upload';
+
+  const emit = (event, data = {}) => {
+    out.log(JSON.stringify({ event, ...data, ts: Date.now() }));
+  };
+
+  return {
+    emit,
+
+    progress(step, bytes, total) {
+      const fraction = total ? bytes / total : 0;
+      if (bytes < total && fraction - lastFraction < PROGRESS_STEP) return;
+      lastFraction = fraction;
+      emit('progress', { step, bytes, total });
+    },
+
+    stage(name) {
+      currentStage = name;
+      emit('stage', { stage: name });
+    },
+
+    result(success, data = {}) {
+      emit('result', { success, ...data });
+    },
+
+    error(error) {
+      emit('error', {
+        error_class: classifyError(error),
+        stage: currentStage,
+        message: (error && error.message) ? error.message : String(error),
+      });
+    },
+
+    /**
+     * Envuelve el cuerpo del test: una excepción se emite como 'error' antes
+     * de propagarse, y los contextos abiertos se cierran al final pase lo que
+     * pase (un fallo al cerrar solo se registra: el 'result' ya se emitió).
+     * Mantiene `{ browser }` desestructurado: Playwright y el worker host
+     * leen los fixtures del primer parámetro.
+     */
+    guard(body) {
+      return async ({ browser }, testInfo) => {
+        const contexts = [];
+        const tracked = {
+          newContext: async (options) => {
+            const context = await browser.newContext(options);
+            contexts.push(context);
+            return context;
+          },
+        };
+        this.stage('pre_upload');
+        try {
+          return await body({ browser: tracked }, testInfo);
+        } catch (e) {
+          this.error(e);
+          throw e;
+        } finally {
+          for (const context of contexts) {
+            await context.close().catch(e => out.warn(`⚠️  Error cerrando el contexto: ${e.message}`));
+          }
+        }
+      };
+    },
+  };
+}
+
+module.exports = { createEmitter, classifyError };
@@ -1,6 +1,7 @@
 const { test } = require('@playwright/test');
 const path = require('path');
 const fs = require('fs');
+const { createEmitter } = require('./lib/events');
 
 // ==========================================
 // WORKER PARA XXXFOLLOW
@@ -12,6 +13,9 @@ const VIDEO_PATH = process.env.VIDEO_PATH;
 const VIDEO_TITLE = process.env.VIDEO_TITLE || 'Default Title';
 const VIDEO_TAGS = process.env.VIDEO_TAGS || 'latina,brunette';
 
+// Eventos NDJSON para el poster (progreso, resultado, clase de error)
+const events = createEmitter(console);
+
 if (!MODEL_NAME) {
     throw new Error('❌ ERROR: Debes especificar MODEL_NAME. Ejemplo: MODEL_NAME=demo npx playwright test ...');
 }
@@ -23,7 +27,7 @@ console.log(`🔐 Usando archivo de autenticación para ${MODEL_NAME}: ${authFil
 
 test.describe('Automatización xxxfollow', () => {
 
-    test('Subida a xxxfollow', async ({ browser }) => {
+    test('Subida a xxxfollow', events.guard(async ({ browser }) => {
         // Validaciones previas
         if (!fs.existsSync(authFile)) {
             throw new Error(`❌ No hay credenciales guardadas en ${authFile}. Ejecuta el login manual primero.`);
@@ -64,6 +68,11 @@ test.describe('Automatización xxxfollow', () => {
         // 3. Ejecutar la lógica de subida dentro del navegador
         console.log('🚀 Iniciando subida vía API interna...');
 
+        // Progreso de la subida (XHR upload.onprogress → Node)
+        await page.exposeFunction('__workerProgress', (loaded, total) => events.progress('upload', loaded, total));
+        // Etapa del upload (pre_upload → upload → uploaded) para la política de reintentos
+        await page.exposeFunction('__workerStage', stage => events.stage(stage));
+
         const result = await page.evaluate(async ({ title, tags }) => {
             // --- CÓDIGO QUE CORRE DENTRO DEL NAVEGADOR ---
 
@@ -140,23 +149,27 @@ test.describe('Automatización xxxfollow', () => {
             const formData = new FormData();
             formData.append('file', file);
 
-            const uploadResponse = await fetch('https://upload.xxxfollow.com/api/v1/video/fans-media', {
-                method: 'POST',
-                headers: {
-                    'upload-token': uploadToken,
-                    'content-range': `bytes 0-${file.size - 1}/${file.size}`,
-                    'origin': 'https://www.xxxfollow.com',
-                    'referer': 'https://www.xxxfollow.com/'
-                },
-                body: formData
+            await window.__workerStage('upload');
+            // XHR en lugar de fetch: expone el progreso de bytes enviados.
+            // origin/referer los pone el navegador (headers prohibidos también en fetch)
+            const uploadResponse = await new Promise((resolve, reject) => {
+                const xhr = new XMLHttpRequest();
+                xhr.open('POST', 'https://upload.xxxfollow.com/api/v1/video/fans-media');
+                xhr.setRequestHeader('upload-token', uploadToken);
+                xhr.setRequestHeader('content-range', `bytes 0-${file.size - 1}/${file.size}`);
+                xhr.upload.onprogress = (e) => {
+                    if (e.lengthComputable) window.__workerProgress(e.loaded, e.total);
+                };
+                xhr.onload = () => resolve({ ok: xhr.status >= 200 && xhr.status < 300, status: xhr.status, text: xhr.responseText });
+                xhr.onerror = () => reject(new Error('Error de red en la subida'));
+                xhr.send(formData);
             });
 
             if (!uploadResponse.ok) {
-                const errorText = await uploadResponse.text();
-                throw new Error(`Error subiendo video: ${uploadResponse.status} - ${errorText}`);
+                throw new Error(`Error subiendo video: ${uploadResponse.status} - ${uploadResponse.text}`);
             }
 
-            const uploadData = await uploadResponse.json();
+            const uploadData = JSON.parse(uploadResponse.text);
             console.log('✅ Video subido:', uploadData);
 
             const tkn = uploadData.token;
@@ -181,6 +194,8 @@ test.describe('Automatización xxxfollow', () => {
                 user_id: userId
             };
 
+            // Desde aquí puede existir el post: un reintento lo duplicaría
+            await window.__workerStage('uploaded');
             const postResponse = await fetch('https://www.xxxfollow.com/api/v1/post', {
                 method: 'POST',
                 headers: {
@@ -229,6 +244,7 @@ test.describe('Automatización xxxfollow', () => {
             return {
                 success: true,
                 postId: postId,
+                url: postData.url || mediaData.url || null,
                 mediaId: mediaData.media_id || mediaData.id,
                 tkn: tkn,
                 srvId: srvId
@@ -245,10 +261,10 @@ test.describe('Automatización xxxfollow', () => {
             console.log(`✅ VIDEO PUBLICADO EXITOSAMENTE!`);
             console.log(`   Post ID: ${result.postId}`);
             console.log(`   Media ID: ${result.mediaId}`);
+            events.result(true, { external_id: result.postId, url: result.url });
         } else {
             console.error('❌ Falló la publicación');
+            throw new Error('Falló la publicación');
         }
-
-        await context.close();
-    });
+    }));
 });